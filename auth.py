@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+
+class TokenSigner:
+    """Issue and verify signed, expiring bearer tokens carrying a user id.
+
+    Tokens are HMAC-signed with the app's SECRET_KEY, so verifying one needs no
+    password hash and no DB lookup.
+    """
+
+    def __init__(self, secret_key, max_age=12 * 3600, salt='moving-app-auth'):
+        self.max_age = max_age
+        self._serializer = URLSafeTimedSerializer(secret_key, salt=salt)
+
+    def issue(self, user_id):
+        return self._serializer.dumps({'uid': user_id})
+
+    def verify(self, token):
+        """Return the user id in `token`, or None if it is forged, malformed or expired."""
+        try:
+            payload = self._serializer.loads(token, max_age=self.max_age)
+        except (BadSignature, SignatureExpired):
+            return None
+        return payload.get('uid') if isinstance(payload, dict) else None
+
+
+class PrincipalCache:
+    """Thread-safe LRU of token -> principal dict, each entry kept for at most `ttl` seconds.
+
+    The TTL bounds how long a role change or ban made by another process goes
+    unnoticed; changes in this process call `invalidate_user()`.
+    """
+
+    def __init__(self, max_size=10000, ttl=300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token, principal):
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            stale = [token for token, (_, principal) in self._entries.items() if principal['user_id'] == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LoginRateLimiter:
+    """Sliding-window limit on login attempts per key, plus a cap on concurrent password checks.
+
+    `acquire({key: max_attempts})` returns 0 when the attempt may proceed (the
+    caller must then `release()`), or the number of seconds to wait before
+    retrying. Each key has its own limit per window. Attempts are counted
+    whether or not the password turns out to be right.
+    """
+
+    def __init__(self, window=60.0, max_concurrent=4):
+        self.window = window
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._hashing = threading.BoundedSemaphore(max_concurrent)
+        self._last_sweep = time.monotonic()
+
+    def acquire(self, limits):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > self.window:
+                self._sweep(now)
+            retry_after = 0
+            for key, max_attempts in limits.items():
+                attempts = self._attempts.get(key)
+                if attempts is None:
+                    continue
+                while attempts and attempts[0] <= now - self.window:
+                    attempts.popleft()
+                if len(attempts) >= max_attempts:
+                    retry_after = max(retry_after, attempts[len(attempts) - max_attempts] + self.window - now)
+            if retry_after:
+                return max(1, int(retry_after + 0.999))
+            for key in limits:
+                self._attempts.setdefault(key, deque()).append(now)
+
+        # Hashing is CPU-bound: beyond the cap, shed load instead of queueing
+        if not self._hashing.acquire(blocking=False):
+            return 1
+        return 0
+
+    def release(self):
+        self._hashing.release()
+
+    def reset(self):
+        with self._lock:
+            self._attempts.clear()
+
+    def _sweep(self, now):
+        cutoff = now - self.window
+        for key in [key for key, attempts in self._attempts.items() if not attempts or attempts[-1] <= cutoff]:
+            del self._attempts[key]
+        self._last_sweep = now
@@ -0,0 +1,110 @@
+"""Time the admin dashboard load: client-side aggregation over full lists vs the precomputed /api/admin/stats.
+
+Usage: python benchmarks/bench_admin_stats.py [--users 20000] [--drivers 500] [--bookings 100000]
+
+The "before" path is what AdminDashboard.js and ManageDrivers.js used to do:
+download every user and every completed booking, then one order-history call
+per driver. The response cache is off so both paths hit the database.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(movers, users, drivers, bookings, rng):
+    from sqlalchemy import insert
+
+    db = movers.db
+    now = datetime.utcnow()
+    db.session.execute(insert(movers.User), [
+        {'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x',
+         'role': 'driver' if i < drivers else 'user', 'created_at': now - timedelta(minutes=i)}
+        for i in range(users)
+    ])
+    db.session.execute(insert(movers.Driver), [
+        {'user_id': i + 2, 'vehicle_type': 'Truck', 'license_plate': f'KAA {i:03d}'} for i in range(drivers)
+    ])
+    statuses = ['pending', 'accepted', 'completed', 'completed', 'cancelled']
+    for start in range(0, bookings, 20000):
+        db.session.execute(insert(movers.Booking), [
+            {'user_id': rng.randint(drivers + 2, users), 'driver_id': rng.randint(1, drivers),
+             'pickup_location': 'A', 'dropoff_location': 'B', 'distance': 5.0,
+             'price': round(rng.uniform(5, 200), 2), 'status': rng.choice(statuses),
+             'created_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))}
+            for _ in range(start, min(start + 20000, bookings))
+        ])
+    db.session.commit()
+    # Bulk Core inserts bypass the ORM hooks, so derive the counters once
+    movers.rebuild_stats()
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--drivers', type=int, default=500)
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "stats.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    import movers
+
+    with movers.app.app_context():
+        movers.init_db()
+        seed(movers, args.users, args.drivers, args.bookings, random.Random(15))
+        driver_ids = movers.db.session.execute(movers.select(movers.Driver.id)).scalars().all()
+
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def get(path):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.status_code)
+        return response.get_json()
+
+    def before():
+        users = get('/api/admin/manage-users?all=1')['users']
+        escrow = get('/api/admin/escrow?all=1')['escrow']
+        for driver_id in driver_ids:
+            get(f'/api/driver/order-history/{driver_id}?all=1')
+        return sum(1 for user in users if user['role'] == 'driver'), sum(row['price'] for row in escrow)
+
+    def after():
+        stats = get('/api/admin/stats')
+        get('/api/admin/escrow?limit=5')
+        get('/api/admin/stats/drivers?all=1')
+        return stats['users']['drivers'], stats['escrow']['total']
+
+    drivers_before, escrow_before = before()
+    drivers_after, escrow_after = after()
+    assert drivers_before == drivers_after and abs(escrow_before - escrow_after) < 0.01, 'aggregates disagree'
+
+    before_s = timed(before, args.repeat)
+    after_s = timed(after, args.repeat)
+    print(f'{args.bookings:,} bookings, {args.users:,} users, {args.drivers} drivers')
+    print(f'client-side aggregation: {before_s * 1000:>9.1f} ms  ({len(driver_ids) + 2} requests)')
+    print(f'/api/admin/stats:        {after_s * 1000:>9.1f} ms  (3 requests)')
+    print(f'speedup: {before_s / after_s:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Measure hot-path reads before and after archiving, and how long an archiver run holds up concurrent writers.
+
+Usage: python benchmarks/bench_archive.py [--bookings 1000000] [--days 730] [--archive-after 180] [--repeat 50]
+
+Seeds two years of bookings, transactions and notifications. Only the last day's
+bookings are still open, and most older notifications have been read. It times
+available_orders, a user's first order-history and notification pages, and the
+same history with ?archived=1. Then it runs one archiver pass, while another
+thread keeps marking notifications read through the API and records how long
+each write takes. Finally it times the reads again.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERS = 5000
+DRIVERS = 500
+
+
+def seed(movers, args, rng):
+    from sqlalchemy import insert
+
+    db = movers.db
+    now = datetime.utcnow()
+    span = args.days * 86400
+    db.session.execute(insert(movers.User), [
+        {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x',
+         'role': 'driver' if i > USERS else 'user'}
+        for i in range(2, USERS + DRIVERS + 2)
+    ])
+    db.session.execute(insert(movers.Driver), [
+        {'id': i, 'user_id': USERS + 1 + i, 'vehicle_type': 'van', 'license_plate': f'KDA {i:03d}'}
+        for i in range(1, DRIVERS + 1)
+    ])
+    for offset in range(0, args.bookings, 50000):
+        count = min(50000, args.bookings - offset)
+        # Ids follow creation time, oldest first, as they would in production
+        ages = sorted((rng.random() * span for _ in range(count)), reverse=True)
+        bookings, transactions, notifications = [], [], []
+        for i, age in enumerate(ages, start=offset + 1):
+            created_at = now - timedelta(seconds=age)
+            recent = age < 86400
+            user_id = rng.randint(2, USERS + 1)
+            bookings.append({
+                'id': i, 'user_id': user_id, 'driver_id': rng.randint(1, DRIVERS), 'pickup_location': 'Westlands',
+                'dropoff_location': 'Karen', 'distance': 12.0, 'price': round(rng.uniform(500, 5000), 2),
+                'status': rng.choice(('pending', 'accepted')) if recent else rng.choice(('completed', 'completed', 'cancelled')),
+                'created_at': created_at,
+            })
+            transactions.append({
+                'id': i, 'user_id': user_id, 'transaction_id': f'tx-{i}', 'amount': 100.0, 'type': 'deposit',
+                'status': 'pending' if recent else rng.choice(('completed', 'completed', 'failed')),
+                'created_at': created_at,
+            })
+            notifications.append({
+                'id': i, 'user_id': user_id, 'driver_id': None, 'message': f'Booking {i} updated.',
+                'is_read': not recent and rng.random() < 0.9, 'created_at': created_at,
+            })
+        db.session.execute(insert(movers.Booking), bookings)
+        db.session.execute(insert(movers.Transaction), transactions)
+        db.session.execute(insert(movers.Notification), notifications)
+        db.session.commit()
+    movers.rebuild_stats()
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=1000000, help='also the number of transactions and notifications')
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--archive-after', type=float, default=180, help='ARCHIVE_AFTER_DAYS')
+    parser.add_argument('--read-ttl', type=float, default=30, help='NOTIFICATION_READ_TTL_DAYS')
+    parser.add_argument('--batch', type=int, default=1000, help='ARCHIVE_BATCH')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'archive.db')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['NOTIFICATION_DELIVERY_INTERVAL'] = '0'
+    os.environ['DISPATCH_WINDOW'] = '0'
+    os.environ['ARCHIVE_INTERVAL'] = '0'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    os.environ['ARCHIVE_AFTER_DAYS'] = str(args.archive_after)
+    os.environ['NOTIFICATION_READ_TTL_DAYS'] = str(args.read_ttl)
+    os.environ['ARCHIVE_BATCH'] = str(args.batch)
+    import movers
+    from sqlalchemy import func, select
+
+    rng = random.Random(23)
+    start = time.perf_counter()
+    with movers.app.app_context():
+        movers.init_db()
+        seed(movers, args, rng)
+    print(f'seeded {args.bookings:,} bookings, transactions and notifications in {time.perf_counter() - start:.1f}s')
+
+    client = movers.app.test_client()
+    user_id = 2
+    reads = [
+        ('available orders', '/api/driver/available-orders'),
+        ('order history', f'/api/user/order-history/{user_id}?limit=50'),
+        ('order history archived=1', f'/api/user/order-history/{user_id}?limit=50&archived=1'),
+        ('payment history', f'/api/user/payment-history/{user_id}?limit=50'),
+        ('notifications', f'/api/user/notifications/{user_id}?limit=50'),
+    ]
+
+    def measure(label):
+        with movers.app.app_context():
+            counts = {model.__tablename__: movers.db.session.execute(select(func.count()).select_from(model)).scalar()
+                      for model in (movers.Booking, movers.Transaction, movers.Notification)}
+        print(f'{label}: ' + ', '.join(f'{name} {count:,}' for name, count in counts.items()))
+        for name, url in reads:
+            median, worst = timed(lambda: client.get(url), args.repeat)
+            print(f'  {name:<28} median {median:7.2f} ms   max {worst:7.2f} ms')
+
+    measure('before archiving')
+
+    with movers.app.app_context():
+        unread = list(movers.db.session.execute(
+            select(movers.Notification.id).where(movers.Notification.is_read == False)
+            .order_by(movers.Notification.id.desc()).limit(100000)
+        ).scalars())
+    write_timings = []
+    done = threading.Event()
+
+    def writer():
+        writes = movers.app.test_client()
+        for notification_id in unread:
+            if done.is_set():
+                break
+            started = time.perf_counter()
+            writes.post(f'/api/notifications/mark-read/{notification_id}')
+            write_timings.append((time.perf_counter() - started) * 1000)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    start = time.perf_counter()
+    moved = movers.archive_old_rows()
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+    total = sum(moved.values())
+    print(f'archiver pass: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), '
+          + ', '.join(f'{name} {count:,}' for name, count in moved.items()))
+    if write_timings:
+        write_timings.sort()
+        print(f'  concurrent writes: {len(write_timings)}, p50 {statistics.median(write_timings):.1f} ms, '
+              f'p99 {write_timings[int(len(write_timings) * 0.99)]:.1f} ms, max {write_timings[-1]:.1f} ms')
+
+    measure('after archiving')
+
+
+if __name__ == '__main__':
+    main()
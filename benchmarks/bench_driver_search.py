@@ -0,0 +1,76 @@
+"""Compare the grid DriverIndex against a full scan for nearest-driver search.
+
+Usage: python benchmarks/bench_driver_search.py [--queries 200] [--k 10] [--radius 20]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import DriverIndex, haversine_km  # noqa: E402
+
+NAIROBI = (-1.2921, 36.8219)
+
+
+def random_point(rng, spread=0.3):
+    return NAIROBI[0] + rng.uniform(-spread, spread), NAIROBI[1] + rng.uniform(-spread, spread)
+
+
+def full_scan(drivers, lat, lng, k, radius_km):
+    candidates = ((haversine_km(lat, lng, dlat, dlng), driver_id) for driver_id, (dlat, dlng) in drivers.items())
+    return heapq.nsmallest(k, (c for c in candidates if c[0] <= radius_km))
+
+
+def run(size, queries, k, radius_km, seed=42):
+    rng = random.Random(seed)
+    drivers = {driver_id: random_point(rng) for driver_id in range(1, size + 1)}
+    index = DriverIndex()
+    start = time.perf_counter()
+    for driver_id, (lat, lng) in drivers.items():
+        index.update(driver_id, f'{lat},{lng}')
+    build_s = time.perf_counter() - start
+
+    points = [random_point(rng) for _ in range(queries)]
+
+    start = time.perf_counter()
+    scan_results = [full_scan(drivers, lat, lng, k, radius_km) for lat, lng in points]
+    scan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_results = [index.nearest(lat, lng, k=k, radius_km=radius_km) for lat, lng in points]
+    index_s = time.perf_counter() - start
+
+    mismatches = sum(
+        [d for _, d in a] != [d for _, d in b] for a, b in zip(scan_results, index_results)
+    )
+    return {
+        'drivers': size,
+        'build_ms': build_s * 1000,
+        'scan_ms_per_query': scan_s * 1000 / queries,
+        'index_ms_per_query': index_s * 1000 / queries,
+        'speedup': scan_s / index_s if index_s else float('inf'),
+        'mismatches': mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--radius', type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"{'drivers':>8} {'build ms':>9} {'scan ms/q':>10} {'index ms/q':>11} {'speedup':>8} {'mismatch':>9}")
+    for size in args.sizes:
+        r = run(size, args.queries, args.k, args.radius)
+        print(f"{r['drivers']:>8} {r['build_ms']:>9.1f} {r['scan_ms_per_query']:>10.3f} "
+              f"{r['index_ms_per_query']:>11.3f} {r['speedup']:>7.1f}x {r['mismatches']:>9}")
+
+
+if __name__ == '__main__':
+    main()
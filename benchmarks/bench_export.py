@@ -0,0 +1,103 @@
+"""Stream a large admin export and report throughput and peak memory against a buffered JSON dump.
+
+Usage: python benchmarks/bench_export.py [--rows 1000000] [--format csv|ndjson] [--skip-buffered]
+
+The buffered baseline is what the old list endpoints did: fetch every row into
+Python dicts and serialise one JSON document. Peak memory is measured with
+tracemalloc in a separate pass, since tracing slows everything down.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(movers, rows, rng):
+    from sqlalchemy import insert
+
+    db = movers.db
+    db.session.execute(insert(movers.User), [
+        {'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x', 'role': 'user'}
+        for i in range(1000)
+    ])
+    start = datetime(2024, 1, 1)
+    for offset in range(0, rows, 50000):
+        db.session.execute(insert(movers.Transaction), [
+            {'user_id': rng.randint(2, 1001), 'transaction_id': f'TX-{i}', 'amount': round(rng.uniform(1, 500), 2),
+             'type': 'deposit', 'status': rng.choice(['completed', 'completed', 'pending', 'failed']),
+             'created_at': start + timedelta(seconds=i * 30)}
+            for i in range(offset, min(offset + 50000, rows))
+        ])
+    db.session.commit()
+
+
+def measure(fn, trace):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    parser.add_argument('--skip-buffered', action='store_true', help='skip the buffered baseline')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "export.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    import movers
+    from sqlalchemy import select
+
+    start = time.perf_counter()
+    with movers.app.app_context():
+        movers.init_db()
+        seed(movers, args.rows, random.Random(18))
+    print(f'seeded {args.rows:,} transactions in {time.perf_counter() - start:.1f}s')
+
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def streamed():
+        response = client.get(f'/api/admin/export/transactions?format={args.format}', headers=headers)
+        assert response.status_code == 200, response.status_code
+        size = 0
+        for chunk in response.response:
+            size += len(chunk)
+        response.close()
+        return size
+
+    def buffered():
+        with movers.app.app_context():
+            _, columns = movers.EXPORTS['transactions']
+            rows = movers.fetch_rows(select(*columns).order_by(movers.Transaction.created_at, movers.Transaction.id))
+            return len(movers.app.json.dumps({'transactions': rows}))
+
+    runs = [('streamed ' + args.format, streamed)]
+    if not args.skip_buffered:
+        runs.append(('buffered json', buffered))
+    for name, fn in runs:
+        size, elapsed, _ = measure(fn, trace=False)
+        _, _, peak = measure(fn, trace=True)
+        print(f'{name:>15}: {elapsed:6.2f}s  {args.rows / elapsed:>9,.0f} rows/s  '
+              f'{size / elapsed / 1e6:6.1f} MB/s  peak {peak / 1e6:8.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
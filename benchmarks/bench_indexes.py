@@ -0,0 +1,146 @@
+"""Seed a scratch SQLite database and compare hot-path queries before and after migrations.
+
+Usage: python benchmarks/bench_indexes.py [--bookings 200000] [--repeat 20]
+
+Prints the SQLite query plan and median latency for each endpoint query with
+the secondary indexes dropped ("before") and after `migrations.upgrade()`.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select, text  # noqa: E402
+
+import migrations  # noqa: E402
+from movers import (  # noqa: E402
+    AVAILABLE_ORDER_COLUMNS, BOOKING_FOR_DRIVER_COLUMNS, BOOKING_FOR_USER_COLUMNS, NOTIFICATION_COLUMNS,
+    TICKET_COLUMNS, TRANSACTION_COLUMNS, Booking, Driver, Notification, SupportTicket, Transaction, User, db,
+)
+
+
+def seed(engine, args, rng):
+    start = datetime(2024, 1, 1)
+    when = lambda: start + timedelta(seconds=rng.randrange(0, 365 * 24 * 3600))  # noqa: E731
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'user{i}@example.com',
+             'password': 'x', 'role': 'driver' if i <= args.drivers else 'user', 'created_at': when()}
+            for i in range(1, args.users + 1)
+        ])
+        conn.execute(insert(Driver), [
+            {'id': i, 'user_id': i, 'vehicle_type': 'Truck', 'license_plate': f'KAA {i:03d}',
+             'is_available': rng.random() < 0.3,
+             'live_location': f'{-1.29 + rng.uniform(-.2, .2)},{36.82 + rng.uniform(-.2, .2)}'}
+            for i in range(1, args.drivers + 1)
+        ])
+        conn.execute(insert(Booking), [
+            {'user_id': rng.randint(1, args.users), 'driver_id': rng.randint(1, args.drivers),
+             'pickup_location': 'A', 'dropoff_location': 'B', 'distance': 10.0, 'price': 50.0,
+             'status': rng.choices(['pending', 'accepted', 'completed', 'cancelled'], [1, 2, 12, 3])[0],
+             'created_at': when()}
+            for _ in range(args.bookings)
+        ])
+        conn.execute(insert(Transaction), [
+            {'user_id': rng.randint(1, args.users), 'transaction_id': f'tx-{i}', 'amount': 100.0,
+             'type': 'deposit', 'status': 'completed', 'created_at': when()}
+            for i in range(args.transactions)
+        ])
+        recipients = [
+            (rng.randint(1, args.users), None) if rng.random() < 0.5 else (None, rng.randint(1, args.drivers))
+            for _ in range(args.notifications)
+        ]
+        conn.execute(insert(Notification), [
+            {'user_id': user_id, 'driver_id': driver_id, 'message': 'hello', 'is_read': False, 'created_at': when()}
+            for user_id, driver_id in recipients
+        ])
+        conn.execute(insert(SupportTicket), [
+            {'user_id': rng.randint(1, args.users), 'subject': 'Help', 'message': 'Please help', 'created_at': when()}
+            for _ in range(args.tickets)
+        ])
+
+
+def endpoint_queries(args):
+    page = lambda stmt, created, ident: stmt.order_by(created.desc(), ident.desc()).limit(51)  # noqa: E731
+    user_id, driver_id = args.users // 2, args.drivers // 2
+    return {
+        'available_orders': page(select(*AVAILABLE_ORDER_COLUMNS).where(Booking.status == 'pending'),
+                                 Booking.created_at, Booking.id),
+        'escrow': page(select(Booking.id).where(Booking.status == 'completed'), Booking.created_at, Booking.id),
+        'user_order_history': page(select(*BOOKING_FOR_USER_COLUMNS).where(Booking.user_id == user_id),
+                                   Booking.created_at, Booking.id),
+        'driver_order_history': page(select(*BOOKING_FOR_DRIVER_COLUMNS).where(Booking.driver_id == driver_id),
+                                     Booking.created_at, Booking.id),
+        'payment_history': page(select(*TRANSACTION_COLUMNS).where(Transaction.user_id == user_id),
+                                Transaction.created_at, Transaction.id),
+        'user_notifications': page(select(*NOTIFICATION_COLUMNS).where(Notification.user_id == user_id),
+                                   Notification.created_at, Notification.id),
+        'driver_notifications': page(select(*NOTIFICATION_COLUMNS).where(Notification.driver_id == driver_id),
+                                     Notification.created_at, Notification.id),
+        'admin_tickets': page(select(*TICKET_COLUMNS), SupportTicket.created_at, SupportTicket.id),
+        'available_drivers': select(Driver.id, Driver.live_location).where(Driver.is_available == True),  # noqa: E712
+    }
+
+
+def measure(engine, queries, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            sql = str(stmt.compile(engine, compile_kwargs={'literal_binds': True}))
+            plan = '; '.join(row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql)))
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql)).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (statistics.median(timings), plan)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--notifications', type=int, default=200000)
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            names = conn.execute(text("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'ix_%'"))
+            for name in names.scalars().all():
+                conn.execute(text(f'DROP INDEX {name}'))
+
+        print('Seeding...')
+        seed(engine, args, random.Random(7))
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+
+        queries = endpoint_queries(args)
+        before = measure(engine, queries, args.repeat)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+        after = measure(engine, queries, args.repeat)
+
+        for name in queries:
+            (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+            print(f'\n{name}: {before_ms:.2f} ms -> {after_ms:.2f} ms')
+            print(f'  before: {before_plan}')
+            print(f'  after:  {after_plan}')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
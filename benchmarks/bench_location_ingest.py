@@ -0,0 +1,113 @@
+"""Compare per-ping commits with hub-coalesced batch writes for driver location ingestion.
+
+Usage: python benchmarks/bench_location_ingest.py [--drivers 2000] [--pings 100000] [--batch 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+
+from movers import DRIVER_LOCATION_UPDATE, Driver, User, db  # noqa: E402
+from tracking import LocationHistory, LocationHub  # noqa: E402
+
+
+def make_engine(tmp, name, drivers):
+    engine = create_engine(f'sqlite:///{os.path.join(tmp, name)}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': i, 'name': f'Driver {i}', 'phone': '0700000000', 'email': f'd{i}@example.com',
+             'password': 'x', 'role': 'driver'} for i in range(1, drivers + 1)
+        ])
+        conn.execute(insert(Driver), [
+            {'id': i, 'user_id': i, 'vehicle_type': 'Truck', 'license_plate': f'KAA {i:03d}'}
+            for i in range(1, drivers + 1)
+        ])
+    return engine
+
+
+def generate_pings(drivers, pings, rng):
+    start = time.time()
+    return [
+        (rng.randint(1, drivers), f'{-1.29 + rng.uniform(-.2, .2)},{36.82 + rng.uniform(-.2, .2)}',
+         start + i * 0.01)
+        for i in range(pings)
+    ]
+
+
+def per_ping_commits(engine, pings):
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        for driver_id, location, _ in pings:
+            conn.execute(text('UPDATE driver SET live_location = :loc WHERE id = :id'),
+                         {'loc': location, 'id': driver_id})
+            conn.commit()
+    return time.perf_counter() - start
+
+
+def coalesced(engine, pings, batch, flushes):
+    def flush(updates):
+        with engine.begin() as conn:
+            conn.execute(DRIVER_LOCATION_UPDATE, [
+                {'b_driver_id': u['driver_id'], 'b_live_location': u['live_location']} for u in updates
+            ])
+
+    history = LocationHistory()
+    hub = LocationHub(flush_fn=None, history=history)
+    batches = [pings[i:i + batch] for i in range(0, len(pings), batch)]
+    flush_every = max(1, len(batches) // flushes)
+
+    written = 0
+    start = time.perf_counter()
+    for number, chunk in enumerate(batches, 1):
+        hub.publish_many(chunk)
+        if number % flush_every == 0:
+            dirty = hub.drain_dirty()
+            flush(list(dirty.values()))
+            written += len(dirty)
+    dirty = hub.drain_dirty()
+    if dirty:
+        flush(list(dirty.values()))
+        written += len(dirty)
+    return time.perf_counter() - start, written, len(history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--pings', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=500, help='points per bulk request')
+    parser.add_argument('--flushes', type=int, default=20, help='number of flush intervals over the run')
+    parser.add_argument('--per-ping-sample', type=int, default=5000,
+                        help='pings to time with one commit each')
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    pings = generate_pings(args.drivers, args.pings, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp, 'per_ping.db', args.drivers)
+        sample = pings[:args.per_ping_sample]
+        per_ping_s = per_ping_commits(engine, sample)
+        engine.dispose()
+
+        engine = make_engine(tmp, 'coalesced.db', args.drivers)
+        coalesced_s, written, history_points = coalesced(engine, pings, args.batch, args.flushes)
+        engine.dispose()
+
+    per_ping_rate = len(sample) / per_ping_s
+    coalesced_rate = len(pings) / coalesced_s
+    print(f'per-ping commits: {per_ping_rate:>10,.0f} pings/s  ({len(sample)} pings timed)')
+    print(f'hub + batch flush: {coalesced_rate:>9,.0f} pings/s  '
+          f'({len(pings)} pings, {written} row writes, {history_points} history points)')
+    print(f'speedup: {coalesced_rate / per_ping_rate:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
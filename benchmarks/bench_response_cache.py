@@ -0,0 +1,164 @@
+"""Measure hot GET endpoints with the response cache off, in-process, and on a Redis-style backend.
+
+Usage: python benchmarks/bench_response_cache.py [--users 5000] [--bookings 20000] [--requests 300]
+
+The Redis backend runs against FakeRedis below, an in-memory stand-in with the
+handful of redis-py calls RedisBackend uses, so no server is needed.
+
+Before timing, every path is fetched twice with each Accept type the app
+serves, on each caching backend; the script exits non-zero unless the second
+fetch is a cache hit with the same status, content type and body.
+"""
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def _live(self, key):
+        if key in self.expiry and self.expiry[key] < time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key] if self._live(key) else None
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        if ex:
+            self.expiry[key] = time.monotonic() + ex
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    def smembers(self, key):
+        return set(self.data[key]) if self._live(key) else set()
+
+    def expire(self, key, seconds):
+        if key in self.data:
+            self.expiry[key] = time.monotonic() + seconds
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key):
+                del self.data[key]
+                removed += 1
+            self.expiry.pop(key, None)
+        return removed
+
+    def scan_iter(self, match='*'):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match) and self._live(key)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def seed(movers, users, bookings, rng):
+    from sqlalchemy import insert
+
+    with movers.app.app_context():
+        movers.init_db()
+        movers.db.session.execute(insert(movers.User), [
+            {'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x',
+             'role': 'driver' if i % 10 == 0 else 'user'} for i in range(users)
+        ])
+        movers.db.session.execute(insert(movers.Driver), [
+            {'user_id': i, 'vehicle_type': 'Truck', 'license_plate': f'KAA {i:03d}'} for i in range(2, 202)
+        ])
+        movers.db.session.execute(insert(movers.Booking), [
+            {'user_id': rng.randint(2, users), 'driver_id': rng.randint(1, 200), 'pickup_location': 'A',
+             'dropoff_location': 'B', 'distance': 5.0, 'price': 25.0,
+             'status': rng.choice(['pending', 'accepted', 'completed', 'cancelled'])} for _ in range(bookings)
+        ])
+        movers.db.session.commit()
+
+
+def run(client, paths, headers, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(paths[i % len(paths)], headers=headers)
+        assert response.status_code == 200, response.status_code
+        response.get_data()
+    return requests / (time.perf_counter() - start)
+
+
+def check_formats(client, paths, headers, mimetypes):
+    failures = []
+    for path in paths:
+        for mimetype in mimetypes:
+            miss, hit = (client.get(path, headers={**headers, 'Accept': mimetype}) for _ in range(2))
+            if (miss.status_code, hit.headers.get('X-Cache')) != (200, 'HIT') or \
+                    (hit.status_code, hit.mimetype, hit.get_data()) != (200, miss.mimetype, miss.get_data()):
+                failures.append(f'{path} [{mimetype}]: {miss.status_code} then {hit.status_code} '
+                                f'{hit.headers.get("X-Cache")}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "cache.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    import movers
+    from cache import MemoryBackend, RedisBackend, ResponseCache
+    from serializers import RESPONSE_MIMETYPES
+
+    seed(movers, args.users, args.bookings, random.Random(5))
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    paths = ['/api/admin/manage-users?all=1', '/api/admin/escrow?limit=200', '/api/driver/available-orders',
+             '/api/user/2']
+
+    backends = [
+        ('no cache', ResponseCache(MemoryBackend(), default_ttl=0)),
+        ('in-process', ResponseCache(MemoryBackend(), default_ttl=60)),
+        ('redis (fake)', ResponseCache(RedisBackend(FakeRedis()), default_ttl=60)),
+    ]
+    failures = []
+    for name, cache in backends[1:]:
+        movers.response_cache = cache
+        failures += [f'{name} {failure}' for failure in check_formats(client, paths, headers, RESPONSE_MIMETYPES)]
+        cache.clear()
+        cache.hits = cache.misses = 0
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+    for name, cache in backends:
+        movers.response_cache = cache
+        rate = run(client, paths, headers, args.requests)
+        print(f'{name:>13}: {rate:>8,.0f} req/s  {cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
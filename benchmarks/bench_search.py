@@ -0,0 +1,173 @@
+"""Compare admin ticket search over FTS5 with LIKE scans and the old download-everything approach.
+
+Usage: python benchmarks/bench_search.py [--tickets 1000000] [--users 20000] [--repeat 20] [--skip-download]
+
+"download" is what SupportTicketManagement.js did: fetch every ticket and user
+with ?all=1, then filter in the client (here, in Python). "like" is the naive
+server-side query, a LIKE '%term%' over the text columns, newest first.
+"fts" is /api/admin/search. Tickets are written through the triggers, so the
+seeding time includes keeping the index in sync.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOMAIN_WORDS = (
+    'sofa table bed wardrobe fridge lamp mirror piano boxes carton chair desk couch tv cooker mattress '
+    'damaged scratched broken late delayed missing lost refund charged twice overcharged rude driver '
+    'pickup dropoff apartment stairs lift gate parking truck van pickup invoice receipt wallet deposit '
+    'promo code discount cancel booking rebook schedule weekend kilimani westlands karen kileleshwa '
+    'runda lavington thika mombasa road nairobi'
+).split()
+FIRST_NAMES = 'amina brian chebet david esther faith george hassan irene james kevin lucy mary njeri otieno'.split()
+LAST_NAMES = 'kamau otieno wanjiru mwangi odhiambo kiptoo achieng mutua njoroge wafula'.split()
+
+
+def vocabulary(rng, filler):
+    words = list(DOMAIN_WORDS) + [f'w{n}' for n in range(filler)]
+    rng.shuffle(words)
+    weights = [1 / (rank + 1) for rank in range(len(words))]  # Zipf-like
+    cumulative, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return words, cumulative
+
+
+def seed(movers, args, rng):
+    from sqlalchemy import insert
+
+    db = movers.db
+    db.session.execute(insert(movers.User), [
+        {'name': f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}', 'phone': '0700000000',
+         'email': f'user{i}@example.com', 'password': 'x', 'role': 'user'}
+        for i in range(args.users)
+    ])
+    words, cumulative = vocabulary(rng, args.vocabulary)
+    text = lambda low, high: ' '.join(rng.choices(words, cum_weights=cumulative, k=rng.randint(low, high)))  # noqa: E731
+    start = datetime(2024, 1, 1)
+    for offset in range(0, args.tickets, 50000):
+        rows = []
+        for i in range(offset, min(offset + 50000, args.tickets)):
+            resolved = rng.random() < 0.6
+            rows.append({
+                'user_id': rng.randint(2, args.users + 1), 'subject': text(3, 6).capitalize(),
+                'message': text(15, 40).capitalize() + '.', 'status': 'resolved' if resolved else 'open',
+                'admin_reply': text(5, 15).capitalize() + '.' if resolved else None,
+                'created_at': start + timedelta(seconds=i * 30),
+            })
+        db.session.execute(insert(movers.SupportTicket), rows)
+    db.session.commit()
+    return words
+
+
+def timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--vocabulary', type=int, default=20000, help='filler words besides the domain words')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-download', action='store_true', help='skip the download-everything baseline')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'search.db')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['NOTIFICATION_DELIVERY_INTERVAL'] = '0'
+    os.environ['DISPATCH_WINDOW'] = '0'
+    import movers
+    from sqlalchemy import or_, select
+
+    rng = random.Random(21)
+    start = time.perf_counter()
+    with movers.app.app_context():
+        movers.init_db()
+        words = seed(movers, args, rng)
+    print(f'seeded {args.tickets:,} tickets and {args.users:,} users through the FTS triggers '
+          f'in {time.perf_counter() - start:.1f}s; database {os.path.getsize(path) / 1e6:.0f} MB')
+
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    domain = [word for word in words if not word.startswith('w')]
+    common, rare = domain[0], domain[-1]
+    queries = [
+        ('top word', words[0]),  # In most tickets, so ranking has to score nearly all of them
+        ('common word', common),
+        ('rare word', rare),
+        ('two words', f'{common} {rare}'),
+        ('prefix', rare[:3]),
+        ('user email', 'user1234@example'),
+    ]
+
+    def download(term):
+        def run():
+            tickets = json.loads(client.get('/api/admin/all-support-tickets?all=1', headers=headers).get_data())
+            users = json.loads(client.get('/api/admin/manage-users?all=1', headers=headers).get_data())
+            term_lower = term.lower()
+            return [t for t in tickets['tickets']
+                    if term_lower in t['subject'].lower() or term_lower in t['message'].lower()
+                    or term_lower in (t['admin_reply'] or '').lower()] + \
+                   [u for u in users['users'] if term_lower in u['name'].lower() or term_lower in u['email'].lower()]
+        return run
+
+    def like(term):
+        def run():
+            pattern = f'%{term}%'
+            ticket, user = movers.SupportTicket, movers.User
+            with movers.app.app_context():
+                tickets = movers.fetch_rows(
+                    select(*movers.TICKET_COLUMNS)
+                    .where(or_(ticket.subject.like(pattern), ticket.message.like(pattern),
+                               ticket.admin_reply.like(pattern)))
+                    .order_by(ticket.created_at.desc(), ticket.id.desc()).limit(50)
+                )
+                users = movers.fetch_rows(
+                    select(*movers.USER_LIST_COLUMNS)
+                    .where(or_(user.name.like(pattern), user.email.like(pattern))).limit(50)
+                )
+            return tickets + users
+        return run
+
+    def fts(term, extra=''):
+        def run():
+            response = client.get(f'/api/admin/search?q={term}{extra}', headers=headers)
+            assert response.status_code == 200, response.get_data()
+            body = response.json
+            return body.get('tickets', []) + body.get('users', [])
+        return run
+
+    print(f"{'query':<12} {'approach':<26} {'median ms':>10} {'max ms':>10} {'hits':>6}")
+    for label, term in queries:
+        runs = [('like', like(term), args.repeat),
+                ('fts relevance', fts(term), args.repeat),
+                ('fts recent', fts(term, '&sort=recent'), args.repeat),
+                ('fts relevance status=open', fts(term, '&type=tickets&status=open'), args.repeat)]
+        if not args.skip_download:
+            runs.insert(0, ('download + filter', download(term), 1))
+        for name, fn, repeat in runs:
+            hits, median, worst = timed(fn, repeat)
+            print(f'{label:<12} {name:<26} {median:>10.1f} {worst:>10.1f} {len(hits):>6}')
+
+
+if __name__ == '__main__':
+    main()
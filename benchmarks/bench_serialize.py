@@ -0,0 +1,138 @@
+"""Time response encoding per 10k rows for each model's list projection: the old path against the row serializers.
+
+Usage: python benchmarks/bench_serialize.py [--rows 10000] [--repeat 10]
+
+"flask dicts" is what the list endpoints used to do: turn each result row's
+RowMapping into a dict and encode with Flask's default JSON provider. The
+serializer paths build dicts from the raw row tuples and encode with the
+stdlib, with orjson and with MessagePack (each only when installed). The
+compression lines time gzip and Brotli over the JSON body.
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(movers, rows):
+    from sqlalchemy import insert
+
+    db = movers.db
+    start = datetime(2024, 1, 1)
+    stamp = lambda i: start + timedelta(seconds=i * 37)  # noqa: E731
+    db.session.execute(insert(movers.User), [
+        {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'user{i}@example.com', 'password': 'x',
+         'role': 'driver' if i % 10 == 0 else 'user', 'created_at': stamp(i)}
+        for i in range(2, rows + 2)
+    ])
+    db.session.execute(insert(movers.Driver), [
+        {'id': i, 'user_id': i + 1, 'vehicle_type': 'Van', 'license_plate': f'KDA {i:05d}', 'ratings': 4.25,
+         'completed_orders': i % 300}
+        for i in range(1, rows + 1)
+    ])
+    db.session.execute(insert(movers.Booking), [
+        {'id': i, 'user_id': i % rows + 2, 'driver_id': i % rows + 1, 'pickup_location': '-1.286389,36.817223',
+         'dropoff_location': '-1.292066,36.821945', 'distance': 12.5, 'price': 1450.75, 'status': 'completed',
+         'created_at': stamp(i)}
+        for i in range(1, rows + 1)
+    ])
+    db.session.execute(insert(movers.Transaction), [
+        {'id': i, 'user_id': i % rows + 2, 'transaction_id': f'tx-{i}', 'amount': 250.0, 'type': 'deposit',
+         'status': 'completed', 'created_at': stamp(i)}
+        for i in range(1, rows + 1)
+    ])
+    db.session.execute(insert(movers.Notification), [
+        {'id': i, 'user_id': i % rows + 2, 'message': f'Driver {i} has accepted your booking.', 'is_read': i % 3 == 0,
+         'created_at': stamp(i)}
+        for i in range(1, rows + 1)
+    ])
+    db.session.execute(insert(movers.SupportTicket), [
+        {'id': i, 'user_id': i % rows + 2, 'subject': 'Late pickup', 'status': 'resolved',
+         'message': 'The driver arrived forty minutes late and the sofa was scratched on the stairs.',
+         'admin_reply': 'Sorry about that, we have refunded the booking fee.', 'created_at': stamp(i)}
+        for i in range(1, rows + 1)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "serialize.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['DISPATCH_WINDOW'] = '0'
+    os.environ['ARCHIVE_INTERVAL'] = '0'
+    import movers
+    import serializers
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy import select
+
+    m = movers
+    projections = {
+        'Booking': select(*m.EXPORTS['bookings'][1]),
+        'Transaction': select(*m.TRANSACTION_COLUMNS),
+        'Notification': select(*m.NOTIFICATION_COLUMNS),
+        'SupportTicket': select(*m.TICKET_COLUMNS),
+        'User': select(*m.USER_LIST_COLUMNS),
+        'Driver': select(m.Driver.id.label('driver_id'), m.User.name, m.Driver.vehicle_type, m.Driver.ratings,
+                         m.Driver.completed_orders).join(m.User, m.Driver.user_id == m.User.id),
+    }
+    flask_json = DefaultJSONProvider(m.app)
+    stdlib = lambda obj: json.dumps(  # noqa: E731
+        obj, default=serializers.encode_default, sort_keys=True, separators=(',', ':')).encode()
+
+    with m.app.app_context():
+        m.init_db()
+        seed(m, args.rows)
+        print(f'JSON backend: {serializers.JSON_BACKEND}; msgpack {"yes" if serializers.msgpack else "no"}, '
+              f'brotli {"yes" if serializers.brotli else "no"}')
+        print(f"{'model':<14} {'path':<24} {'ms / 10k rows':>14} {'bytes':>11}")
+        for model, stmt in projections.items():
+            rows = m.db.session.execute(stmt.limit(args.rows)).all()
+            scale = 10000 / len(rows)
+            serializer = serializers.serializer_for(stmt)
+            paths = [
+                ('flask dicts', lambda: flask_json.dumps(
+                    {'rows': [dict(row._mapping) for row in rows]}, separators=(',', ':')).encode()),
+                ('serializer + json', lambda: stdlib({'rows': serializer.dicts(rows)})),
+            ]
+            if serializers.orjson is not None:
+                paths.append(('serializer + orjson', lambda: serializers.dumps({'rows': serializer.dicts(rows)})))
+            if serializers.msgpack is not None:
+                paths.append(('serializer + msgpack', lambda: serializers.msgpack_dumps({'rows': serializer.dicts(rows)})))
+            body = None
+            for name, encode in paths:
+                body, median = timed(encode, args.repeat)
+                print(f'{model:<14} {name:<24} {median * scale:>14.2f} {len(body) * scale:>11,.0f}')
+            json_body = serializers.dumps({'rows': serializer.dicts(rows)})
+            compressors = [('gzip -6', lambda: gzip.compress(json_body, 6))]
+            if serializers.brotli is not None:
+                compressors.append(('brotli q5', lambda: serializers.brotli.compress(json_body, quality=5)))
+            for name, run in compressors:
+                compressed, median = timed(run, args.repeat)
+                print(f'{model:<14} {"  + " + name:<24} {median * scale:>14.2f} {len(compressed) * scale:>11,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Measure booking write throughput as drivers are spread over more region shards.
+
+Usage: python benchmarks/bench_shards.py [--shards 1 2 4 8] [--threads 16] [--seconds 10] [--commit-latency-ms 0]
+
+Each shard count runs in its own process, because SHARD_REGIONS is read at
+import. The regions are side-by-side boxes, and the default shard takes the
+drivers outside all of them. Drivers are registered through the API with a home
+location, so they are spread evenly over the shards and get ids from their
+shard's range. Then parallel clients book a random driver and accept the
+booking as that driver, for a fixed time. Every write lands in the driver's
+shard, so the writes only wait on each other within a shard.
+
+SQLite allows one writer per database file, and a commit holds that lock until
+its fsync returns. With the default --synchronous FULL every commit waits for
+fsync, as a durable deployment would, and the waits overlap across shards.
+Where fsync is nearly free (local NVMe, tmpfs, most VMs' write caches) one
+process is CPU-bound either way. --commit-latency-ms then adds a sleep to each
+commit while it holds the lock, to stand in for networked block storage.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def region_spec(shards):
+    # Shard 0 is the default shard; the others are one-degree boxes along the equator
+    return ';'.join(f'r{index}:0,{index},1,{index + 1}' for index in range(1, shards))
+
+
+def home_location(shard_index):
+    return '-5.5,0.5' if shard_index == 0 else f'0.5,{shard_index + 0.5}'
+
+
+def run(args):
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "main.db")}'
+    os.environ['SHARD_DIR'] = tmp
+    os.environ['SHARD_REGIONS'] = region_spec(args.run)
+    os.environ['SQLITE_SYNCHRONOUS'] = args.synchronous
+    os.environ['SQLITE_BUSY_TIMEOUT_MS'] = '60000'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['NOTIFICATION_DELIVERY_INTERVAL'] = '0'
+    os.environ['DISPATCH_WINDOW'] = '0'
+    os.environ['ARCHIVE_INTERVAL'] = '0'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    import movers
+    from sharding import SHARD_ID_BITS
+    from sqlalchemy import insert, select
+
+    app = movers.create_app()
+    if args.commit_latency_ms:
+        from sqlalchemy import event
+        with app.app_context():
+            for engine in movers.db.engines.values():
+                # Fires just before the driver's COMMIT, with the write lock held
+                event.listen(engine, 'commit', lambda conn: time.sleep(args.commit_latency_ms / 1000))
+    with app.app_context():
+        movers.db.session.execute(insert(movers.User), [
+            {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x'}
+            for i in range(2, 202)
+        ])
+        movers.db.session.commit()
+    client = app.test_client()
+    for i in range(args.drivers):
+        response = client.post('/api/register', json={
+            'name': f'Driver {i}', 'phone': '0700000000', 'email': f'd{i}@example.com', 'password': 'x',
+            'role': 'driver', 'vehicle_type': 'van', 'license_plate': f'KDA {i:03d}',
+            'home_location': home_location(i % args.run),
+        })
+        assert response.status_code == 200, response.get_json()
+    drivers = [driver_id for ids in movers.on_shards(
+        lambda shard: movers.db.session.execute(select(movers.Driver.id)).scalars().all()
+    ) for driver_id in ids]
+    per_shard = [sum(1 for driver_id in drivers if driver_id >> SHARD_ID_BITS == index) for index in range(args.run)]
+
+    writes = [0] * args.threads
+    errors = [0] * args.threads
+    stop = threading.Event()
+
+    def worker(slot):
+        rng = random.Random(slot)
+        writer = app.test_client()
+        while not stop.is_set():
+            driver_id = rng.choice(drivers)
+            booked = writer.post('/api/user/book-driver', json={
+                'user_id': rng.randint(2, 201), 'driver_id': driver_id,
+                'pickup_location': '-1.286389,36.817223', 'dropoff_location': '-1.292066,36.821945',
+            })
+            if booked.status_code != 200:
+                errors[slot] += 1
+                continue
+            accepted = writer.post(f"/api/driver/accept-order/{booked.get_json()['booking_id']}",
+                                   json={'driver_id': driver_id})
+            writes[slot] += 1 + (accepted.status_code == 200)
+            errors[slot] += accepted.status_code != 200
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'shards': args.run, 'drivers': per_shard, 'writes': sum(writes), 'errors': sum(errors),
+                      'seconds': elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--drivers', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--synchronous', default='FULL', help='SQLITE_SYNCHRONOUS for every database')
+    parser.add_argument('--commit-latency-ms', type=float, default=0, help='simulated storage latency per commit')
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)  # one shard count, in a child process
+    args = parser.parse_args()
+    if args.run:
+        run(args)
+        return
+
+    print(f"{'shards':>6} {'writes/s':>10} {'speedup':>8} {'errors':>7}  drivers per shard")
+    baseline = None
+    for shards in args.shards:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', str(shards), '--drivers', str(args.drivers),
+             '--threads', str(args.threads), '--seconds', str(args.seconds), '--synchronous', args.synchronous,
+             '--commit-latency-ms', str(args.commit_latency_ms)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        rate = result['writes'] / result['seconds']
+        baseline = baseline or rate
+        print(f"{shards:>6} {rate:>10,.0f} {rate / baseline:>7.2f}x {result['errors']:>7}  "
+              f"{' '.join(map(str, result['drivers']))}")
+
+
+if __name__ == '__main__':
+    main()
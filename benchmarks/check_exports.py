@@ -0,0 +1,89 @@
+"""Check that CSV exports escape formula-like cells and leave numbers and coordinates as they are.
+
+Usage: python benchmarks/check_exports.py
+
+A scratch database gets bookings whose locations and promo codes start with
+spreadsheet formula characters, negative coordinates among them. The promo code
+of the first booking is NULL, so that column goes through the converter for
+columns that start out NULL. The admin CSV export must prefix every formula with
+a quote and write signed numbers and "lat,lng" pairs unchanged. Exits non-zero
+on any mismatch.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# value stored -> value expected in the CSV
+CELLS = {
+    '-1.286400,36.817200': '-1.286400,36.817200',
+    '-1.3,-36.8': '-1.3,-36.8',
+    '+1.5': '+1.5',
+    '-42': '-42',
+    '=HYPERLINK("http://example.com")': '\'=HYPERLINK("http://example.com")',
+    '-2+3': "'-2+3",
+    '+cmd|/C calc': "'+cmd|/C calc",
+    '@SUM(A1:A2)': "'@SUM(A1:A2)",
+    '-1.28,36.82,1': "'-1.28,36.82,1",
+    'Nairobi CBD': 'Nairobi CBD',
+}
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "exports.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+
+    from sqlalchemy import insert
+
+    import movers
+
+    with movers.app.app_context():
+        movers.init_db()
+        db = movers.db
+        db.session.execute(insert(movers.User), [
+            {'id': 100, 'name': 'User', 'phone': '0700000000', 'email': 'u@example.com', 'password': 'x'},
+        ])
+        db.session.execute(insert(movers.Driver), [
+            {'id': 100, 'user_id': 100, 'vehicle_type': 'van', 'license_plate': 'KAA 100A'},
+        ])
+        db.session.execute(insert(movers.Booking), [
+            {'user_id': 100, 'driver_id': 100, 'pickup_location': value, 'dropoff_location': value,
+             'distance': 1.0, 'price': 1.0, 'promo_code': value if i else None}
+            for i, value in enumerate(CELLS)
+        ])
+        db.session.commit()
+
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    response = client.get('/api/admin/export/bookings?format=csv', headers={'Authorization': f'Bearer {token}'})
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+    failures = []
+    if response.status_code != 200 or len(rows) != len(CELLS):
+        failures.append(f'export answered {response.status_code} with {len(rows)} rows for {len(CELLS)} bookings')
+    for i, (row, (stored, expected)) in enumerate(zip(rows, CELLS.items())):
+        for column in ('pickup_location', 'dropoff_location', 'promo_code'):
+            if column == 'promo_code' and not i:
+                continue
+            if row[column] != expected:
+                failures.append(f'{column}: {stored!r} was written as {row[column]!r}, expected {expected!r}')
+
+    print(f'{len(rows)} bookings exported, {len(failures)} mismatched cells')
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('OK: formulas are escaped, numbers and coordinates are written as they are')
+
+
+if __name__ == '__main__':
+    main()
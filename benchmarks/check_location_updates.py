@@ -0,0 +1,118 @@
+"""Check that location pings reach driver search before they are flushed, and that bad points are rejected.
+
+Usage: python benchmarks/check_location_updates.py
+
+A scratch database gets a freshly registered driver with no stored position, and
+the location flush interval is set far beyond the run, so every ping stays in the
+location hub. The driver pings, and the first search near that position must find
+them; after a ping elsewhere, a search at the old position must not. Bulk points
+stamped in the future or in milliseconds, and points older than the driver's
+current position, must be counted as rejected and must not block later points,
+and a malformed single ping must answer 400. Exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HERE = '-1.286400,36.817200'
+THERE = '-1.100000,37.000000'
+
+
+def search(client, pickup):
+    response = client.post('/api/user/search-drivers', json={
+        'pickup_location': pickup, 'dropoff_location': '-1.300000,36.830000', 'radius_km': 5,
+    })
+    return response.status_code, [driver['driver_id'] for driver in response.json.get('drivers', [])]
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "locations.db")}'
+    os.environ['LOCATION_FLUSH_INTERVAL'] = '3600'
+    os.environ['CACHE_DEFAULT_TTL'] = '0'
+    os.environ['SEARCH_CACHE_TTL'] = '0'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+
+    from sqlalchemy import select
+
+    from movers import Driver, User, app, db
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'name': 'Driver', 'phone': '0700000000', 'email': 'driver@example.com', 'password': 'secret', 'role': 'driver',
+    })
+    with app.app_context():
+        driver_id = db.session.execute(
+            select(Driver.id).join(User, Driver.user_id == User.id).where(User.id == response.json['user_id'])
+        ).scalar_one()
+
+    failures = []
+
+    def check(name, response, status=200):
+        if response.status_code != status:
+            failures.append(f'{name}: answered {response.status_code}, expected {status}')
+
+    # 1. A ping held only in the location hub is found by the first search
+    check('ping', client.post('/api/driver/update-location', json={'driver_id': driver_id, 'live_location': HERE}))
+    status, found = search(client, HERE)
+    print(f'first search after a ping: {status} {found}')
+    if driver_id not in found:
+        failures.append('first search: the driver who pinged was not found')
+
+    # 2. Once the index is built, a later ping moves the driver
+    check('move', client.post('/api/driver/update-location', json={'driver_id': driver_id, 'live_location': THERE}))
+    _, found_here = search(client, HERE)
+    _, found_there = search(client, THERE)
+    print(f'after moving: {found_here} at the old position, {found_there} at the new one')
+    if driver_id in found_here or driver_id not in found_there:
+        failures.append('move: search still sees the old position')
+
+    # 3. Bulk points from the future, in milliseconds or older than the current position are rejected
+    now = time.time()
+    lat, lng = map(float, THERE.split(','))
+    batch = [
+        {'driver_id': driver_id, 'lat': lat, 'lng': lng, 'timestamp': now * 1000},
+        {'driver_id': driver_id, 'lat': lat, 'lng': lng, 'timestamp': now + 3600},
+        {'driver_id': driver_id, 'lat': lat, 'lng': lng, 'timestamp': now - 3600},
+        {'driver_id': driver_id, 'lat': lat, 'lng': lng, 'timestamp': 'nan'},
+    ]
+    response = client.post('/api/driver/update-locations', json={'points': batch})
+    print(f'bulk with bad timestamps: {response.status_code} {response.json}')
+    if response.json != {'accepted': 0, 'rejected': len(batch)}:
+        failures.append(f'bulk: bad timestamps answered {response.json}')
+    lat, lng = map(float, HERE.split(','))
+    response = client.post('/api/driver/update-locations', json={'points': [
+        {'driver_id': driver_id, 'lat': lat, 'lng': lng, 'timestamp': time.time()},
+    ]})
+    _, found = search(client, HERE)
+    print(f'bulk ping afterwards: {response.json}, search finds {found}')
+    if response.json != {'accepted': 1, 'rejected': 0} or driver_id not in found:
+        failures.append('bulk: a current point after bad timestamps did not move the driver')
+
+    # 4. A malformed single ping is refused
+    for live_location in ('nowhere', '91,0', '1,2,3', {'lat': 'x'}, ['1']):
+        check(f'ping {live_location!r}', client.post('/api/driver/update-location', json={
+            'driver_id': driver_id, 'live_location': live_location}), status=400)
+
+    with app.app_context():
+        stored = db.session.get(Driver, driver_id).live_location
+    if stored is not None:
+        failures.append(f'the position was flushed to the database ({stored}), so the hub was not tested')
+
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('OK: search sees positions still only in the location hub, and bad points are rejected')
+
+
+if __name__ == '__main__':
+    main()
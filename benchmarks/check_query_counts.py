@@ -0,0 +1,104 @@
+"""Check that the list endpoints run the same number of SQL statements whatever the number of rows.
+
+Usage: python benchmarks/check_query_counts.py [--rows 200] [--factor 10]
+
+Two scratch databases are seeded with the same users and drivers, one with
+--rows bookings, transactions, notifications, reviews and tickets and one with
+--factor times as many. Each list endpoint is fetched once from each database
+with EXPOSE_QUERY_COUNT=1 and the response cache off, and its X-Query-Count
+must be the same in both. Pages are large enough that the responses carry
+--factor times as many rows too. Each seeding runs in its own process, because
+the app reads its configuration at import. Exits non-zero on any difference.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TRIP = {'pickup_location': '-1.286400,36.817200', 'dropoff_location': '-1.300000,36.830000'}
+
+
+def requests_for(user_id, driver_id):
+    """(name, method, path, json body, admin) for every list endpoint."""
+    return [
+        ('user order history', 'GET', f'/api/user/order-history/{user_id}?limit=200', None, False),
+        ('driver order history', 'GET', f'/api/driver/order-history/{driver_id}?limit=200', None, False),
+        ('payment history', 'GET', f'/api/user/payment-history/{user_id}?limit=200', None, False),
+        ('user notifications', 'GET', f'/api/user/notifications/{user_id}?limit=200', None, False),
+        ('driver notifications', 'GET', f'/api/driver/notifications/{driver_id}?limit=200', None, False),
+        ('driver reviews', 'GET', f'/api/driver/{driver_id}/reviews?limit=200', None, False),
+        ('user support tickets', 'GET', f'/api/user/support-tickets?user_id={user_id}', None, False),
+        ('available orders', 'GET', '/api/driver/available-orders', None, False),
+        ('search drivers', 'POST', '/api/user/search-drivers', {**TRIP, 'limit': 100, 'radius_km': 50}, False),
+        ('manage users', 'GET', '/api/admin/manage-users?limit=200', None, True),
+        ('escrow', 'GET', '/api/admin/escrow?limit=200', None, True),
+        ('support tickets', 'GET', '/api/admin/support-tickets?limit=200', None, True),
+        ('all support tickets', 'GET', '/api/admin/all-support-tickets?limit=200', None, True),
+        ('driver stats', 'GET', '/api/admin/stats/drivers?limit=200', None, True),
+    ]
+
+
+def run(args):
+    from benchmarks.suite.seed import VOLUMES, seed_database
+
+    scaled = ('bookings', 'transactions', 'notifications', 'reviews', 'tickets')
+    volumes = {**VOLUMES, 'users': 20, 'drivers': 10, 'promo_codes': 5, 'dispatch_requests': 10,
+               **{name: args.run for name in scaled}}
+    path = os.path.join(tempfile.mkdtemp(), 'counts.db')
+    seed_database(path, volumes, CACHE_DEFAULT_TTL=0, INTASEND_RECONCILE_INTERVAL=0,
+                  NOTIFICATION_DELIVERY_INTERVAL=0)
+    import movers
+    from benchmarks.suite.scenarios import Fixtures
+
+    fixtures = Fixtures(path)
+    client = movers.app.test_client()
+    token = client.post('/api/login', json={'email': 'admin@movingapp.com', 'password': 'admin#cuba'}).json['token']
+    counts = {}
+    for name, method, path, body, admin in requests_for(fixtures.user_ids[0], fixtures.driver_ids[0]):
+        headers = {'Authorization': f'Bearer {token}'} if admin else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        counts[name] = [response.status_code, int(response.headers.get('X-Query-Count', -1)),
+                        len(response.get_data())]
+    print(json.dumps(counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200, help='rows per table in the smaller database')
+    parser.add_argument('--factor', type=int, default=10)
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)  # one database size, in a child process
+    args = parser.parse_args()
+    if args.run:
+        run(args)
+        return
+
+    small, large = (
+        json.loads(subprocess.run([sys.executable, os.path.abspath(__file__), '--run', str(rows)],
+                                  check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1])
+        for rows in (args.rows, args.rows * args.factor)
+    )
+    failures = []
+    print(f"{'endpoint':<22} {'queries':>7} {'x' + str(args.factor):>7} {'bytes':>8} {'x' + str(args.factor):>9}")
+    for name, (status, queries, size) in small.items():
+        large_status, large_queries, large_size = large[name]
+        print(f'{name:<22} {queries:>7} {large_queries:>7} {size:>8,} {large_size:>9,}')
+        if (status, large_status) != (200, 200):
+            failures.append(f'{name}: answered {status} and {large_status}')
+        elif queries < 0:
+            failures.append(f'{name}: no X-Query-Count header')
+        elif queries != large_queries:
+            failures.append(f'{name}: {queries} queries with {args.rows} rows, '
+                            f'{large_queries} with {args.rows * args.factor}')
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('OK: query counts do not grow with the number of rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Local stand-in for the IntaSend payment status API, with injectable latency and errors.
+
+Usage: python benchmarks/intasend_stub.py [--port 8765] [--latency 0.2] [--error-rate 0.1]
+
+Point the app at it with INTASEND_API_BASE=http://127.0.0.1:8765/api/v1. Every
+payment reports COMPLETE unless its id contains "fail" (FAILED) or "pending"
+(PENDING); --error-rate answers that share of requests with a 503.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUS_PATH = re.compile(r'^/api/v1/payment/status/([^/]+)/?$')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        match = STATUS_PATH.match(self.path)
+        if not match:
+            return self._reply(404, {'detail': 'Not found'})
+        if server.rng.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            return self._reply(503, {'detail': 'Injected failure'})
+
+        intasend_id = match.group(1)
+        status = 'FAILED' if 'fail' in intasend_id else 'PENDING' if 'pending' in intasend_id else 'COMPLETE'
+        self._reply(200, {'invoice_id': intasend_id, 'status': status})
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        try:
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client timed out and went away
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, latency=0.0, error_rate=0.0, seed=1):
+    """Start the stub on a background thread; returns the server (see `.base_url`, `.shutdown()`)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.errors = 0
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.latency, args.error_rate)
+    print(f'IntaSend stub listening on {server.base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
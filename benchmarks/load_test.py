@@ -0,0 +1,125 @@
+"""Measure requests/sec against serve.py at several worker counts.
+
+Usage: python benchmarks/load_test.py [--workers 1 2 4] [--clients 16] [--duration 10]
+
+Each run starts `serve.py` on a scratch copy of the database, drives a mix of
+read endpoints from concurrent client threads for the given duration, then
+stops the server. Admin endpoints are called with the seeded admin's token, and
+any 4xx or 5xx answer counts as an error. Point --database at a seeded database for realistic numbers.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.suite.inprocess import ADMIN_LOGIN  # noqa: E402
+
+ENDPOINTS = [
+    '/',
+    '/api/admin/manage-users',
+    '/api/admin/escrow',
+    '/api/driver/available-orders',
+    '/api/admin/support-tickets',
+    '/api/user/1',
+    '/api/user/order-history/1',
+    '/api/user/notifications/1',
+]
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start within {timeout}s')
+
+
+def drive(base_url, clients, duration):
+    counts = [0] * clients
+    errors = [0] * clients
+    token = requests.post(base_url + '/api/login', json=ADMIN_LOGIN, timeout=30).json()['token']
+    stop = time.time() + duration
+
+    def client(number):
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {token}'
+        i = number
+        while time.time() < stop:
+            try:
+                response = session.get(base_url + ENDPOINTS[i % len(ENDPOINTS)], timeout=10)
+                if response.status_code >= 400:
+                    errors[number] += 1
+                else:
+                    counts[number] += 1
+            except requests.RequestException:
+                errors[number] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.time() - start), sum(errors)
+
+
+def run(workers, args, database):
+    port = args.port
+    env = dict(
+        os.environ,
+        SERVER=args.server,
+        WORKERS=str(workers),
+        THREADS=str(args.threads),
+        BIND=f'127.0.0.1:{port}',
+        ACCESS_LOG='',
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{database}',
+    )
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py')], env=env, cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_until_up(base_url)
+        drive(base_url, args.clients, 1)  # warm up
+        return drive(base_url, args.clients, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--server', default='gunicorn', choices=['gunicorn', 'werkzeug'])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--database', default=os.path.join(ROOT, 'instance', 'moving_app.db'),
+                        help='SQLite database to copy for the run')
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>10} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            database = os.path.join(tmp, f'load_{workers}.db')
+            if os.path.exists(args.database):
+                shutil.copy(args.database, database)
+            rate, errors = run(workers, args, database)
+            print(f'{workers:>7} {rate:>10.1f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Replay synthetic ride demand through the dispatcher and report match latency and throughput.
+
+Usage: python benchmarks/simulate_dispatch.py [--drivers 3000] [--requests 2000] [--windows 5] [--window 2]
+
+Each window, --requests ride requests arrive spread over the previous --window
+seconds (their created_at is back-dated, so no real waiting happens), then one
+dispatcher pass runs. Latency is created_at -> assigned_at, i.e. time spent
+queued plus the pass itself. Bookings are completed between windows so the
+driver pool recovers, as it would in a long-running system.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CENTER = (-1.2864, 36.8172)  # Nairobi CBD
+VEHICLES = ['Pickup', 'Van', 'Truck']
+
+
+def jitter(rng, spread_deg):
+    return CENTER[0] + rng.gauss(0, spread_deg), CENTER[1] + rng.gauss(0, spread_deg)
+
+
+def seed_drivers(movers, count, rng, spread_deg):
+    from sqlalchemy import insert
+
+    db = movers.db
+    db.session.execute(insert(movers.User), [
+        {'name': f'Driver {i}', 'phone': '0700000000', 'email': f'driver{i}@example.com', 'password': 'x',
+         'role': 'driver'} for i in range(count)
+    ])
+    db.session.execute(insert(movers.User), [
+        {'name': 'Rider', 'phone': '0700000000', 'email': 'rider@example.com', 'password': 'x', 'role': 'user'}
+    ])
+    db.session.execute(insert(movers.Driver), [
+        {'user_id': i + 2, 'vehicle_type': rng.choice(VEHICLES), 'license_plate': f'KAA {i:04d}',
+         'is_available': True, 'ratings': round(rng.uniform(3.0, 5.0), 2),
+         'live_location': '%.6f,%.6f' % jitter(rng, spread_deg)} for i in range(count)
+    ])
+    db.session.commit()
+    return count + 2  # The rider's user id
+
+
+def enqueue(movers, rider_id, count, window, rng, spread_deg):
+    from sqlalchemy import insert
+
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(count):
+        pickup, dropoff = jitter(rng, spread_deg), jitter(rng, spread_deg)
+        rows.append({
+            'user_id': rider_id, 'pickup_location': '%.6f,%.6f' % pickup, 'dropoff_location': '%.6f,%.6f' % dropoff,
+            'pickup_lat': pickup[0], 'pickup_lng': pickup[1], 'dropoff_lat': dropoff[0], 'dropoff_lng': dropoff[1],
+            'vehicle_type': rng.choice([None, None] + VEHICLES), 'status': 'queued',
+            'created_at': now - timedelta(seconds=rng.uniform(0, window)),
+        })
+    movers.db.session.execute(insert(movers.DispatchRequest), rows)
+    movers.db.session.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=3000)
+    parser.add_argument('--requests', type=int, default=2000, help='ride requests per window')
+    parser.add_argument('--windows', type=int, default=5)
+    parser.add_argument('--window', type=float, default=2.0, help='seconds of demand per window')
+    parser.add_argument('--spread', type=float, default=0.05, help='std-dev of positions in degrees')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "dispatch.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['NOTIFICATION_DELIVERY_INTERVAL'] = '0'
+    os.environ['DISPATCH_WINDOW'] = '0'  # Passes are driven from here
+    os.environ['DISPATCH_BATCH'] = str(max(args.requests * 2, 5000))
+    import dispatch
+    import movers
+    from sqlalchemy import func, select, update
+
+    rng = random.Random(16)
+    with movers.app.app_context():
+        movers.init_db()
+        rider_id = seed_drivers(movers, args.drivers, rng, args.spread)
+
+    solver = 'scipy' if dispatch.min_weight_full_bipartite_matching is not None else 'auction'
+    print(f'{args.drivers:,} drivers, {args.requests:,} requests/window, {args.windows} windows, solver={solver}')
+    total_assigned = 0
+    pass_seconds = 0.0
+    for window in range(args.windows):
+        with movers.app.app_context():
+            enqueue(movers, rider_id, args.requests, args.window, rng, args.spread)
+        start = time.perf_counter()
+        assigned = movers.run_dispatch_window()
+        elapsed = time.perf_counter() - start
+        total_assigned += assigned
+        pass_seconds += elapsed
+        print(f'window {window + 1}: assigned {assigned:>6,}  pass {elapsed * 1000:>8.1f} ms')
+        with movers.app.app_context():
+            # Trips finish before the next window, freeing their drivers
+            movers.db.session.execute(
+                update(movers.Booking).where(movers.Booking.status == 'pending').values(status='completed')
+            )
+            movers.db.session.commit()
+
+    with movers.app.app_context():
+        rows = movers.db.session.execute(
+            select(movers.DispatchRequest.created_at, movers.DispatchRequest.assigned_at)
+            .where(movers.DispatchRequest.status == 'assigned')
+        ).all()
+        queued = movers.db.session.execute(
+            select(func.count()).where(movers.DispatchRequest.status == 'queued')
+        ).scalar()
+    latencies = [(assigned_at - created_at).total_seconds() * 1000 for created_at, assigned_at in rows]
+
+    print(f'matched {total_assigned:,} of {args.requests * args.windows:,} ({queued:,} still queued)')
+    if latencies:
+        print('match latency ms: p50 %.0f  p95 %.0f  p99 %.0f' % tuple(
+            percentile(latencies, pct) for pct in (50, 95, 99)))
+    print(f'dispatcher throughput: {total_assigned / pass_seconds:,.0f} assignments/s of pass time')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Race concurrent accepts and cancellations on the same bookings and verify each transition wins at most once.
+
+Usage: python benchmarks/stress_bookings.py [--bookings 1000] [--accepts 4] [--threads 32]
+
+Every pending booking gets several accepts from its driver, one from another
+driver, a user cancellation and a driver cancellation, shuffled and fired from
+parallel clients against a scratch database. Afterwards no booking may have
+been accepted twice or both accepted and cancelled by its user, its final
+status must follow from the transitions that won, there must be exactly one
+notification per winning transition and the dashboard counters must match a
+rebuild from the bookings table. Exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--drivers', type=int, default=20)
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--accepts', type=int, default=4, help='accepts sent per booking by its own driver')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "stress.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['NOTIFICATION_DELIVERY_INTERVAL'] = '0'  # leave notifications in the outbox to count them
+    os.environ['DISPATCH_WINDOW'] = '0'
+    os.environ.setdefault('SQLITE_BUSY_TIMEOUT_MS', '30000')
+
+    from sqlalchemy import func, insert, select
+
+    from movers import Booking, Driver, NotificationOutbox, StatCounter, User, app, db, rebuild_stats
+
+    rng = random.Random(22)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x',
+             'role': 'driver' if i > args.users else 'user'}
+            for i in range(1, args.users + args.drivers + 1)
+        ])
+        db.session.execute(insert(Driver), [
+            {'id': i, 'user_id': args.users + i, 'vehicle_type': 'van', 'license_plate': f'KDA {i:03d}',
+             'is_available': True}
+            for i in range(1, args.drivers + 1)
+        ])
+        bookings = [
+            {'id': i, 'user_id': rng.randint(1, args.users), 'driver_id': rng.randint(1, args.drivers),
+             'pickup_location': 'Westlands', 'dropoff_location': 'Karen', 'distance': 12.0,
+             'price': round(rng.uniform(500, 5000), 2), 'status': 'pending'}
+            for i in range(1, args.bookings + 1)
+        ]
+        db.session.execute(insert(Booking), bookings)
+        db.session.commit()
+        rebuild_stats()
+
+    calls = []
+    for booking in bookings:
+        booking_id, driver_id = booking['id'], booking['driver_id']
+        other = driver_id % args.drivers + 1
+        calls.extend(('accept', booking_id, driver_id) for _ in range(args.accepts))
+        calls.append(('accept', booking_id, other))
+        calls.append(('user_cancel', booking_id, None))
+        calls.append(('driver_cancel', booking_id, driver_id))
+    rng.shuffle(calls)
+    paths = {'accept': '/api/driver/accept-order/{}', 'user_cancel': '/api/user/cancel-order/{}',
+             'driver_cancel': '/api/driver/cancel-order/{}'}
+
+    def fire(call):
+        action, booking_id, driver_id = call
+        client = app.test_client()
+        body = {'driver_id': driver_id} if driver_id is not None else None
+        response = client.post(paths[action].format(booking_id), json=body)
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = list(pool.map(fire, calls))
+    elapsed = time.perf_counter() - start
+
+    wins = defaultdict(Counter)
+    for (action, booking_id, _), code in zip(calls, codes):
+        if code == 200:
+            wins[booking_id][action] += 1
+
+    failures = []
+    with app.app_context():
+        statuses = dict(db.session.execute(select(Booking.id, Booking.status)).all())
+        for booking_id, status in statuses.items():
+            won = wins[booking_id]
+            if won['accept'] > 1 or won['user_cancel'] > 1 or won['driver_cancel'] > 1:
+                failures.append(f'booking {booking_id}: a transition won more than once {dict(won)}')
+            if won['accept'] + won['user_cancel'] != 1:
+                failures.append(f'booking {booking_id}: accept and user cancel both or neither won {dict(won)}')
+            if won['driver_cancel'] > won['accept']:
+                failures.append(f'booking {booking_id}: driver cancelled without accepting {dict(won)}')
+            expected = 'accepted' if won['accept'] and not won['driver_cancel'] else 'cancelled'
+            if status != expected:
+                failures.append(f'booking {booking_id}: status {status}, expected {expected} from {dict(won)}')
+        notifications = db.session.execute(select(func.count()).select_from(NotificationOutbox)).scalar()
+        winners = sum(sum(won.values()) for won in wins.values())
+        if notifications != winners:
+            failures.append(f'{notifications} notifications for {winners} winning transitions')
+
+        counters = {key: (count, round(total, 2)) for key, count, total in db.session.execute(
+            select(StatCounter.key, StatCounter.count, StatCounter.total)
+            .where(StatCounter.key.like('bookings:status:%'), StatCounter.count != 0))}
+        rebuild_stats()
+        rebuilt = {key: (count, round(total, 2)) for key, count, total in db.session.execute(
+            select(StatCounter.key, StatCounter.count, StatCounter.total)
+            .where(StatCounter.key.like('bookings:status:%'), StatCounter.count != 0))}
+        if counters != rebuilt:
+            failures.append(f'status counters {counters} != rebuilt {rebuilt}')
+
+    by_code = Counter(codes)
+    print(f'{len(calls)} transitions in {elapsed:.2f}s ({len(calls) / elapsed:,.0f}/s) with {args.threads} threads; '
+          f'responses {dict(sorted(by_code.items()))}')
+    print(f'final statuses {dict(Counter(statuses.values()))}; {notifications} notifications')
+    errors = sum(code >= 500 for code in codes)
+    if errors:
+        failures.append(f'{errors} calls failed with a server error')
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures[:20]))
+        sys.exit(1)
+    print('OK: no booking accepted twice, every winning transition notified once')
+
+
+if __name__ == '__main__':
+    main()
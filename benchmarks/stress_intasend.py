@@ -0,0 +1,198 @@
+"""Run the IntaSend reconciler against the local stub through timeouts and 5xx errors, and verify the ledger.
+
+Usage: python benchmarks/stress_intasend.py [--users 20] [--transactions 200] [--error-rate 0.3]
+
+Pending deposits carry IntaSend ids that the stub reports as COMPLETE, FAILED
+("fail" in the id) or still PENDING ("pending" in the id). Three phases run
+against a scratch database:
+
+1. timeout: the stub answers slower than the client's read timeout, so every
+   lookup fails after its retry and nothing may be settled;
+2. retry: the stub answers a share of requests with a 503 and the background
+   IntervalWorker runs until every deposit has a final status, which
+   needs the client to retry the 5xx answers;
+3. re-settle: the reconciler runs again, every settled deposit is settled a
+   second time directly and through COMPLETE and FAILED callbacks, and the
+   balances and ledger must not change.
+
+Afterwards each deposit must have the status its id asks for, each user's
+balance must equal their completed deposits, and the ledger must net to zero
+with one wallet and one clearing posting per completed deposit. Exits non-zero
+on any mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.intasend_stub import start_stub  # noqa: E402
+
+
+def expected_status(intasend_id):
+    return 'failed' if 'fail' in intasend_id else 'pending' if 'pending' in intasend_id else 'completed'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--transactions', type=int, default=200)
+    parser.add_argument('--error-rate', type=float, default=0.3, help='share of stub requests answered with 503')
+    parser.add_argument('--concurrency', type=int, default=16, help='parallel status lookups')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "stress.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    os.environ['INTASEND_CONCURRENCY'] = str(args.concurrency)
+    os.environ.setdefault('SQLITE_BUSY_TIMEOUT_MS', '30000')
+    os.environ['LOG_LEVEL'] = 'ERROR'  # every failed lookup logs a warning, every callback an INFO line
+
+    from sqlalchemy import func, insert, select
+
+    import movers
+    from intasend import IntaSendClient
+    from movers import LedgerEntry, Transaction, User, app, db, settle_transaction, to_minor_units
+    from workers import IntervalWorker
+
+    rng = random.Random(7)
+    intasend_ids = {}
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x'}
+            for i in range(1, args.users + 1)
+        ])
+        for i in range(args.transactions):
+            kind = rng.choices(['', 'fail-', 'pending-'], weights=[8, 1, 1])[0]
+            intasend_ids[f'tx-{i}'] = f'inv-{kind}{i}'
+        db.session.execute(insert(Transaction), [
+            {'user_id': rng.randint(1, args.users), 'transaction_id': transaction_id, 'type': 'deposit',
+             'amount': round(rng.uniform(1, 500), 2), 'status': 'pending', 'intasend_id': intasend_id}
+            for transaction_id, intasend_id in intasend_ids.items()
+        ])
+        db.session.commit()
+
+    def statuses():
+        with app.app_context():
+            return dict(db.session.execute(select(Transaction.transaction_id, Transaction.status)).all())
+
+    def ledger():
+        with app.app_context():
+            return (
+                sorted(db.session.execute(
+                    select(LedgerEntry.transaction_id, LedgerEntry.account, LedgerEntry.amount_minor)).all()),
+                dict(db.session.execute(select(User.id, User.balance_minor)).all()),
+            )
+
+    failures = []
+    outcomes = Counter()
+
+    def client_for(stub, **kwargs):
+        return IntaSendClient(stub.base_url, 'test-key', backoff_factor=0, pool_size=args.concurrency,
+                              on_request=lambda call, outcome, seconds: outcomes.update([outcome]), **kwargs)
+
+    # 1. Every lookup times out: nothing settles, nothing is posted
+    stub = start_stub(latency=0.5)
+    movers.intasend_client = client_for(stub, timeout=(3.05, 0.1), retries=1)
+    start = time.perf_counter()
+    movers.reconcile_pending_transactions()
+    elapsed = time.perf_counter() - start
+    stub.shutdown()
+    left = Counter(statuses().values())
+    print(f'timeout: {outcomes["error"]} lookups timed out after {stub.requests} requests in {elapsed:.2f}s; {dict(left)}')
+    if outcomes['error'] != args.transactions:
+        failures.append(f'timeout: {outcomes["error"]} failed lookups for {args.transactions} deposits')
+    if stub.requests < 2 * args.transactions:
+        failures.append(f'timeout: {stub.requests} requests, expected a retry per lookup')
+    if left != {'pending': args.transactions} or ledger()[0]:
+        failures.append('timeout: deposits were settled while every lookup failed')
+
+    # 2. Some requests fail with a 503: the worker retries until every deposit is final
+    outcomes.clear()
+    stub = start_stub(latency=0.005, error_rate=args.error_rate, seed=3)
+    movers.intasend_client = client_for(stub, timeout=(1, 5), retries=10)
+    final = {transaction_id for transaction_id, intasend_id in intasend_ids.items()
+             if expected_status(intasend_id) != 'pending'}
+    worker = IntervalWorker(movers.reconcile_pending_transactions, interval=0.05, name='intasend-reconciler')
+    start = time.perf_counter()
+    worker.start()
+    deadline = start + 60
+    while time.perf_counter() < deadline:
+        current = statuses()
+        if all(current[transaction_id] != 'pending' for transaction_id in final):
+            break
+        time.sleep(0.05)
+    worker.stop()
+    worker._thread.join()
+    elapsed = time.perf_counter() - start
+    stub.shutdown()
+    print(f'retry: {stub.errors} injected 503s over {stub.requests} requests; '
+          f'lookups by final outcome {dict(outcomes)} in {elapsed:.2f}s')
+    if not stub.errors:
+        failures.append('retry: the stub injected no 503s')
+    if stub.requests <= sum(outcomes.values()):
+        failures.append('retry: no lookup needed a retry')
+    for transaction_id, status in statuses().items():
+        if status != expected_status(intasend_ids[transaction_id]):
+            failures.append(f'retry: {transaction_id} ({intasend_ids[transaction_id]}) is {status}')
+
+    # 3. Settling again, by poll, directly or by callback, changes nothing
+    settled_ledger = ledger()
+    stub = start_stub()
+    movers.intasend_client = client_for(stub, retries=0)
+    movers.reconcile_pending_transactions()
+    stub.shutdown()
+    resettled = 0
+    with app.app_context():
+        for row in db.session.execute(select(Transaction.id, Transaction.transaction_id, Transaction.user_id,
+                                             Transaction.amount).where(Transaction.status != 'pending')).all():
+            resettled += settle_transaction(row.id, row.transaction_id, row.user_id, row.amount, 'completed')
+        db.session.commit()
+    client = app.test_client()
+    codes = Counter()
+    for transaction_id in final:
+        for status in ('COMPLETE', 'FAILED'):
+            codes[client.post(f'/api/callback/deposit/{transaction_id}', json={'status': status}).status_code] += 1
+    print(f're-settle: {resettled} direct re-settles applied, callbacks answered {dict(codes)}')
+    if resettled:
+        failures.append(f're-settle: {resettled} settled deposits were settled again')
+    if set(codes) != {200}:
+        failures.append(f're-settle: callbacks answered {dict(codes)}')
+    if ledger() != settled_ledger:
+        failures.append('re-settle: the ledger or a balance changed')
+
+    entries, balances = ledger()
+    with app.app_context():
+        expected = defaultdict(int)
+        completed = set()
+        for transaction_id, user_id, amount, status in db.session.execute(
+                select(Transaction.transaction_id, Transaction.user_id, Transaction.amount, Transaction.status)):
+            if status == 'completed':
+                expected[user_id] += to_minor_units(amount)
+                completed.add(transaction_id)
+        ledger_total = db.session.execute(select(func.sum(LedgerEntry.amount_minor))).scalar() or 0
+    for user_id, balance_minor in balances.items():
+        if balance_minor != expected[user_id]:
+            failures.append(f'user {user_id}: balance {balance_minor} != expected {expected[user_id]}')
+    if ledger_total != 0:
+        failures.append(f'ledger does not balance: {ledger_total}')
+    postings = Counter((transaction_id, account) for transaction_id, account, _ in entries)
+    if set(postings) != {(transaction_id, account) for transaction_id in completed
+                         for account in ('wallet', 'intasend_clearing')} or set(postings.values()) - {1}:
+        failures.append(f'{len(entries)} ledger entries for {len(completed)} completed deposits')
+
+    print(f'{len(completed)} completed deposits, {len(entries)} ledger entries, ledger total {ledger_total}')
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures[:20]))
+        sys.exit(1)
+    print('OK: timeouts settle nothing, 5xx answers are retried, and re-settling is a no-op')
+
+
+if __name__ == '__main__':
+    main()
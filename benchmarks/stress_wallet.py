@@ -0,0 +1,111 @@
+"""Fire thousands of concurrent IntaSend callbacks and verify every wallet is credited exactly once.
+
+Usage: python benchmarks/stress_wallet.py [--users 50] [--transactions 1000] [--duplicates 4] [--threads 32]
+
+Each pending deposit receives several COMPLETE callbacks (and the odd FAILED
+one) from parallel clients against a scratch database. Afterwards each user's
+balance must equal the sum of their completed deposits, the ledger must net to
+zero and hold exactly one posting per completed deposit. Exits non-zero on any
+mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--duplicates', type=int, default=4, help='callbacks sent per transaction')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "stress.db")}'
+    os.environ['INTASEND_RECONCILE_INTERVAL'] = '0'
+    # Dozens of threads queue on SQLite's single writer; give them time instead of failing on lock waits
+    os.environ.setdefault('SQLITE_BUSY_TIMEOUT_MS', '30000')
+    os.environ['LOG_LEVEL'] = 'WARNING'  # the callback handler logs every callback at INFO
+
+    from sqlalchemy import func, insert, select
+
+    from movers import LedgerEntry, Transaction, User, app, db, to_minor_units
+
+    rng = random.Random(11)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'id': i, 'name': f'User {i}', 'phone': '0700000000', 'email': f'u{i}@example.com', 'password': 'x'}
+            for i in range(1, args.users + 1)
+        ])
+        db.session.execute(insert(Transaction), [
+            {'user_id': rng.randint(1, args.users), 'transaction_id': f'tx-{i}', 'type': 'deposit',
+             'amount': round(rng.uniform(1, 500), 2), 'status': 'pending'}
+            for i in range(args.transactions)
+        ])
+        db.session.commit()
+
+    calls = []
+    for i in range(args.transactions):
+        statuses = ['COMPLETE'] * args.duplicates
+        if rng.random() < 0.1:
+            statuses[rng.randrange(len(statuses))] = 'FAILED'
+        calls.extend((f'tx-{i}', status) for status in statuses)
+    rng.shuffle(calls)
+
+    def fire(call):
+        transaction_id, status = call
+        client = app.test_client()
+        response = client.post(f'/api/callback/deposit/{transaction_id}', json={'status': status})
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = list(pool.map(fire, calls))
+    elapsed = time.perf_counter() - start
+
+    failures = []
+    with app.app_context():
+        expected = defaultdict(int)
+        completed = 0
+        for user_id, amount, status in db.session.execute(
+                select(Transaction.user_id, Transaction.amount, Transaction.status)):
+            if status == 'completed':
+                expected[user_id] += to_minor_units(amount)
+                completed += 1
+            elif status != 'failed':
+                failures.append(f'transaction left in status {status}')
+        for user_id, balance_minor in db.session.execute(select(User.id, User.balance_minor)):
+            if balance_minor != expected[user_id]:
+                failures.append(f'user {user_id}: balance {balance_minor} != expected {expected[user_id]}')
+        ledger_total = db.session.execute(select(func.sum(LedgerEntry.amount_minor))).scalar() or 0
+        wallet_postings = db.session.execute(
+            select(func.count()).where(LedgerEntry.account == 'wallet')).scalar()
+        if ledger_total != 0:
+            failures.append(f'ledger does not balance: {ledger_total}')
+        if wallet_postings != completed:
+            failures.append(f'{wallet_postings} wallet postings for {completed} completed deposits')
+
+    errors = sum(code >= 500 for code in codes)
+    print(f'{len(calls)} callbacks in {elapsed:.2f}s ({len(calls) / elapsed:,.0f}/s) '
+          f'with {args.threads} threads; {errors} server errors')
+    print(f'{completed} completed deposits, {wallet_postings} wallet postings, ledger total {ledger_total}')
+    if errors:
+        failures.append(f'{errors} callbacks failed with a server error')
+    if failures:
+        print('FAILED:\n  ' + '\n  '.join(failures[:20]))
+        sys.exit(1)
+    print('OK: every wallet credited exactly once')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Reproducible benchmark and load-test suite for the Moving App API.
+
+Usage (from the repo root):
+
+    python -m benchmarks.suite seed --database /tmp/bench.db [--users 2000 --bookings 20000 ...]
+    python -m benchmarks.suite inprocess [--database /tmp/bench.db] [--iterations 50] [--output run.json]
+    python -m benchmarks.suite load [--database /tmp/bench.db | --url http://host:5000] [--clients 16] [--duration 30]
+    python -m benchmarks.suite compare base.json head.json [--threshold 10]
+
+`seed` fills a SQLite database with synthetic users, drivers, bookings,
+transactions, notifications, reviews and tickets from a fixed random seed.
+`inprocess` drives every route through the Flask test client; `load` runs
+concurrent clients against serve.py (started on a scratch copy of the seeded
+database) or an already running server. Both write per-endpoint p50/p95/p99
+latency, throughput, status and SQL statement counts as JSON, tagged with the
+git commit, and `compare` diffs two such reports. IntaSend is replaced by
+benchmarks/intasend_stub.py for every run.
+"""
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+
+from . import __doc__ as USAGE
+from .report import ROOT, compare, git_revision, print_table, write_report
+from .seed import VOLUMES, seed_database
+
+
+def add_volume_options(parser):
+    for name, default in VOLUMES.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', dest=name, type=int, default=default,
+                            help=f'rows of synthetic {name.replace("_", " ")} (default {default})')
+    parser.add_argument('--seed', type=int, default=20, help='random seed for data and request streams')
+
+
+def add_run_options(parser):
+    parser.add_argument('--database', help='seeded database to run against (a scratch copy is used); '
+                                           'seeds a fresh one with the volume options when omitted')
+    parser.add_argument('--output', help='JSON report path, or - for stdout '
+                                         '(default benchmarks/results/<mode>-<commit>.json)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra app configuration, e.g. --env CACHE_DEFAULT_TTL=0')
+    parser.add_argument('--intasend-latency', type=float, default=0.05, help='seconds the IntaSend stub waits')
+    parser.add_argument('--intasend-error-rate', type=float, default=0.0, help='share of stub requests that 503')
+    add_volume_options(parser)
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise SystemExit(f'--env expects KEY=VALUE, got {pair!r}')
+        env[key] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=USAGE.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog='\n'.join(USAGE.splitlines()[1:]))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='create a seeded SQLite database')
+    seed.add_argument('--database', required=True, help='path of the database to create')
+    add_volume_options(seed)
+
+    inprocess = commands.add_parser('inprocess', help='drive every route through the Flask test client')
+    inprocess.add_argument('--iterations', type=int, default=50, help='recorded requests per route')
+    inprocess.add_argument('--warmup', type=int, default=3, help='unrecorded requests per route first')
+    add_run_options(inprocess)
+
+    load = commands.add_parser('load', help='run concurrent clients against serve.py or --url')
+    load.add_argument('--url', help='base URL of an already running server; needs --database for its ids')
+    load.add_argument('--clients', type=int, default=16)
+    load.add_argument('--duration', type=float, default=30, help='seconds of recorded load')
+    load.add_argument('--warmup', type=float, default=3, help='seconds of unrecorded load first')
+    load.add_argument('--server', default='gunicorn', choices=['gunicorn', 'werkzeug'])
+    load.add_argument('--workers', type=int, default=1, help='live tracking and dispatch need a single worker')
+    load.add_argument('--threads', type=int, default=8)
+    load.add_argument('--port', type=int, default=5056)
+    add_run_options(load)
+
+    diff = commands.add_parser('compare', help='compare two JSON reports')
+    diff.add_argument('base')
+    diff.add_argument('head')
+    diff.add_argument('--threshold', type=float, default=10.0, help='p95 growth in percent that counts as a regression')
+    diff.add_argument('--min-ms', type=float, default=0.5, help='ignore p95 changes smaller than this')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        sys.exit(1 if compare(base, head, args.threshold, args.min_ms) else 0)
+
+    args.volumes = {name: getattr(args, name) for name in VOLUMES}
+    if args.command == 'seed':
+        if os.path.exists(args.database):
+            raise SystemExit(f'{args.database} already exists')
+        counts = seed_database(args.database, args.volumes, args.seed)
+        print(f'seeded {args.database}: ' + ', '.join(f'{count:,} {name}' for name, count in counts.items()))
+        return
+
+    args.env = parse_env(args.env)
+    if args.command == 'inprocess':
+        from .inprocess import run
+    else:
+        from .loadgen import run
+    report = run(args)
+    print_table(report)
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{args.command}-{(git_revision()['commit'] or 'unknown')[:10]}.json"
+    )
+    write_report(report, output)
+    if output != '-':
+        print(f'wrote {output}')
+
+
+main()
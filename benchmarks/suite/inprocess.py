@@ -0,0 +1,72 @@
+"""Drive every route through the Flask test client, one scenario after another."""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from ..intasend_stub import start_stub
+from .report import Recorder, build_report
+from .scenarios import SCENARIOS, STREAMING, Fixtures, uncovered
+from .seed import app_env, seed_database
+
+ADMIN_LOGIN = {'email': 'admin@movingapp.com', 'password': 'admin#cuba'}
+
+
+def copy_database(source, target):
+    # A cleanly closed WAL database has no -wal file, but copy one if it's there
+    for suffix in ('', '-wal'):
+        if os.path.exists(source + suffix):
+            shutil.copy(source + suffix, target + suffix)
+
+
+def run(args):
+    """Run `args.iterations` rounds over all scenarios after `args.warmup` unrecorded ones; returns the report."""
+    stub = start_stub(latency=args.intasend_latency, error_rate=args.intasend_error_rate)
+    tmp = tempfile.mkdtemp(prefix='movers-bench-')
+    database = os.path.join(tmp, 'bench.db')
+    try:
+        if args.database:
+            copy_database(args.database, database)
+            os.environ.update(app_env(database, stub.base_url, **args.env))
+        else:
+            start = time.perf_counter()
+            seed_database(database, args.volumes, args.seed, intasend_base=stub.base_url, **args.env)
+            print(f'seeded {database} in {time.perf_counter() - start:.1f}s')
+        import movers
+
+        app = movers.create_app()
+        fixtures = Fixtures(database)
+        client = app.test_client()
+        token = client.post('/api/login', json=ADMIN_LOGIN).json['token']
+        admin_headers = {'Authorization': f'Bearer {token}'}
+
+        rng = random.Random(args.seed)
+        recorder = Recorder()
+        started = time.perf_counter()
+        for round_number in range(args.warmup + args.iterations):
+            for scenario in SCENARIOS:
+                path, body = scenario.build(rng, fixtures)
+                method = scenario.name.split(' ', 1)[0]
+                request_start = time.perf_counter()
+                response = client.open(path, method=method, json=body,
+                                       headers=admin_headers if scenario.admin else None)
+                response.get_data()  # Streamed bodies are only produced as they are read
+                elapsed = time.perf_counter() - request_start
+                queries = response.headers.get('X-Query-Count')
+                response.close()
+                if round_number >= args.warmup:
+                    recorder.add(scenario.name, elapsed, response.status_code,
+                                 int(queries) if queries is not None else None)
+        elapsed = time.perf_counter() - started
+
+        settings = {'iterations': args.iterations, 'warmup': args.warmup, 'seed': args.seed,
+                    'intasend_latency': args.intasend_latency, 'intasend_error_rate': args.intasend_error_rate,
+                    'intasend_stub_requests': stub.requests, 'env': args.env, 'elapsed_seconds': round(elapsed, 2)}
+        # Background threads must let go of the scratch database before it is removed
+        for worker in (movers.reconciler, movers.notification_worker, movers.dispatcher, movers.location_hub):
+            worker.stop()
+        return build_report('inprocess', recorder, settings, fixtures.volumes, skipped=STREAMING, uncovered=uncovered(app))
+    finally:
+        stub.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
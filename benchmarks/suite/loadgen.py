@@ -0,0 +1,111 @@
+"""Concurrent HTTP clients replaying the weighted scenario mix against a running server."""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from ..intasend_stub import start_stub
+from ..load_test import wait_until_up
+from .inprocess import ADMIN_LOGIN, copy_database
+from .report import ROOT, Recorder, build_report
+from .scenarios import SCENARIOS, STREAMING, Fixtures
+
+
+def drive(base_url, fixtures, clients, duration, seed, recorder):
+    """Run `clients` closed-loop clients for `duration` seconds, each with its own session and random stream."""
+    weights = [scenario.weight for scenario in SCENARIOS]
+    stop = time.perf_counter() + duration
+
+    def client(number):
+        rng = random.Random(seed * 1000 + number)
+        session = requests.Session()
+        token = session.post(base_url + '/api/login', json=ADMIN_LOGIN, timeout=30).json()['token']
+        admin_headers = {'Authorization': f'Bearer {token}'}
+        while time.perf_counter() < stop:
+            scenario = rng.choices(SCENARIOS, weights)[0]
+            path, body = scenario.build(rng, fixtures)
+            method = scenario.name.split(' ', 1)[0]
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=30,
+                                           headers=admin_headers if scenario.admin else None)
+                status, queries = response.status_code, response.headers.get('X-Query-Count')
+            except requests.RequestException:
+                status, queries = 0, None
+            recorder.add(scenario.name, time.perf_counter() - start, status,
+                         int(queries) if queries is not None else None)
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def start_server(args, database, intasend_base):
+    from .seed import app_env
+
+    env = dict(
+        os.environ,
+        **app_env(database, intasend_base, **args.env),
+        SERVER=args.server,
+        WORKERS=str(args.workers),
+        THREADS=str(args.threads),
+        BIND=f'127.0.0.1:{args.port}',
+        ACCESS_LOG='',
+    )
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py')], env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run(args):
+    """Load-test `args.url`, or serve.py on a scratch copy of the seeded database; returns the report."""
+    from .seed import seed_database
+
+    tmp = tempfile.mkdtemp(prefix='movers-load-')
+    stub = server = None
+    try:
+        if args.url:
+            if not args.database:
+                raise SystemExit('--url needs --database pointing at the database the server runs on')
+            base_url, database = args.url.rstrip('/'), args.database
+        else:
+            stub = start_stub(latency=args.intasend_latency, error_rate=args.intasend_error_rate)
+            database = os.path.join(tmp, 'bench.db')
+            if args.database:
+                copy_database(args.database, database)
+            else:
+                start = time.perf_counter()
+                seed_database(database, args.volumes, args.seed)
+                print(f'seeded {database} in {time.perf_counter() - start:.1f}s')
+            server = start_server(args, database, stub.base_url)
+            base_url = f'http://127.0.0.1:{args.port}'
+            wait_until_up(base_url)
+
+        fixtures = Fixtures(database)
+        if args.warmup:
+            drive(base_url, fixtures, args.clients, args.warmup, args.seed + 1, Recorder())
+        recorder = Recorder()
+        elapsed = drive(base_url, fixtures, args.clients, args.duration, args.seed, recorder)
+
+        settings = {'url': args.url, 'server': None if args.url else args.server,
+                    'workers': None if args.url else args.workers, 'threads': None if args.url else args.threads,
+                    'clients': args.clients, 'duration': args.duration, 'warmup': args.warmup, 'seed': args.seed,
+                    'intasend_latency': args.intasend_latency, 'intasend_error_rate': args.intasend_error_rate,
+                    'intasend_stub_requests': stub.requests if stub else None, 'env': args.env}
+        return build_report('load', recorder, settings, fixtures.volumes, wall_seconds=elapsed, skipped=STREAMING)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
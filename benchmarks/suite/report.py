@@ -0,0 +1,159 @@
+"""Per-endpoint statistics, JSON reports and run-to-run comparison."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """Collects (seconds, status, sql statements) samples per endpoint from any number of threads.
+
+    Status 0 stands for a request that never got a response (timeout, refused
+    connection). The statement count is None when the server didn't send
+    X-Query-Count.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, status, queries=None):
+        with self._lock:
+            self.samples.setdefault(name, []).append((seconds, status, queries))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples, wall_seconds=None):
+    """Stats for one endpoint. Throughput is per wall-clock second when given, else back-to-back requests/s."""
+    latencies = [seconds * 1000 for seconds, _, _ in samples]
+    statuses = Counter(status for _, status, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    busy = wall_seconds if wall_seconds else sum(latencies) / 1000
+    stats = {
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(samples) / busy, 2) if busy else None,
+        'latency_ms': {
+            **{f'p{pct}': round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'max': round(max(latencies), 3),
+        },
+    }
+    if queries:
+        stats['queries'] = {'mean': round(sum(queries) / len(queries), 2), 'p95': percentile(queries, 95),
+                            'max': max(queries)}
+    return stats
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def build_report(mode, recorder, settings, volumes, wall_seconds=None, skipped=None, uncovered=()):
+    endpoints = {name: summarize(samples, wall_seconds) for name, samples in sorted(recorder.samples.items())}
+    total = sum(stats['requests'] for stats in endpoints.values())
+    return {
+        'mode': mode,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        **git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'settings': settings,
+        'volumes': volumes,
+        'totals': {
+            'requests': total,
+            'errors': sum(stats['errors'] for stats in endpoints.values()),
+            'throughput_rps': round(total / wall_seconds, 2) if wall_seconds else None,
+        },
+        'endpoints': endpoints,
+        'skipped': skipped or {},
+        'uncovered': list(uncovered),
+    }
+
+
+def write_report(report, path):
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+
+
+def print_table(report, out=sys.stdout):
+    out.write(f"{'endpoint':<62} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'req/s':>9} {'sql':>5}\n")
+    for name, stats in report['endpoints'].items():
+        latency = stats['latency_ms']
+        queries = stats.get('queries', {}).get('mean', '')
+        out.write(f"{name[:62]:<62} {stats['requests']:>6} {stats['errors']:>4} {latency['p50']:>8.2f} "
+                  f"{latency['p95']:>8.2f} {latency['p99']:>8.2f} {stats['throughput_rps'] or 0:>9.1f} {queries:>5}\n")
+    for name, reason in report['skipped'].items():
+        out.write(f'skipped {name}: {reason}\n')
+    for name in report['uncovered']:
+        out.write(f'no scenario for {name}\n')
+    totals = report['totals']
+    rate = f", {totals['throughput_rps']:.1f} req/s" if totals['throughput_rps'] else ''
+    out.write(f"{totals['requests']} requests, {totals['errors']} errors{rate}\n")
+
+
+def _change(base, head):
+    return (head - base) / base * 100 if base else 0.0
+
+
+def compare(base, head, threshold=10.0, min_ms=0.5, out=sys.stdout):
+    """Print per-endpoint deltas and return the endpoints that regressed.
+
+    An endpoint regresses when its p95 grows by more than `threshold` percent
+    (and at least `min_ms`, so sub-millisecond noise doesn't count), when it
+    runs more SQL statements on average, or when it starts returning errors.
+    """
+    out.write(f"base {base.get('commit') or '?'}{' (dirty)' if base.get('dirty') else ''} "
+              f"-> head {head.get('commit') or '?'}{' (dirty)' if head.get('dirty') else ''}\n")
+    if base.get('volumes') != head.get('volumes') or base.get('mode') != head.get('mode'):
+        out.write('warning: the runs used different modes or data volumes\n')
+    out.write(f"{'endpoint':<62} {'p50 ms':>17} {'p95 ms':>17} {'p95 %':>7} {'sql':>11}\n")
+    regressions = []
+    for name in sorted(set(base['endpoints']) | set(head['endpoints'])):
+        before, after = base['endpoints'].get(name), head['endpoints'].get(name)
+        if before is None or after is None:
+            out.write(f"{name[:62]:<62} {'only in ' + ('head' if before is None else 'base'):>17}\n")
+            continue
+        p50 = before['latency_ms']['p50'], after['latency_ms']['p50']
+        p95 = before['latency_ms']['p95'], after['latency_ms']['p95']
+        sql = before.get('queries', {}).get('mean'), after.get('queries', {}).get('mean')
+        reasons = []
+        if _change(*p95) > threshold and p95[1] - p95[0] >= min_ms:
+            reasons.append('p95')
+        if None not in sql and sql[1] > sql[0]:
+            reasons.append('sql')
+        if after['errors'] and not before['errors']:
+            reasons.append('errors')
+        if reasons:
+            regressions.append((name, reasons))
+        sql_text = f'{sql[0]}->{sql[1]}' if None not in sql else ''
+        out.write(f"{name[:62]:<62} {p50[0]:>7.2f}->{p50[1]:>8.2f} {p95[0]:>7.2f}->{p95[1]:>8.2f} "
+                  f"{_change(*p95):>+6.1f}% {sql_text:>11}{'  REGRESSED ' + ','.join(reasons) if reasons else ''}\n")
+    out.write(f'{len(regressions)} regressed endpoint(s)\n')
+    return regressions
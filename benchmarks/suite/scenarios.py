@@ -0,0 +1,225 @@
+"""One request builder per API route, plus the ids they draw on."""
+import itertools
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from .seed import BENCH_EMAIL, BENCH_PASSWORD, CENTER
+
+# `build(rng, fixtures)` returns (path, json body or None); `weight` sets the share of the load mix
+Scenario = namedtuple('Scenario', 'name build admin weight')
+
+# Server-sent event streams never finish, so latency percentiles mean nothing for them
+STREAMING = {
+    'GET /api/user/track-driver/<int:booking_id>/stream': 'server-sent events',
+    'GET /api/driver/<int:driver_id>/assignments/stream': 'server-sent events',
+}
+
+# Keeps generated emails and codes unique across runs against the same database
+RUN_ID = f'{os.getpid()}{int(time.time()) % 100000}'
+_sequence = itertools.count()
+
+
+def unique(prefix):
+    return f'{prefix}{RUN_ID}x{next(_sequence)}'
+
+
+TABLES = {
+    'users': 'user', 'drivers': 'driver', 'bookings': 'booking', 'transactions': 'transaction',
+    'notifications': 'notification', 'reviews': 'review', 'tickets': 'support_ticket', 'promo_codes': 'promo_code',
+    'dispatch_requests': 'dispatch_request',
+}
+
+
+class Fixtures:
+    """Ids sampled by the scenarios, read straight from the seeded SQLite file."""
+
+    def __init__(self, path, sample=5000):
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            column = lambda sql: [row[0] for row in conn.execute(sql)]  # noqa: E731
+            span = lambda table: conn.execute(f'SELECT min(id), max(id) FROM "{table}"').fetchone()  # noqa: E731
+            self.user_ids = column("SELECT id FROM user WHERE role = 'user' ORDER BY id")
+            self.driver_ids = column('SELECT id FROM driver ORDER BY id')
+            self.bookings = span('booking')
+            self.tickets = span('support_ticket')
+            self.notifications = span('notification')
+            self.dispatch_requests = span('dispatch_request')
+            self.transaction_ids = column(f'SELECT transaction_id FROM "transaction" ORDER BY id LIMIT {sample}')
+            self.pending_transaction_ids = column(
+                f"SELECT transaction_id FROM \"transaction\" WHERE status = 'pending' ORDER BY id LIMIT {sample}"
+            ) or self.transaction_ids
+            self.volumes = {name: conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+                            for name, table in TABLES.items()}
+            promos = conn.execute('SELECT id, code FROM promo_code ORDER BY id').fetchall()
+            first_day, last_day = conn.execute('SELECT date(min(created_at)), date(max(created_at)) FROM booking').fetchone()
+        finally:
+            conn.close()
+        if not self.user_ids or not self.driver_ids or self.bookings[0] is None:
+            raise SystemExit(f'{path} has no seeded data; run `python -m benchmarks.suite seed` first')
+        # Codes that are applied are never the ones being disabled
+        half = len(promos) // 2
+        self.promo_codes = [code for _, code in promos[:half]] or ['NONE']
+        self.disposable_promo_ids = [promo_id for promo_id, _ in promos[half:]] or [0]
+        self.first_day = date.fromisoformat(first_day)
+        self.days = (date.fromisoformat(last_day) - self.first_day).days + 1
+        self.login_email = BENCH_EMAIL
+        self.login_password = BENCH_PASSWORD
+
+    def user(self, rng):
+        return rng.choice(self.user_ids)
+
+    def driver(self, rng):
+        return rng.choice(self.driver_ids)
+
+    def day(self, rng):
+        return (self.first_day + timedelta(days=rng.randrange(self.days))).isoformat()
+
+
+def _in(rng, span):
+    return rng.randint(*span) if span[0] is not None else 0
+
+
+def _point(rng, spread=0.05):
+    return '%.6f,%.6f' % (CENTER[0] + rng.gauss(0, spread), CENTER[1] + rng.gauss(0, spread))
+
+
+def _trip(rng):
+    return {'pickup_location': _point(rng), 'dropoff_location': _point(rng)}
+
+
+SEARCH_TERMS = ['late', 'damaged+box', 'booking', 'user1', 'driver2@bench', 'refund']
+
+
+def _page(rng):
+    return '?limit=50' if rng.random() < 0.8 else '?limit=200'
+
+
+def _history(rng):
+    return _page(rng) + ('&archived=1' if rng.random() < 0.2 else '')
+
+
+SCENARIOS = [
+    Scenario('GET /', lambda rng, fx: ('/', None), False, 1),
+    Scenario('POST /api/register', lambda rng, fx: ('/api/register', {
+        'name': 'Bench User', 'phone': '0700000000', 'email': unique('reg') + '@bench.example',
+        'password': BENCH_PASSWORD, 'role': rng.choice(['user', 'user', 'driver']), 'vehicle_type': 'Van',
+        'license_plate': 'KBZ 001'}), False, 1),
+    Scenario('POST /api/login', lambda rng, fx: ('/api/login', {
+        'email': fx.login_email, 'password': fx.login_password}), False, 1),
+    Scenario('POST /api/user/search-drivers', lambda rng, fx: ('/api/user/search-drivers', {
+        **_trip(rng), 'limit': 10, 'radius_km': 20}), False, 10),
+    Scenario('POST /api/user/book-driver', lambda rng, fx: ('/api/user/book-driver', {
+        'user_id': fx.user(rng), 'driver_id': fx.driver(rng), **_trip(rng)}), False, 3),
+    Scenario('POST /api/user/request-driver', lambda rng, fx: ('/api/user/request-driver', {
+        'user_id': fx.user(rng), **_trip(rng)}), False, 2),
+    Scenario('GET /api/user/dispatch/<int:request_id>', lambda rng, fx: (
+        f'/api/user/dispatch/{_in(rng, fx.dispatch_requests)}', None), False, 3),
+    Scenario('POST /api/user/batch-quote', lambda rng, fx: ('/api/user/batch-quote', {
+        'destination': _point(rng), 'origins': [_point(rng) for _ in range(20)]}), False, 2),
+    Scenario('GET /api/driver/available-orders', lambda rng, fx: (
+        '/api/driver/available-orders' + (f'?driver_id={fx.driver(rng)}' if rng.random() < 0.5 else ''), None),
+        False, 10),
+    Scenario('POST /api/driver/accept-order/<int:booking_id>', lambda rng, fx: (
+        f'/api/driver/accept-order/{_in(rng, fx.bookings)}', None), False, 2),
+    Scenario('GET /api/admin/manage-users', lambda rng, fx: ('/api/admin/manage-users' + _page(rng), None), True, 3),
+    Scenario('POST /api/admin/ban-user/<int:user_id>', lambda rng, fx: (
+        f'/api/admin/ban-user/{rng.choice(fx.user_ids[1:] or fx.user_ids)}', None), True, 1),
+    Scenario('GET /api/admin/stats', lambda rng, fx: ('/api/admin/stats', None), True, 3),
+    Scenario('GET /api/admin/stats/drivers', lambda rng, fx: ('/api/admin/stats/drivers' + _page(rng), None), True, 2),
+    Scenario('GET /api/admin/cache-stats', lambda rng, fx: ('/api/admin/cache-stats', None), True, 1),
+    Scenario('POST /api/user/deposit', lambda rng, fx: ('/api/user/deposit', {
+        'user_id': fx.user(rng), 'amount': round(rng.uniform(1, 500), 2)}), False, 2),
+    Scenario('POST /api/user/update-transaction', lambda rng, fx: ('/api/user/update-transaction', {
+        'transaction_id': rng.choice(fx.transaction_ids), 'intasend_id': unique('is')}), False, 2),
+    Scenario('GET /api/user/<int:user_id>', lambda rng, fx: (f'/api/user/{fx.user(rng)}', None), False, 10),
+    Scenario('GET /api/user/payment-history/<int:user_id>', lambda rng, fx: (
+        f'/api/user/payment-history/{fx.user(rng)}' + _history(rng), None), False, 5),
+    Scenario('GET /api/user/order-history/<int:user_id>', lambda rng, fx: (
+        f'/api/user/order-history/{fx.user(rng)}' + _history(rng), None), False, 5),
+    Scenario('GET /api/driver/order-history/<int:driver_id>', lambda rng, fx: (
+        f'/api/driver/order-history/{fx.driver(rng)}' + _history(rng), None), False, 5),
+    Scenario('POST /api/user/submit-review', lambda rng, fx: ('/api/user/submit-review', {
+        'user_id': fx.user(rng), 'driver_id': fx.driver(rng), 'rating': rng.randint(1, 5),
+        'comment': 'Careful with the boxes.'}), False, 2),
+    Scenario('GET /api/driver/<int:driver_id>/reviews', lambda rng, fx: (
+        f'/api/driver/{fx.driver(rng)}/reviews', None), False, 3),
+    Scenario('GET /api/driver/<int:driver_id>/rating', lambda rng, fx: (
+        f'/api/driver/{fx.driver(rng)}/rating', None), False, 3),
+    Scenario('POST /api/user/submit-support-ticket', lambda rng, fx: ('/api/user/submit-support-ticket', {
+        'user_id': fx.user(rng), 'subject': 'Late pickup', 'message': 'The driver arrived an hour late.'}),
+        False, 1),
+    Scenario('POST /api/admin/reply-support-ticket/<int:ticket_id>', lambda rng, fx: (
+        f'/api/admin/reply-support-ticket/{_in(rng, fx.tickets)}', {'admin_reply': 'Sorry, we have refunded you.'}),
+        True, 1),
+    Scenario('GET /api/user/transaction-status/<transaction_id>', lambda rng, fx: (
+        f'/api/user/transaction-status/{rng.choice(fx.pending_transaction_ids)}', None), False, 3),
+    Scenario('POST /api/callback/deposit/<transaction_id>', lambda rng, fx: (
+        f'/api/callback/deposit/{rng.choice(fx.pending_transaction_ids)}', {'status': 'COMPLETE'}), False, 1),
+    Scenario('GET /api/user/support-tickets', lambda rng, fx: (
+        f'/api/user/support-tickets?user_id={fx.user(rng)}', None), False, 3),
+    Scenario('GET /api/admin/support-tickets', lambda rng, fx: ('/api/admin/support-tickets' + _page(rng), None),
+             True, 2),
+    Scenario('GET /api/admin/all-support-tickets', lambda rng, fx: (
+        '/api/admin/all-support-tickets' + _page(rng), None), True, 1),
+    Scenario('GET /api/admin/search', lambda rng, fx: (
+        f'/api/admin/search?q={rng.choice(SEARCH_TERMS)}&type={rng.choice(["tickets", "users", "all"])}', None),
+        True, 2),
+    Scenario('GET /api/admin/escrow', lambda rng, fx: ('/api/admin/escrow' + _page(rng), None), True, 2),
+    Scenario('GET /api/admin/export/<dataset>', lambda rng, fx: (
+        f'/api/admin/export/{rng.choice(["transactions", "bookings", "tickets"])}'
+        f'?format={rng.choice(["csv", "ndjson"])}&from={fx.day(rng)}&to={fx.day(rng)}', None), True, 1),
+    Scenario('POST /api/driver/update-location', lambda rng, fx: ('/api/driver/update-location', {
+        'driver_id': fx.driver(rng), 'live_location': _point(rng)}), False, 10),
+    Scenario('POST /api/driver/update-locations', lambda rng, fx: ('/api/driver/update-locations', {
+        'points': [dict(zip(('lat', 'lng'), map(float, _point(rng).split(','))), driver_id=fx.driver(rng))
+                   for _ in range(100)]}), False, 2),
+    Scenario('GET /api/driver/location-history/<int:driver_id>', lambda rng, fx: (
+        f'/api/driver/location-history/{fx.driver(rng)}?limit=100', None), False, 2),
+    Scenario('GET /api/user/track-driver/<int:booking_id>', lambda rng, fx: (
+        f'/api/user/track-driver/{_in(rng, fx.bookings)}', None), False, 5),
+    Scenario('GET /api/user/notifications/<int:user_id>', lambda rng, fx: (
+        f'/api/user/notifications/{fx.user(rng)}' + _page(rng), None), False, 5),
+    Scenario('GET /api/driver/notifications/<int:driver_id>', lambda rng, fx: (
+        f'/api/driver/notifications/{fx.driver(rng)}' + _page(rng), None), False, 3),
+    Scenario('GET /api/user/notifications/<int:user_id>/unread-count', lambda rng, fx: (
+        f'/api/user/notifications/{fx.user(rng)}/unread-count', None), False, 5),
+    Scenario('GET /api/driver/notifications/<int:driver_id>/unread-count', lambda rng, fx: (
+        f'/api/driver/notifications/{fx.driver(rng)}/unread-count', None), False, 3),
+    Scenario('POST /api/notifications/mark-read/<int:notification_id>', lambda rng, fx: (
+        f'/api/notifications/mark-read/{_in(rng, fx.notifications)}', None), False, 2),
+    Scenario('POST /api/notifications/mark-all-read', lambda rng, fx: ('/api/notifications/mark-all-read', (
+        {'user_id': fx.user(rng)} if rng.random() < 0.5 else {'driver_id': fx.driver(rng)})), False, 1),
+    Scenario('POST /api/admin/create-promo-code', lambda rng, fx: ('/api/admin/create-promo-code', {
+        'code': unique('P'), 'discount': 10}), True, 1),
+    Scenario('POST /api/admin/disable-promo-code/<int:promo_id>', lambda rng, fx: (
+        f'/api/admin/disable-promo-code/{rng.choice(fx.disposable_promo_ids)}', None), True, 1),
+    Scenario('POST /api/user/apply-promo-code', lambda rng, fx: ('/api/user/apply-promo-code', {
+        'promo_code': rng.choice(fx.promo_codes), 'booking_id': _in(rng, fx.bookings)}), False, 1),
+    Scenario('POST /api/user/cancel-order/<int:booking_id>', lambda rng, fx: (
+        f'/api/user/cancel-order/{_in(rng, fx.bookings)}', None), False, 1),
+    Scenario('POST /api/driver/cancel-order/<int:booking_id>', lambda rng, fx: (
+        f'/api/driver/cancel-order/{_in(rng, fx.bookings)}', None), False, 1),
+    Scenario('POST /api/driver/toggle-availability', lambda rng, fx: ('/api/driver/toggle-availability', {
+        'driver_id': fx.driver(rng), 'is_available': rng.random() < 0.6}), False, 2),
+    Scenario('GET /metrics', lambda rng, fx: ('/metrics', None), False, 1),
+]
+
+
+def route_names(app):
+    """Every 'METHOD rule' the app serves, ignoring HEAD/OPTIONS and static files."""
+    names = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            names.add(f'{method} {rule.rule}')
+    return names
+
+
+def uncovered(app):
+    """Routes with neither a scenario nor a reason to skip them, so new routes don't go unbenchmarked."""
+    covered = {scenario.name for scenario in SCENARIOS} | set(STREAMING)
+    return sorted(route_names(app) - covered)
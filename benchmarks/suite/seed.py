@@ -0,0 +1,179 @@
+"""Deterministic synthetic data for the benchmark suite."""
+import os
+import random
+from datetime import datetime, timedelta
+
+CENTER = (-1.2864, 36.8172)  # Nairobi CBD
+VEHICLES = ['Pickup', 'Van', 'Truck']
+START = datetime(2024, 1, 1)
+SPAN_SECONDS = 365 * 24 * 3600
+
+# Every seeded account shares this password, so any of them can log in
+BENCH_PASSWORD = 'benchmark'
+BENCH_EMAIL = 'user1@bench.example'
+
+VOLUMES = {
+    'users': 2000,
+    'drivers': 500,
+    'bookings': 20000,
+    'transactions': 20000,
+    'notifications': 20000,
+    'reviews': 5000,
+    'tickets': 2000,
+    'promo_codes': 20,
+    'dispatch_requests': 200,
+}
+CHUNK = 20000
+
+
+def app_env(database, intasend_base=None, **overrides):
+    """Environment for an app process pointed at `database`, with background noise turned down."""
+    env = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(database)}',
+        'EXPOSE_QUERY_COUNT': '1',
+        'DISPATCH_WINDOW': '0',
+        'NOTIFICATION_DELIVERY_INTERVAL': '1',
+        'LOCATION_FLUSH_INTERVAL': '1',
+        'INTASEND_RECONCILE_INTERVAL': '5',
+        'INTASEND_SECRET_KEY': 'bench',
+        'LOG_LEVEL': 'WARNING',
+        # Benchmarks log in far more often than a real client would
+        'LOGIN_MAX_ATTEMPTS': '1000000000',
+        'LOGIN_MAX_ATTEMPTS_PER_IP': '1000000000',
+    }
+    if intasend_base:
+        env['INTASEND_API_BASE'] = intasend_base
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+def _point(rng, spread=0.05):
+    return '%.6f,%.6f' % (CENTER[0] + rng.gauss(0, spread), CENTER[1] + rng.gauss(0, spread))
+
+
+def _chunked(movers, model, rows):
+    from sqlalchemy import insert
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            movers.db.session.execute(insert(model), batch)
+            batch = []
+    if batch:
+        movers.db.session.execute(insert(model), batch)
+
+
+def seed(movers, volumes, random_seed=20):
+    """Fill an initialised, empty database; ids are assigned explicitly so runs line up across commits."""
+    from sqlalchemy import String, cast, func, insert, literal, select
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(random_seed)
+    when = lambda: START + timedelta(seconds=rng.randrange(SPAN_SECONDS))  # noqa: E731
+    db = movers.db
+    password = generate_password_hash(BENCH_PASSWORD, method='pbkdf2:sha256')
+    users, drivers = volumes['users'], volumes['drivers']
+    first_user = db.session.execute(select(func.coalesce(func.max(movers.User.id), 0))).scalar() + 1
+    user_ids = range(first_user, first_user + users)
+    driver_user_ids = range(first_user + users, first_user + users + drivers)
+
+    _chunked(movers, movers.User, (
+        {'id': user_id, 'name': f'User {n}', 'phone': f'07{n:08d}', 'email': f'user{n}@bench.example',
+         'password': password, 'role': 'user', 'created_at': when()}
+        for n, user_id in enumerate(user_ids, 1)
+    ))
+    _chunked(movers, movers.User, (
+        {'id': user_id, 'name': f'Driver {n}', 'phone': f'07{n:08d}', 'email': f'driver{n}@bench.example',
+         'password': password, 'role': 'driver', 'created_at': when()}
+        for n, user_id in enumerate(driver_user_ids, 1)
+    ))
+    _chunked(movers, movers.Driver, (
+        {'id': n, 'user_id': user_id, 'vehicle_type': rng.choice(VEHICLES), 'license_plate': f'KBA {n:04d}',
+         'is_available': rng.random() < 0.6, 'live_location': _point(rng)}
+        for n, user_id in enumerate(driver_user_ids, 1)
+    ))
+    _chunked(movers, movers.Booking, (
+        {'user_id': rng.choice(user_ids), 'driver_id': rng.randint(1, drivers),
+         'pickup_location': _point(rng), 'dropoff_location': _point(rng),
+         'distance': round(rng.uniform(1, 30), 2), 'price': round(rng.uniform(5, 200), 2),
+         'status': rng.choices(['pending', 'accepted', 'completed', 'cancelled'], [1, 2, 12, 3])[0],
+         'created_at': when()}
+        for _ in range(volumes['bookings'])
+    ))
+    _chunked(movers, movers.Transaction, (
+        {'user_id': rng.choice(user_ids), 'transaction_id': f'bench-tx-{n}', 'intasend_id': f'bench-is-{n}',
+         'amount': round(rng.uniform(1, 500), 2), 'type': 'deposit',
+         'status': rng.choices(['completed', 'pending', 'failed'], [8, 1, 1])[0], 'created_at': when()}
+        for n in range(volumes['transactions'])
+    ))
+    _chunked(movers, movers.Notification, (
+        {'user_id': rng.choice(user_ids), 'driver_id': None, 'message': 'Your booking was updated.',
+         'is_read': rng.random() < 0.7, 'created_at': when()} if rng.random() < 0.5 else
+        {'user_id': None, 'driver_id': rng.randint(1, drivers), 'message': 'New booking request.',
+         'is_read': rng.random() < 0.7, 'created_at': when()}
+        for _ in range(volumes['notifications'])
+    ))
+    _chunked(movers, movers.Review, (
+        {'user_id': rng.choice(user_ids), 'driver_id': rng.randint(1, drivers),
+         'rating': rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 10])[0], 'comment': 'Smooth move.',
+         'created_at': when()}
+        for _ in range(volumes['reviews'])
+    ))
+    _chunked(movers, movers.SupportTicket, (
+        {'user_id': rng.choice(user_ids), 'subject': f'Issue with booking {n}',
+         'message': 'My items arrived late and one box was damaged.',
+         'status': 'resolved' if rng.random() < 0.6 else 'open', 'created_at': when()}
+        for n in range(volumes['tickets'])
+    ))
+    _chunked(movers, movers.PromoCode, (
+        {'code': f'BENCH{n}', 'discount': rng.choice([5, 10, 15, 20]), 'is_active': True}
+        for n in range(volumes['promo_codes'])
+    ))
+    _chunked(movers, movers.DispatchRequest, (
+        {'user_id': rng.choice(user_ids), 'pickup_location': pickup, 'dropoff_location': dropoff,
+         'pickup_lat': float(pickup.split(',')[0]), 'pickup_lng': float(pickup.split(',')[1]),
+         'dropoff_lat': float(dropoff.split(',')[0]), 'dropoff_lng': float(dropoff.split(',')[1]),
+         'status': 'unmatched', 'created_at': when()}
+        for pickup, dropoff in ((_point(rng), _point(rng)) for _ in range(volumes['dispatch_requests']))
+    ))
+
+    # Seeded rows bypass notify(), so the unread counters are filled in bulk
+    for column, prefix in ((movers.Notification.user_id, 'user:'), (movers.Notification.driver_id, 'driver:')):
+        db.session.execute(insert(movers.NotificationCounter).from_select(
+            ['recipient', 'unread'],
+            select(literal(prefix) + cast(column, String), func.count())
+            .where(column.isnot(None), movers.Notification.is_read == False)  # noqa: E712
+            .group_by(column)
+        ))
+    db.session.commit()
+    movers.rebuild_stats()
+    movers.rebuild_driver_ratings()
+
+
+def table_counts(movers):
+    from sqlalchemy import func, select
+
+    models = {
+        'users': movers.User, 'drivers': movers.Driver, 'bookings': movers.Booking,
+        'transactions': movers.Transaction, 'notifications': movers.Notification, 'reviews': movers.Review,
+        'tickets': movers.SupportTicket, 'promo_codes': movers.PromoCode, 'dispatch_requests': movers.DispatchRequest,
+    }
+    return {name: movers.db.session.execute(select(func.count()).select_from(model)).scalar()
+            for name, model in models.items()}
+
+
+def seed_database(path, volumes, random_seed=20, **env):
+    """Create and seed a SQLite database at `path` in this process; movers must not be imported yet.
+
+    Extra keyword arguments go to `app_env`, since the app reads its config once at import.
+    """
+    os.environ.update(app_env(path, **env))
+    import movers
+
+    with movers.app.app_context():
+        movers.init_db()
+        seed(movers, volumes, random_seed)
+        counts = table_counts(movers)
+        movers.db.engine.dispose()
+    return counts
@@ -0,0 +1,175 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry TTL and tag -> keys index for targeted invalidation."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            removed = 0
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._discard(key)
+                        removed += 1
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _decode_bytes(obj):
+    return base64.b64decode(obj['__bytes__']) if obj.keys() == {'__bytes__'} else obj
+
+
+class RedisBackend:
+    """Shared store on any Redis-compatible client (redis-py or a fake exposing the same calls).
+
+    Values are JSON-encoded, with bytes (cached response bodies) as base64; each
+    tag is a Redis set of the keys that carry it.
+    Eviction is left to Redis' own maxmemory policy, so `evictions` stays 0.
+    """
+
+    def __init__(self, client, prefix='movers:cache:'):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw, object_hook=_decode_bytes)
+
+    def set(self, key, value, ttl, tags=()):
+        ttl = max(1, int(ttl + 0.999))
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, default=_encode_bytes), ex=ttl)
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        removed = 0
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = [k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(tag_key)]
+            if keys:
+                removed += self.client.delete(*(self.prefix + key for key in keys))
+            self.client.delete(tag_key)
+        return removed
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for key in self.client.scan_iter(match=self.prefix + '*')
+                   if not (key.decode() if isinstance(key, bytes) else key).startswith(self.prefix + 'tag:'))
+
+
+class ResponseCache:
+    """Read-through cache of rendered responses, invalidated by tag.
+
+    Values are dicts of JSON types and bytes, which every backend can store; the
+    counters are per process.
+    """
+
+    def __init__(self, backend, default_ttl=30.0):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a response rendered before a write is not stored after it
+        self.generation = 0
+
+    @property
+    def enabled(self):
+        return self.default_ttl > 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, tags=(), ttl=None, generation=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl > 0 and (generation is None or generation == self.generation):
+            self.backend.set(key, value, ttl, tags)
+
+    def invalidate(self, *tags):
+        if tags:
+            self.generation += 1
+            self.invalidations += self.backend.invalidate(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self.backend),
+        }
@@ -0,0 +1,211 @@
+import queue
+import threading
+
+from geo import EARTH_RADIUS_KM, DriverIndex
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; candidates then come from a DriverIndex built per window
+    np = None
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+except ImportError:  # SciPy is optional; the auction solver below is used instead
+    min_weight_full_bipartite_matching = None
+
+MAX_RATING = 5.0
+# Requests per block of the dense distance matrix, bounding its memory to CHUNK x drivers
+CHUNK = 256
+# Past this many request x driver pairs the grid index beats computing every distance
+VECTORIZE_MAX_PAIRS = 20_000_000
+
+
+def solve_assignment(costs, unassigned_cost, epsilon=0.01):
+    """Assign each row to at most one column, minimising total cost.
+
+    `costs` has one {column: cost} dict per row, listing only the columns that
+    row may take. Leaving a row unassigned costs `unassigned_cost`, so rows are
+    only matched when that is cheaper overall. Returns a list with the chosen
+    column (or None) per row.
+
+    Uses SciPy's exact sparse solver when installed; otherwise a forward auction whose
+    total is within len(costs) * epsilon of optimal.
+    """
+    if not costs:
+        return []
+    if min_weight_full_bipartite_matching is not None:
+        return _solve_sparse(costs, unassigned_cost)
+    return _solve_auction(costs, unassigned_cost, epsilon)
+
+
+def _solve_sparse(costs, unassigned_cost):
+    columns = sorted({column for row in costs for column in row})
+    position = {column: j for j, column in enumerate(columns)}
+    rows, cols, weights = [], [], []
+    for i, row in enumerate(costs):
+        for column, cost in row.items():
+            rows.append(i)
+            cols.append(position[column])
+            weights.append(cost + 1.0)  # Every row is matched exactly once, so the shift keeps zero costs as edges
+        # A private "unassigned" column per row guarantees a full matching exists
+        rows.append(i)
+        cols.append(len(columns) + i)
+        weights.append(unassigned_cost + 1.0)
+    graph = csr_matrix((weights, (rows, cols)), shape=(len(costs), len(columns) + len(costs)))
+    assigned = [None] * len(costs)
+    for i, j in zip(*min_weight_full_bipartite_matching(graph)):
+        if j < len(columns):
+            assigned[i] = columns[j]
+    return assigned
+
+
+def _solve_auction(costs, unassigned_cost, epsilon):
+    # Bidders are rows; every row also has a private "stay unassigned" option worth
+    # -unassigned_cost that nobody else competes for, so the auction always terminates
+    options = [[(column, -cost) for column, cost in row.items() if cost < unassigned_cost] for row in costs]
+    prices = {}
+    owner = {}
+    assigned = [None] * len(costs)
+    unassigned = list(range(len(costs)))
+    while unassigned:
+        i = unassigned.pop()
+        best_column, best, second = None, -unassigned_cost, -unassigned_cost
+        for column, benefit in options[i]:
+            value = benefit - prices.get(column, 0.0)
+            if value > best:
+                best_column, best, second = column, value, best
+            elif value > second:
+                second = value
+        if best_column is None:
+            continue  # Staying unassigned is the best this row can do at current prices
+        prices[best_column] = prices.get(best_column, 0.0) + best - second + epsilon
+        previous = owner.get(best_column)
+        if previous is not None:
+            assigned[previous] = None
+            unassigned.append(previous)
+        owner[best_column] = i
+        assigned[i] = best_column
+    return assigned
+
+
+class DispatchEngine:
+    """Match a window of ride requests to idle drivers in one assignment.
+
+    Each request only considers its `candidates` nearest eligible drivers within
+    `max_pickup_km`, so the cost matrix stays sparse however many drivers are
+    online. A driver's cost is the pickup distance plus `rating_weight_km` km per
+    star below five; a request that names a vehicle type only sees drivers with
+    that vehicle.
+    """
+
+    def __init__(self, max_pickup_km=15.0, candidates=8, rating_weight_km=0.5, epsilon=0.01):
+        self.max_pickup_km = max_pickup_km
+        self.candidates = candidates
+        self.rating_weight_km = rating_weight_km
+        self.epsilon = epsilon
+
+    def costs(self, requests, drivers):
+        """Return one {driver_id: cost} dict per request (see `match` for the argument shapes)."""
+        if not requests or not drivers:
+            return [{} for _ in requests]
+        if np is not None and len(requests) * len(drivers) <= VECTORIZE_MAX_PAIRS:
+            return self._costs_vectorized(requests, drivers)
+
+        # One index over every driver plus one per vehicle type, so typed requests get full candidate lists
+        indexes = {None: DriverIndex()}
+        for driver_id, driver in drivers.items():
+            position = (driver['lat'], driver['lng'])
+            indexes[None].update(driver_id, position)
+            if driver.get('vehicle_type'):
+                indexes.setdefault(driver['vehicle_type'], DriverIndex()).update(driver_id, position)
+        costs = []
+        for request in requests:
+            index = indexes.get(request.get('vehicle_type') or None)
+            nearest = index.nearest(request['lat'], request['lng'], k=self.candidates,
+                                    radius_km=self.max_pickup_km) if index is not None else []
+            costs.append({
+                driver_id: distance + self.rating_weight_km * (MAX_RATING - (drivers[driver_id].get('rating') or 0.0))
+                for distance, driver_id in nearest
+            })
+        return costs
+
+    def _costs_vectorized(self, requests, drivers):
+        # Haversine from a block of requests to every driver at once, then the k cheapest per row
+        ids = list(drivers)
+        driver_lat = np.radians([drivers[driver_id]['lat'] for driver_id in ids])
+        driver_lng = np.radians([drivers[driver_id]['lng'] for driver_id in ids])
+        vehicles = np.array([drivers[driver_id].get('vehicle_type') or '' for driver_id in ids], dtype=object)
+        rating_cost = self.rating_weight_km * (MAX_RATING - np.array(
+            [drivers[driver_id].get('rating') or 0.0 for driver_id in ids], dtype=float))
+        k = min(self.candidates, len(ids))
+
+        costs = []
+        for start in range(0, len(requests), CHUNK):
+            block = requests[start:start + CHUNK]
+            lat = np.radians([request['lat'] for request in block])[:, None]
+            lng = np.radians([request['lng'] for request in block])[:, None]
+            a = (np.sin((driver_lat - lat) / 2) ** 2
+                 + np.cos(lat) * np.cos(driver_lat) * np.sin((driver_lng - lng) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            distance[distance > self.max_pickup_km] = np.inf
+            wanted = [request.get('vehicle_type') for request in block]
+            for vehicle_type in set(filter(None, wanted)):
+                rows = [i for i, wanted_type in enumerate(wanted) if wanted_type == vehicle_type]
+                distance[np.ix_(rows, np.flatnonzero(vehicles != vehicle_type))] = np.inf
+
+            nearest = np.argpartition(distance, k - 1, axis=1)[:, :k] if k < len(ids) else \
+                np.broadcast_to(np.arange(len(ids)), distance.shape)
+            picked = np.take_along_axis(distance, nearest, axis=1)
+            cost = picked + rating_cost[nearest]
+            for row_columns, row_distance, row_cost in zip(nearest.tolist(), picked.tolist(), cost.tolist()):
+                costs.append({ids[j]: c for j, d, c in zip(row_columns, row_distance, row_cost) if d != float('inf')})
+        return costs
+
+    def match(self, requests, drivers):
+        """Assign drivers to requests.
+
+        `requests` is a list of {'id', 'lat', 'lng', 'vehicle_type'?} dicts and
+        `drivers` maps driver_id -> {'lat', 'lng', 'rating', 'vehicle_type'}.
+        Returns {request_id: (driver_id, cost)} for every matched request.
+        """
+        costs = self.costs(requests, drivers)
+        unassigned_cost = self.max_pickup_km + self.rating_weight_km * MAX_RATING + 1.0
+        matches = {}
+        for request, row, driver_id in zip(requests, costs, solve_assignment(costs, unassigned_cost, self.epsilon)):
+            if driver_id is not None:
+                matches[request['id']] = (driver_id, row[driver_id])
+        return matches
+
+
+class AssignmentFeed:
+    """Per-driver fan-out of new assignments to open streams (e.g. SSE connections)."""
+
+    def __init__(self, subscriber_queue_size=64):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, driver_id):
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(driver_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, driver_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(driver_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[driver_id]
+
+    def publish(self, driver_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(driver_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                pass  # A stalled stream; the assignment is still in the DB and the driver's notifications
+        return len(subscribers)
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Cells starting with these are treated as formulas by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Signed numbers and "lat,lng" pairs are data, not formulas, and are written as they are
+PLAIN_NUMBER = re.compile(r'[+-]?\d+(\.\d+)?(,[+-]?\d+(\.\d+)?)?')
+
+
+def _escape_formula(value):
+    if value.startswith(FORMULA_PREFIXES) and not PLAIN_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _csv_cell(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return _escape_formula(value)
+    return value
+
+
+def _csv_converters(row):
+    # Pick a converter per column from the first row; columns that start out NULL get the generic one
+    converters = []
+    for value in row:
+        if isinstance(value, str):
+            converters.append(lambda v: _escape_formula(v) if v is not None else v)
+        elif isinstance(value, (date, datetime)):
+            converters.append(lambda v: v.isoformat() if v is not None else v)
+        elif value is None:
+            converters.append(_csv_cell)
+        else:
+            converters.append(None)
+    return converters
+
+
+def ndjson_chunks(columns, rows, chunk_rows=500):
+    """Yield newline-delimited JSON objects, `chunk_rows` rows per yielded string."""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(columns, row)), default=_json_default))
+        if len(buffer) >= chunk_rows:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def csv_chunks(columns, rows, chunk_rows=500):
+    """Yield a CSV document with a header row, `chunk_rows` rows per yielded string."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    converters = None
+    batch = []
+    for row in rows:
+        if converters is None:
+            converters = list(enumerate(_csv_converters(row)))
+            converters = [(i, convert) for i, convert in converters if convert is not None]
+        if converters:
+            row = list(row)
+            for i, convert in converters:
+                row[i] = convert(row[i])
+        batch.append(row)
+        if len(batch) >= chunk_rows:
+            writer.writerows(batch)
+            batch = []
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    writer.writerows(batch)
+    yield out.getvalue()
+
+
+# format -> (mimetype, chunk generator)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', ndjson_chunks),
+    'csv': ('text/csv', csv_chunks),
+}
+
+
+def parse_export_time(value, end=False):
+    """Parse an ISO date or datetime filter; a bare `end` date covers that whole day.
+
+    Returns None for an empty value and raises ValueError for a malformed one.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
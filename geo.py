@@ -0,0 +1,147 @@
+import math
+import heapq
+import threading
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def parse_location(value):
+    """Parse a "lat,lng" string or a {'lat', 'lon'/'lng'} dict into a (lat, lng) tuple.
+
+    Returns None when the value is missing or malformed.
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, dict):
+            lat = value.get('lat')
+            lng = value.get('lng', value.get('lon'))
+        elif isinstance(value, (list, tuple)):
+            lat, lng = value
+        else:
+            lat, lng = str(value).split(',')
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    return lat, lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class DriverIndex:
+    """Uniform lat/lng grid over driver positions for k-nearest lookups.
+
+    Each driver lives in exactly one cell; a search walks rings of cells outward
+    from the query point and stops as soon as no unvisited cell can hold a closer
+    driver than the k-th best found so far.
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        self.cell_size_deg = cell_size_deg
+        self._cells = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._positions
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size_deg)),
+                int(math.floor(lng / self.cell_size_deg)))
+
+    def update(self, driver_id, location):
+        point = parse_location(location)
+        if point is None:
+            self.remove(driver_id)
+            return False
+        cell = self._cell(*point)
+        with self._lock:
+            previous = self._positions.get(driver_id)
+            if previous is not None and previous[2] != cell:
+                self._discard(driver_id, previous[2])
+            self._positions[driver_id] = (point[0], point[1], cell)
+            self._cells.setdefault(cell, set()).add(driver_id)
+        return True
+
+    def remove(self, driver_id):
+        with self._lock:
+            previous = self._positions.pop(driver_id, None)
+            if previous is not None:
+                self._discard(driver_id, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._positions.clear()
+
+    def _discard(self, driver_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def position(self, driver_id):
+        entry = self._positions.get(driver_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def nearest(self, lat, lng, k=10, radius_km=20.0):
+        """Return up to k (distance_km, driver_id) pairs within radius_km, closest first."""
+        if k <= 0:
+            return []
+        # Smallest extent of a cell around this latitude, used as the ring lower bound
+        widest_lat = min(abs(lat) + self.cell_size_deg, 89.0)
+        cell_km = self.cell_size_deg * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+        max_ring = int(math.ceil(radius_km / cell_km)) + 1
+        ci, cj = self._cell(lat, lng)
+        best = []  # max-heap of (-distance, driver_id)
+
+        def consider(driver_id, dlat, dlng):
+            distance = haversine_km(lat, lng, dlat, dlng)
+            if distance > radius_km:
+                return
+            if len(best) < k:
+                heapq.heappush(best, (-distance, driver_id))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, driver_id))
+
+        with self._lock:
+            if (2 * max_ring + 1) ** 2 > len(self._positions):
+                # Sparse index: visiting every driver is cheaper than walking empty cells
+                for driver_id, (dlat, dlng, _) in self._positions.items():
+                    consider(driver_id, dlat, dlng)
+                return sorted((-neg_distance, driver_id) for neg_distance, driver_id in best)
+
+            for ring in range(max_ring + 1):
+                if len(best) == k and -best[0][0] <= (ring - 1) * cell_km:
+                    break
+                for cell in self._ring_cells(ci, cj, ring):
+                    for driver_id in self._cells.get(cell, ()):
+                        dlat, dlng, _ = self._positions[driver_id]
+                        consider(driver_id, dlat, dlng)
+
+        return sorted((-neg_distance, driver_id) for neg_distance, driver_id in best)
+
+    @staticmethod
+    def _ring_cells(ci, cj, ring):
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for dj in range(-ring, ring + 1):
+            yield (ci - ring, cj + dj)
+            yield (ci + ring, cj + dj)
+        for di in range(-ring + 1, ring):
+            yield (ci + di, cj - ring)
+            yield (ci + di, cj + ring)
@@ -0,0 +1,71 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# IntaSend payment states mapped to our transaction statuses
+STATUS_MAP = {
+    'COMPLETE': 'completed',
+    'FAILED': 'failed',
+}
+
+
+class IntaSendClient:
+    """Keep-alive HTTP client for IntaSend status lookups.
+
+    One pooled session is shared by all threads; every call has connect/read
+    timeouts, and connection errors, 429s and 5xx responses are retried with
+    exponential backoff before giving up. `on_request(call, outcome, seconds)`,
+    if given, is told how long each call took, retries included.
+    """
+
+    def __init__(self, api_base, secret_key, timeout=(3.05, 10), retries=3, backoff_factor=0.5, pool_size=10,
+                 on_request=None):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = timeout
+        self.on_request = on_request
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        })
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def payment_status(self, intasend_id):
+        """Return our status for an IntaSend payment ('completed', 'failed'), or None while still pending."""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self.session.get(f'{self.api_base}/payment/status/{intasend_id}/', timeout=self.timeout)
+            outcome = str(response.status_code)
+            response.raise_for_status()
+            return STATUS_MAP.get(response.json().get('status'))
+        finally:
+            if self.on_request is not None:
+                self.on_request('payment_status', outcome, time.perf_counter() - started)
+
+    def payment_statuses(self, intasend_ids, concurrency=8):
+        """Look up many payments in parallel; failed lookups are reported as exceptions, not raised."""
+        def lookup(intasend_id):
+            try:
+                return intasend_id, self.payment_status(intasend_id)
+            except (requests.RequestException, ValueError) as e:
+                return intasend_id, e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(intasend_ids)))) as pool:
+            return dict(pool.map(lookup, intasend_ids))
+
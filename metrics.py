@@ -0,0 +1,174 @@
+import bisect
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+
+# Seconds; covers a cached GET through a slow IntaSend round trip
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-1])}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}'
+
+
+class Registry:
+    """Per-process metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class QueryTally:
+    """SQL statements run for one request and the time they took, added to from any thread serving it."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+class RequestProfiler:
+    """Opt-in cProfile capture of individual requests, written as .prof files to `output_dir`.
+
+    A request is profiled when it sends the configured token in the trigger
+    header, or at random with probability `sample_rate`; sampled profiles are
+    only kept when the request took at least `slow_seconds`. One request is
+    profiled at a time per process, since the profiler hooks are global.
+    """
+
+    def __init__(self, output_dir, token=None, sample_rate=0.0, slow_seconds=1.0):
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_rate > 0
+
+    def start(self, header_value=None):
+        """Return (profile, forced) if this request should be profiled, else None."""
+        forced = bool(self.token and header_value and hmac.compare_digest(header_value, self.token))
+        if not forced and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler (e.g. a debugger) owns the hooks
+            self._busy.release()
+            return None
+        return profile, forced
+
+    def stop(self, started, name, elapsed):
+        """Stop profiling and return the dump's path, or None when a sampled request wasn't slow."""
+        profile, forced = started
+        try:
+            profile.disable()
+            if not forced and elapsed < self.slow_seconds:
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_') or 'root'
+            path = os.path.join(self.output_dir, f'{time.strftime("%Y%m%dT%H%M%S")}-{slug}-{int(elapsed * 1000)}ms.prof')
+            profile.dump_stats(path)
+            return path
+        finally:
+            self._busy.release()
@@ -0,0 +1,169 @@
+"""Ordered schema migrations for databases created before a model change.
+
+`db.create_all()` only creates missing tables, so anything added to an existing
+table (columns, indexes) needs an entry here. Each migration runs once, inside
+its own transaction, and is recorded in the `schema_migrations` table.
+
+Region shard databases run the same list but hold only some of the tables, so
+steps skip any table the database doesn't have.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+
+def _create_indexes(*indexes):
+    def migrate(conn):
+        for name, table, columns in indexes:
+            if not inspect(conn).has_table(table):
+                continue
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+    return migrate
+
+
+def _add_column(table, column, ddl, backfill=None):
+    def migrate(conn):
+        if not inspect(conn).has_table(table) or column in {col['name'] for col in inspect(conn).get_columns(table)}:
+            return
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+        if backfill:
+            conn.execute(text(backfill))
+    return migrate
+
+
+def _steps(*migrations):
+    def migrate(conn):
+        for step in migrations:
+            step(conn)
+    return migrate
+
+
+def _run_sql(*statements):
+    def migrate(conn):
+        for statement in statements:
+            conn.execute(text(statement))
+    return migrate
+
+
+def _fts_index(name, table, columns, rank=None):
+    """FTS5 index over `table`'s text columns, kept in step by triggers; SQLite only.
+
+    The index is external-content (it stores no copy of the text) and is keyed
+    by the table's id, so matches join straight back to their rows. Updates
+    that don't touch the indexed columns skip the triggers.
+    """
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+
+    def migrate(conn):
+        if conn.dialect.name != 'sqlite' or not inspect(conn).has_table(table):
+            return
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({cols}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END'
+        ))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON "{table}" BEGIN '
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        ))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {cols} ON "{table}" BEGIN '
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END'
+        ))
+        # Index whatever is already in the table
+        conn.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+        if rank:
+            conn.execute(text(f"INSERT INTO {name}({name}, rank) VALUES ('rank', '{rank}')"))
+    return migrate
+
+
+MIGRATIONS = [
+    ('0001_hot_path_indexes', _create_indexes(
+        ('ix_transaction_user_created', 'transaction', ('user_id', 'created_at', 'id')),
+        ('ix_user_created', 'user', ('created_at', 'id')),
+        ('ix_driver_available', 'driver', ('is_available',)),
+        ('ix_driver_user', 'driver', ('user_id',)),
+        ('ix_booking_user_created', 'booking', ('user_id', 'created_at', 'id')),
+        ('ix_booking_driver_created', 'booking', ('driver_id', 'created_at', 'id')),
+        ('ix_booking_status_created', 'booking', ('status', 'created_at', 'id')),
+        ('ix_review_driver_created', 'review', ('driver_id', 'created_at', 'id')),
+        ('ix_support_ticket_created', 'support_ticket', ('created_at', 'id')),
+        ('ix_support_ticket_user_created', 'support_ticket', ('user_id', 'created_at', 'id')),
+        ('ix_notification_user_created', 'notification', ('user_id', 'created_at', 'id')),
+        ('ix_notification_driver_created', 'notification', ('driver_id', 'created_at', 'id')),
+    )),
+    ('0002_transaction_status_index', _create_indexes(
+        ('ix_transaction_status', 'transaction', ('status', 'id')),
+    )),
+    ('0003_user_balance_minor', _add_column(
+        'user', 'balance_minor', 'BIGINT NOT NULL DEFAULT 0',
+        backfill='UPDATE "user" SET balance_minor = CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER)',
+    )),
+    # notification_counter itself is created by db.create_all(); seed it from existing notifications
+    ('0004_notification_unread_counters', _run_sql(
+        "INSERT INTO notification_counter (recipient, unread) "
+        "SELECT 'user:' || user_id, COUNT(*) FROM notification "
+        "WHERE user_id IS NOT NULL AND NOT is_read GROUP BY user_id",
+        "INSERT INTO notification_counter (recipient, unread) "
+        "SELECT 'driver:' || driver_id, COUNT(*) FROM notification "
+        "WHERE user_id IS NULL AND driver_id IS NOT NULL AND NOT is_read GROUP BY driver_id",
+    )),
+    ('0005_driver_earnings_index', _create_indexes(
+        ('ix_driver_earnings', 'driver', ('earnings', 'id')),
+    )),
+    # Filled in from the reviews table by rebuild_driver_ratings() once this has run
+    ('0006_driver_rating_aggregates', _steps(
+        _add_column('driver', 'review_count', 'INTEGER NOT NULL DEFAULT 0'),
+        _add_column('driver', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0'),
+        _add_column('driver', 'recent_rating', 'FLOAT NOT NULL DEFAULT 0'),
+        _add_column('driver', 'rating_score', 'FLOAT NOT NULL DEFAULT 0'),
+    )),
+    ('0007_export_filter_indexes', _create_indexes(
+        ('ix_transaction_created', 'transaction', ('created_at', 'id')),
+        ('ix_transaction_status_created', 'transaction', ('status', 'created_at', 'id')),
+        ('ix_booking_created', 'booking', ('created_at', 'id')),
+        ('ix_support_ticket_status_created', 'support_ticket', ('status', 'created_at', 'id')),
+    )),
+    # Admin search; a subject hit outweighs one in the message body
+    ('0008_full_text_search', _steps(
+        _fts_index('support_ticket_fts', 'support_ticket', ('subject', 'message', 'admin_reply'),
+                   rank='bm25(5.0, 1.0, 1.0)'),
+        _fts_index('user_fts', 'user', ('name', 'email'), rank='bm25(2.0, 1.0)'),
+    )),
+    # Lets the archiver expire read notifications oldest first without scanning the table
+    ('0009_notification_created_index', _create_indexes(
+        ('ix_notification_created', 'notification', ('created_at', 'id')),
+    )),
+]
+
+
+def applied_migrations(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(100) PRIMARY KEY, applied_at DATETIME NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text('SELECT id FROM schema_migrations'))}
+
+
+def upgrade(engine):
+    """Apply every pending migration in order and return the ids that ran."""
+    with engine.begin() as conn:
+        done = applied_migrations(conn)
+
+    ran = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in done:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)'),
+                {'id': migration_id, 'applied_at': datetime.utcnow()},
+            )
+        ran.append(migration_id)
+    return ran
@@ -1,24 +1,242 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g, has_app_context, has_request_context, make_response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import (
+    MetaData, String, and_, bindparam, case, cast, column, create_engine, delete, event, func, insert, inspect, literal,
+    literal_column, or_, select, table, text, union_all, update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.util import find_tables
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime 
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from dotenv import load_dotenv
 import os
-import requests
 import uuid
+import threading
+import base64
+import binascii
+import contextlib
+import heapq
+import itertools
+import json
+import queue
+import atexit
+import functools
+import hashlib
+import hmac
+import time
+from geo import DriverIndex, parse_location
+from pricing import PricingEngine
+from tracking import LocationHistory, LocationHub
+from intasend import STATUS_MAP, IntaSendClient
+from auth import LoginRateLimiter, PrincipalCache, TokenSigner
+from cache import MemoryBackend, RedisBackend, ResponseCache
+from dispatch import AssignmentFeed, DispatchEngine
+from exports import EXPORT_FORMATS, parse_export_time
+from search import fts_query
+from serializers import FastJSONProvider, compress_response, response_format, serializer_for
+from sharding import ScatterPool, ShardMap, parse_regions
+from metrics import COUNT_BUCKETS, SIZE_BUCKETS, QueryTally, Registry, RequestProfiler
+from workers import IntervalWorker
+import migrations
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 load_dotenv()
 
 CORS(app)  # Enable CORS for all routes
-app.config['SECRET_KEY'] = 'supersecretkey'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///moving_app.db'
-db = SQLAlchemy(app)
+# Profiler dumps and IntaSend callbacks are logged at INFO, failed background lookups at WARNING
+app.logger.setLevel(os.getenv('LOG_LEVEL', 'INFO'))
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'supersecretkey')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///moving_app.db')
+
+# Connection pooling and SQLite tuning, overridable through the environment
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            'connect_args': {
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000,
+                'check_same_thread': False,
+            },
+        }
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+# Seconds between batched writes of driver positions from the location hub to the DB
+app.config['LOCATION_FLUSH_INTERVAL'] = float(os.getenv('LOCATION_FLUSH_INTERVAL', 5))
+# Seconds a client-supplied location timestamp may run ahead of the server clock
+app.config['LOCATION_MAX_CLOCK_SKEW'] = float(os.getenv('LOCATION_MAX_CLOCK_SKEW', 30))
+# Seconds a location ping trusts the driver's cached availability before reading it again
+app.config['DRIVER_AVAILABILITY_TTL'] = float(os.getenv('DRIVER_AVAILABILITY_TTL', 30))
+# Adds an X-Query-Count header to every response; on by default in debug mode
+app.config['EXPOSE_QUERY_COUNT'] = os.getenv('EXPOSE_QUERY_COUNT', '0') == '1'
+# Bearer tokens and login throttling
+app.config['AUTH_TOKEN_MAX_AGE'] = int(os.getenv('AUTH_TOKEN_MAX_AGE', 12 * 3600))
+app.config['AUTH_PRINCIPAL_CACHE_SIZE'] = int(os.getenv('AUTH_PRINCIPAL_CACHE_SIZE', 10000))
+app.config['AUTH_PRINCIPAL_CACHE_TTL'] = float(os.getenv('AUTH_PRINCIPAL_CACHE_TTL', 300))
+# Login attempts per LOGIN_WINDOW seconds: for one account from one client address, and from one address in all
+app.config['LOGIN_MAX_ATTEMPTS'] = int(os.getenv('LOGIN_MAX_ATTEMPTS', 10))
+app.config['LOGIN_MAX_ATTEMPTS_PER_IP'] = int(os.getenv('LOGIN_MAX_ATTEMPTS_PER_IP', 50))
+app.config['LOGIN_WINDOW'] = float(os.getenv('LOGIN_WINDOW', 60))
+app.config['LOGIN_MAX_CONCURRENT'] = int(os.getenv('LOGIN_MAX_CONCURRENT', 4))
+# Response cache for hot reads; CACHE_BACKEND=redis shares it (and its invalidations) across workers
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 2048))
+app.config['CACHE_DEFAULT_TTL'] = float(os.getenv('CACHE_DEFAULT_TTL', 30))  # 0 disables the cache
+app.config['CACHE_MAX_BODY_BYTES'] = int(os.getenv('CACHE_MAX_BODY_BYTES', 1024 * 1024))
+# Driver search results move with every location ping, so they are only reused briefly
+app.config['SEARCH_CACHE_TTL'] = float(os.getenv('SEARCH_CACHE_TTL', 5))
+# Region shards: SHARD_REGIONS lists markets as "name:south,west,north,east;..." and may only be appended to, since
+# a region's position is part of its rows' ids. Each market's drivers, their bookings and notifications and its
+# dispatch requests live in SHARD_DIR/shard_<name>.db; users, wallets, reviews and tickets stay in the main
+# database, which is also the shard for anywhere outside the listed boxes. Unset, there is only the main database
+app.config['SHARD_REGIONS'] = parse_regions(os.getenv('SHARD_REGIONS', ''))
+app.config['SHARD_DIR'] = os.path.abspath(os.getenv('SHARD_DIR', app.instance_path))
+app.config['SHARD_SCATTER_WORKERS'] = int(os.getenv('SHARD_SCATTER_WORKERS', 8))
+shard_map = ShardMap(app.config['SHARD_REGIONS'])
+
+def shard_uri(shard):
+    return 'sqlite:///' + os.path.join(app.config['SHARD_DIR'], f'shard_{shard.name}.db')
+
+if shard_map.enabled:
+    os.makedirs(app.config['SHARD_DIR'], exist_ok=True)
+app.config['SQLALCHEMY_BINDS'] = {
+    shard.bind_key: {'url': shard_uri(shard), **engine_options(shard_uri(shard))} for shard in shard_map.shards[1:]
+}
+
+# Tables every shard keeps for itself; the rest live only in the main database. Counters and table versions are
+# kept per shard so that a shard's writes never wait on the main database, and readers add them up
+SHARD_TABLES = frozenset({
+    'driver', 'booking', 'booking_archive', 'notification', 'notification_outbox', 'notification_counter',
+    'dispatch_request', 'stat_counter', 'table_version',
+})
+# New rows in these take their ids from the shard's range
+SHARD_ID_TABLES = ('driver', 'booking', 'notification', 'notification_outbox', 'dispatch_request')
+
+def reads_shard_tables(mapper=None, clause=None):
+    # The ORM passes the statement's primary mapper; only when that is a global model is the statement searched
+    if mapper is not None and inspect(mapper).local_table.name in SHARD_TABLES:
+        return True
+    return clause is not None and any(getattr(table, 'name', None) in SHARD_TABLES
+                                      for table in find_tables(clause, include_crud=True, include_aliases=True))
+
+def current_shard():
+    """The shard the session writes per-region tables to: the request's own, else the main database."""
+    return (g.get('shard') if has_app_context() else None) or shard_map.default
+
+class ShardedSession(Session):
+    """Sends statements on the per-region tables to the current shard and everything else to the main database.
+
+    Inside joined_transaction() everything goes to the current shard, whose connection attaches the main database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shard_map.enabled:
+            shard = current_shard()
+            if shard.index and (g.get('joined_transaction') or reads_shard_tables(mapper, clause)):
+                return self._db.engines[shard.bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': ShardedSession})
 
 INTASEND_PUBLIC_KEY = os.getenv('INTASEND_PUBLIC_KEY')
 INTASEND_SECRET_KEY = os.getenv('INTASEND_SECRET_KEY')
-INTASEND_API_BASE = 'https://sandbox.intasend.com/api/v1'
+INTASEND_API_BASE = os.getenv('INTASEND_API_BASE', 'https://sandbox.intasend.com/api/v1')
+# Pending transactions are reconciled with IntaSend in the background, never inside a request
+app.config['INTASEND_RECONCILE_INTERVAL'] = float(os.getenv('INTASEND_RECONCILE_INTERVAL', 30))
+app.config['INTASEND_RECONCILE_BATCH'] = int(os.getenv('INTASEND_RECONCILE_BATCH', 100))
+app.config['INTASEND_CONCURRENCY'] = int(os.getenv('INTASEND_CONCURRENCY', 8))
+# Notifications are written to an outbox with the triggering change and delivered in batches
+app.config['NOTIFICATION_DELIVERY_INTERVAL'] = float(os.getenv('NOTIFICATION_DELIVERY_INTERVAL', 2))
+app.config['NOTIFICATION_BATCH'] = int(os.getenv('NOTIFICATION_BATCH', 500))
+# Ride requests are matched to drivers a window at a time; DISPATCH_WINDOW=0 disables the dispatcher
+app.config['DISPATCH_WINDOW'] = float(os.getenv('DISPATCH_WINDOW', 2))
+app.config['DISPATCH_BATCH'] = int(os.getenv('DISPATCH_BATCH', 5000))
+app.config['DISPATCH_MAX_WAIT'] = float(os.getenv('DISPATCH_MAX_WAIT', 120))  # Seconds before a request is unmatched
+app.config['DISPATCH_MAX_PICKUP_KM'] = float(os.getenv('DISPATCH_MAX_PICKUP_KM', 15))
+# Driver rating aggregates: the Bayesian score shrinks drivers with few reviews towards the prior mean,
+# and the recent rating is an exponential moving average spanning roughly the last RATING_RECENT_WINDOW reviews
+app.config['RATING_PRIOR_MEAN'] = float(os.getenv('RATING_PRIOR_MEAN', 4.0))
+app.config['RATING_PRIOR_WEIGHT'] = float(os.getenv('RATING_PRIOR_WEIGHT', 5))
+app.config['RATING_RECENT_WINDOW'] = int(os.getenv('RATING_RECENT_WINDOW', 20))
+# Archival: finished bookings and settled transactions older than ARCHIVE_AFTER_DAYS move to archive tables and
+# read notifications are deleted after NOTIFICATION_READ_TTL_DAYS, ARCHIVE_BATCH rows per transaction;
+# ARCHIVE_INTERVAL=0 disables the background archiver (`flask --app movers archive` still runs a pass)
+app.config['ARCHIVE_INTERVAL'] = float(os.getenv('ARCHIVE_INTERVAL', 3600))
+app.config['ARCHIVE_AFTER_DAYS'] = float(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+app.config['NOTIFICATION_READ_TTL_DAYS'] = float(os.getenv('NOTIFICATION_READ_TTL_DAYS', 30))
+app.config['ARCHIVE_BATCH'] = int(os.getenv('ARCHIVE_BATCH', 1000))
+app.config['ARCHIVE_BATCH_PAUSE'] = float(os.getenv('ARCHIVE_BATCH_PAUSE', 0.05))  # Lets other writers in between batches
+# Bodies of at least COMPRESS_MIN_BYTES are compressed for clients that send Accept-Encoding (Brotli if
+# installed, else gzip); streamed exports are compressed as they are written
+app.config['COMPRESS_RESPONSES'] = os.getenv('COMPRESS_RESPONSES', '1') == '1'
+app.config['COMPRESS_MIN_BYTES'] = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+# Relevance-ranked admin search scores at most this many of the newest matches
+app.config['SEARCH_RANK_CANDIDATES'] = int(os.getenv('SEARCH_RANK_CANDIDATES', 20000))
+# Instrumentation: per-process metrics served at /metrics; set METRICS_TOKEN to require it as a bearer token
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# cProfile dumps of single requests: send "X-Profile: <PROFILE_TOKEN>", or sample PROFILE_SAMPLE_RATE of
+# requests and keep those slower than PROFILE_SLOW_MS
+app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_SLOW_MS'] = float(os.getenv('PROFILE_SLOW_MS', 1000))
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+metrics_registry = Registry()
+REQUEST_LATENCY = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time from request start until the response body was sent.',
+    ('method', 'route', 'status')
+)
+RESPONSE_SIZE = metrics_registry.histogram(
+    'http_response_size_bytes', 'Response body size.', ('route',), buckets=SIZE_BUCKETS
+)
+REQUEST_SQL_STATEMENTS = metrics_registry.histogram(
+    'http_request_sql_statements', 'SQL statements executed per request.', ('route',), buckets=COUNT_BUCKETS
+)
+REQUEST_SQL_SECONDS = metrics_registry.histogram(
+    'http_request_sql_seconds', 'Time spent executing SQL per request.', ('route',)
+)
+SQL_STATEMENTS = metrics_registry.counter(
+    'sql_statements_total', 'SQL statements executed by requests and background workers.', ('source',)
+)
+SQL_SECONDS = metrics_registry.histogram(
+    'sql_statement_duration_seconds', 'Execution time of individual SQL statements.', ('source',)
+)
+INTASEND_LATENCY = metrics_registry.histogram(
+    'intasend_request_duration_seconds', 'Outbound IntaSend API calls, retries included.', ('call', 'outcome')
+)
+profiler = RequestProfiler(
+    app.config['PROFILE_DIR'], token=app.config['PROFILE_TOKEN'], sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+    slow_seconds=app.config['PROFILE_SLOW_MS'] / 1000
+)
+
+intasend_client = IntaSendClient(
+    INTASEND_API_BASE, INTASEND_SECRET_KEY, pool_size=app.config['INTASEND_CONCURRENCY'],
+    on_request=lambda call, outcome, seconds: INTASEND_LATENCY.observe(seconds, call=call, outcome=outcome)
+)
+
+# Distance/fare calculation; set ROAD_GRAPH_PATH to an OSM extract for road distances
+pricing_engine = PricingEngine.from_env()
 # Models
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,6 +247,14 @@ class Transaction(db.Model):
     type = db.Column(db.String(50), nullable=False)  # deposit, payment, withdrawal
     status = db.Column(db.String(50), default='pending')  # pending, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_transaction_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_transaction_status', 'status', 'id'),
+        db.Index('ix_transaction_created', 'created_at', 'id'),
+        db.Index('ix_transaction_status_created', 'status', 'created_at', 'id'),
+    )
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
@@ -38,7 +264,12 @@ class User(db.Model):
     role = db.Column(db.String(50), nullable=False, default='user')  # user, driver, admin
     is_banned = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    balance = db.Column(db.Float, default=0.0)  # Wallet balance
+    balance = db.Column(db.Float, default=0.0)  # Wallet balance, kept in step with balance_minor
+    balance_minor = db.Column(db.BigInteger, nullable=False, default=0)  # Wallet balance in cents
+
+    __table_args__ = (
+        db.Index('ix_user_created', 'created_at', 'id'),
+    )
 
     # Relationships
     bookings = db.relationship('Booking', backref='user', lazy=True)
@@ -54,10 +285,20 @@ class Driver(db.Model):
     license_plate = db.Column(db.String(50), nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     earnings = db.Column(db.Float, default=0.0)
-    ratings = db.Column(db.Float, default=0.0)
+    ratings = db.Column(db.Float, default=0.0)  # Mean of all reviews
     completed_orders = db.Column(db.Integer, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    recent_rating = db.Column(db.Float, nullable=False, default=0.0)
+    rating_score = db.Column(db.Float, nullable=False, default=lambda: app.config['RATING_PRIOR_MEAN'])  # Bayesian average
     live_location = db.Column(db.String(100), nullable=True)  # Latitude, Longitude
 
+    __table_args__ = (
+        db.Index('ix_driver_available', 'is_available'),
+        db.Index('ix_driver_user', 'user_id'),
+        db.Index('ix_driver_earnings', 'earnings', 'id'),
+    )
+
     # Relationships
     bookings = db.relationship('Booking', backref='driver', lazy=True)
     reviews = db.relationship('Review', backref='driver', lazy=True)
@@ -75,6 +316,13 @@ class Booking(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     promo_code = db.Column(db.String(50), nullable=True)  # Applied promo code
 
+    __table_args__ = (
+        db.Index('ix_booking_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_booking_driver_created', 'driver_id', 'created_at', 'id'),
+        db.Index('ix_booking_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_booking_created', 'created_at', 'id'),
+    )
+
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -91,6 +339,10 @@ class Review(db.Model):
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_review_driver_created', 'driver_id', 'created_at', 'id'),
+    )
+
 class SupportTicket(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -100,6 +352,12 @@ class SupportTicket(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     admin_reply = db.Column(db.Text, nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_support_ticket_created', 'created_at', 'id'),
+        db.Index('ix_support_ticket_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_support_ticket_status_created', 'status', 'created_at', 'id'),
+    )
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -108,6 +366,30 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notification_driver_created', 'driver_id', 'created_at', 'id'),
+        db.Index('ix_notification_created', 'created_at', 'id'),
+    )
+
+class NotificationOutbox(db.Model):
+    # Notifications waiting for the delivery worker; rows are deleted as they are delivered
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    driver_id = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class NotificationCounter(db.Model):
+    recipient = db.Column(db.String(40), primary_key=True)  # 'user:<id>' or 'driver:<id>'
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+class StatCounter(db.Model):
+    # Dashboard aggregates kept current by the session hooks below, e.g. 'bookings:status:pending'
+    key = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+
 class PromoCode(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(50), unique=True, nullable=False)
@@ -115,12 +397,1436 @@ class PromoCode(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class LedgerEntry(db.Model):
+    # Double-entry wallet ledger: every posting is a pair of rows that sums to zero
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.String(100), nullable=False)  # Idempotency key
+    account = db.Column(db.String(50), nullable=False)  # wallet, intasend_clearing
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    amount_minor = db.Column(db.BigInteger, nullable=False)  # Signed, in cents
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('transaction_id', 'account', name='uq_ledger_entry_transaction_account'),
+        db.Index('ix_ledger_entry_user', 'user_id', 'id'),
+    )
+
+class TableVersion(db.Model):
+    # Bumped in the same transaction as every write to `table_name`; backs ETag/Last-Modified
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class DispatchRequest(db.Model):
+    # A ride request waiting for the dispatcher; its booking is created once a driver is assigned
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    pickup_location = db.Column(db.String(200), nullable=False)
+    dropoff_location = db.Column(db.String(200), nullable=False)
+    pickup_lat = db.Column(db.Float, nullable=False)
+    pickup_lng = db.Column(db.Float, nullable=False)
+    dropoff_lat = db.Column(db.Float, nullable=False)
+    dropoff_lng = db.Column(db.Float, nullable=False)
+    vehicle_type = db.Column(db.String(100), nullable=True)  # Any vehicle when empty
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, matching, assigned, unmatched
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    assigned_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_dispatch_request_status', 'status', 'id'),
+    )
+
+# Archive tiers: the archiver moves rows here unchanged, ids included; history endpoints read them on request
+class BookingArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    driver_id = db.Column(db.Integer, nullable=False)
+    pickup_location = db.Column(db.String(200), nullable=False)
+    dropoff_location = db.Column(db.String(200), nullable=False)
+    distance = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # completed, cancelled
+    created_at = db.Column(db.DateTime, nullable=False)
+    promo_code = db.Column(db.String(50), nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_booking_archive_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_booking_archive_driver_created', 'driver_id', 'created_at', 'id'),
+        db.Index('ix_booking_archive_created', 'created_at', 'id'),
+    )
+
+class TransactionArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    transaction_id = db.Column(db.String(100), unique=True, nullable=False)
+    intasend_id = db.Column(db.String(100), nullable=True)
+    amount = db.Column(db.Float, nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # completed, failed
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_transaction_archive_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_transaction_archive_created', 'created_at', 'id'),
+    )
+
+# Region shards: requests are pinned to one shard by the ids or pickup point they carry; requests that name
+# none read the per-region tables from every shard in parallel
+scatter_pool = ScatterPool(app.config['SHARD_SCATTER_WORKERS'])
+shard_worker_pool = ScatterPool(app.config['SHARD_SCATTER_WORKERS'], name='shard-worker')
+atexit.register(scatter_pool.shutdown)
+atexit.register(shard_worker_pool.shutdown)
+
+def _on_shard(fn, tally, shard):
+    with app.app_context():
+        g.shard = shard
+        g.query_tally = tally
+        return fn(shard)
+
+def on_shards(fn, shards=None, pool=scatter_pool):
+    """Call fn(shard) for each of `shards` (default: all) with the session bound to it; results in shard order.
+
+    With sharding on, every call gets an app context, and so a session and
+    transaction, of its own, and several shards run in parallel on `pool`.
+    Without it the single call runs in the caller's app context if there is one.
+    """
+    shards = shard_map.shards if shards is None else list(shards)
+    if not shard_map.enabled and has_app_context():
+        return [fn(shard) for shard in shards]
+    return pool.map(functools.partial(_on_shard, fn, request_query_tally()), shards)
+
+@contextlib.contextmanager
+def use_shard(shard):
+    """Bind the session to `shard` for the statements inside, e.g. to look up a driver from another region."""
+    previous = g.get('shard')
+    g.shard = shard
+    try:
+        yield
+    finally:
+        g.shard = previous
+
+@contextlib.contextmanager
+def joined_transaction():
+    """Run the main database's statements on the current shard's connection too, so a write to both commits once.
+
+    The shard file has none of the global tables, so their names resolve to the attached main database and one
+    SQLite transaction covers both files. Commit inside the block. Write the main database's rows first, as every
+    joined transaction does, so two of them never wait on each other's locks. In WAL mode SQLite keeps each file's
+    commit atomic, but a power loss in the middle of the commit can land it in one file and not the other.
+    """
+    previous = g.get('joined_transaction')
+    g.joined_transaction = True
+    try:
+        yield
+    finally:
+        g.joined_transaction = previous
+
+def request_shards():
+    """The request's own shard, or every shard when it isn't pinned to one."""
+    return [g.shard] if g.get('shard') is not None else shard_map.shards
+
+def spans_shards(stmt):
+    return shard_map.enabled and g.get('shard') is None and reads_shard_tables(clause=stmt)
+
+def read_shards(stmt, shards=None):
+    """All of `stmt`'s rows: from `shards`, else from every shard if the request isn't pinned and stmt needs it."""
+    if shards is None:
+        if not spans_shards(stmt):
+            return db.session.execute(stmt).all()
+        shards = shard_map.shards
+    elif not shard_map.enabled:
+        return db.session.execute(stmt).all()
+    return [row for rows in on_shards(lambda shard: db.session.execute(stmt).all(), shards) for row in rows]
+
+def shard_connection(shard):
+    return db.session.connection(bind_arguments={'bind': db.engines[shard.bind_key]})
+
+def merged_shard_rows(stmt, key, reverse=False):
+    """An ordered stmt's rows from every shard as one stream in the same order; `key` gives a row's sort key."""
+    results = [shard_connection(shard).execute(stmt) for shard in shard_map.shards]
+    return heapq.merge(*results, key=key, reverse=reverse)
+
+def init_shard(shard):
+    """Create a shard's tables and id ranges if they are missing, then apply pending migrations; returns their ids."""
+    # A plain engine: the app's shard engines attach the main database, which DDL must never reach
+    engine = create_engine(shard_uri(shard))
+    try:
+        metadata = MetaData()
+        for model_table in db.metadata.sorted_tables:
+            model_table.to_metadata(metadata)
+        for name in SHARD_ID_TABLES:
+            metadata.tables[name].dialect_options['sqlite']['autoincrement'] = True
+        metadata.create_all(engine, tables=[metadata.tables[name] for name in SHARD_TABLES])
+        with engine.begin() as conn:
+            conn.execute(text(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT :name, :floor '
+                'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+            ), [{'name': name, 'floor': shard.id_floor} for name in SHARD_ID_TABLES])
+        return migrations.upgrade(engine)
+    finally:
+        engine.dispose()
+        # Pooled connections opened before the tables existed could still resolve them in the main database
+        db.engines[shard.bind_key].dispose()
+
+def _int_arg(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def request_shard():
+    """The shard a request belongs to, from the booking, driver, dispatch request or notification it names or its
+    pickup point; None when it names none of them."""
+    view_args = request.view_args or {}
+    for name in ('booking_id', 'driver_id', 'request_id', 'notification_id'):
+        if name in view_args:
+            return shard_map.for_id(view_args[name])
+    data = request.get_json(silent=True) if request.is_json else None
+    data = data if isinstance(data, dict) else {}
+    for name in ('driver_id', 'booking_id'):
+        row_id = _int_arg(data.get(name, request.args.get(name)))
+        if row_id is not None:
+            return shard_map.for_id(row_id)
+    # A new booking request goes by where it starts, a new driver by their home area
+    point = parse_location(data.get('pickup_coords')) or parse_location(data.get('pickup_location')) \
+        or parse_location(data.get('home_location'))
+    if point is not None:
+        return shard_map.for_point(*point)
+    region = data.get('region') or request.args.get('region')
+    return shard_map.by_name.get(region) if isinstance(region, str) else None
+
+@app.before_request
+def route_to_shard():
+    if shard_map.enabled:
+        g.shard = request_shard()
+
+# Query Helpers
+# Column projections for the list endpoints; labels match the JSON keys returned
+BOOKING_FOR_USER_COLUMNS = (
+    Booking.id.label('booking_id'), Booking.driver_id, Booking.pickup_location,
+    Booking.dropoff_location, Booking.status, Booking.created_at,
+)
+BOOKING_FOR_DRIVER_COLUMNS = (
+    Booking.id.label('booking_id'), Booking.user_id, Booking.pickup_location,
+    Booking.dropoff_location, Booking.status, Booking.created_at,
+)
+AVAILABLE_ORDER_COLUMNS = (
+    Booking.id.label('booking_id'), Booking.user_id, Booking.pickup_location,
+    Booking.dropoff_location, Booking.distance, Booking.price,
+)
+ESCROW_COLUMNS = (
+    Booking.id.label('booking_id'), Booking.user_id, Booking.driver_id, Booking.price, Booking.created_at,
+)
+TRANSACTION_COLUMNS = (
+    Transaction.id, Transaction.transaction_id, Transaction.type, Transaction.amount,
+    Transaction.status, Transaction.created_at,
+)
+USER_LIST_COLUMNS = (User.id.label('user_id'), User.name, User.email, User.role, User.is_banned)
+TICKET_COLUMNS = (
+    SupportTicket.id, SupportTicket.user_id, SupportTicket.subject, SupportTicket.message,
+    SupportTicket.status, SupportTicket.created_at, SupportTicket.admin_reply,
+)
+NOTIFICATION_COLUMNS = (Notification.id, Notification.message, Notification.is_read, Notification.created_at)
+REVIEW_COLUMNS = (Review.id, Review.user_id, Review.rating, Review.comment, Review.created_at)
+
+def archive_columns(columns, archive_model):
+    """The same projection over `archive_model`, whose columns share the hot table's names."""
+    return tuple(
+        archive_model.__table__.c[getattr(column, 'element', column).key].label(column.key)
+        for column in select(*columns).selected_columns
+    )
+
+BOOKING_ARCHIVE_FOR_USER_COLUMNS = archive_columns(BOOKING_FOR_USER_COLUMNS, BookingArchive)
+BOOKING_ARCHIVE_FOR_DRIVER_COLUMNS = archive_columns(BOOKING_FOR_DRIVER_COLUMNS, BookingArchive)
+TRANSACTION_ARCHIVE_COLUMNS = archive_columns(TRANSACTION_COLUMNS, TransactionArchive)
+# dataset -> (model, columns) for the admin exports, oldest first on each model's (created_at, id) indexes
+EXPORTS = {
+    'transactions': (Transaction, (
+        Transaction.id, Transaction.transaction_id, Transaction.user_id, Transaction.type, Transaction.amount,
+        Transaction.status, Transaction.created_at,
+    )),
+    'bookings': (Booking, (
+        Booking.id, Booking.user_id, Booking.driver_id, Booking.pickup_location, Booking.dropoff_location,
+        Booking.distance, Booking.price, Booking.status, Booking.promo_code, Booking.created_at,
+    )),
+    'tickets': (SupportTicket, TICKET_COLUMNS),
+}
+# Exports include these archive tables with ?archived=1
+EXPORT_ARCHIVES = {'transactions': TransactionArchive, 'bookings': BookingArchive}
+EXPORT_BATCH = 1000
+
+def fetch_rows(stmt, shards=None):
+    # Rows from several shards come back one shard after another; callers that sort or limit do so again
+    return serializer_for(stmt).dicts(read_shards(stmt, shards))
+
+# Keyset pagination on (created_at, id), newest first
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, row_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def stream_rows(key, stmt, row_hook=None, created_col=None, id_col=None):
+    # Legacy "all" mode: same JSON shape as before, written out a batch of rows at a time instead of buffered
+    serializer = serializer_for(stmt)
+
+    def batches():
+        if created_col is None or not spans_shards(stmt):
+            yield from db.session.execute(stmt.execution_options(yield_per=500)).partitions()
+            return
+        # Newest first across shards: each shard's stream is merged on the trailing cursor columns
+        rows = merged_shard_rows(
+            stmt.add_columns(created_col.label('_cursor_created'), id_col.label('_cursor_id'))
+            .execution_options(yield_per=500),
+            key=lambda row: row[-2:], reverse=True
+        )
+        while True:
+            batch = [row[:-2] for row in itertools.islice(rows, 500)]
+            if not batch:
+                break
+            yield batch
+
+    def generate():
+        yield '{"%s": [' % key
+        separator = ''
+        for batch in batches():
+            rows = serializer.dicts(batch)
+            if row_hook:
+                for row in rows:
+                    row_hook(row)
+            yield separator + app.json.dumps(rows)[1:-1]
+            separator = ','
+        yield ']}'
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+def include_archived():
+    return request.args.get('archived') in ('1', 'true')
+
+def merge_tiers(*tiers):
+    """UNION ALL of (stmt, created_col, id_col) tiers selecting the same labels; returns the merged triple."""
+    merged = union_all(*(
+        stmt.add_columns(created_col.label('_tier_created'), id_col.label('_tier_id'))
+        for stmt, created_col, id_col in tiers
+    )).subquery()
+    columns = [column for column in merged.c if column.key not in ('_tier_created', '_tier_id')]
+    return select(*columns), merged.c._tier_created, merged.c._tier_id
+
+def paginated_response(key, stmt, created_col, id_col, row_hook=None, archive=None):
+    """Keyset-paginated `stmt`, newest first; `archive` is the (stmt, created_col, id_col) tier added by ?archived=1."""
+    if archive is not None and include_archived():
+        stmt, created_col, id_col = merge_tiers((stmt, created_col, id_col), archive)
+    ordered = stmt.order_by(created_col.desc(), id_col.desc())
+    if request.args.get('all') in ('1', 'true'):
+        return stream_rows(key, ordered, row_hook, created_col, id_col)
+
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            ordered = ordered.where(or_(
+                created_col < created_at,
+                and_(created_col == created_at, id_col < row_id),
+            ))
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+
+    # The cursor columns ride at the end of each tuple and are dropped before serializing
+    page = ordered.add_columns(created_col.label('_cursor_created'), id_col.label('_cursor_id')).limit(limit + 1)
+    if spans_shards(page):
+        # Every shard returns its own first page; the newest limit + 1 of those are the page
+        result = list(itertools.islice(heapq.merge(
+            *on_shards(lambda shard: db.session.execute(page).all()), key=lambda row: row[-2:], reverse=True
+        ), limit + 1))
+    else:
+        result = db.session.execute(page).all()
+    next_cursor = None
+    if len(result) > limit:
+        result = result[:limit]
+        next_cursor = encode_cursor(result[-1][-2], result[-1][-1])
+    rows = serializer_for(stmt).dicts(row[:-2] for row in result)
+    if row_hook:
+        for row in rows:
+            row_hook(row)
+    return jsonify({key: rows, 'next_cursor': next_cursor})
+
+# Count SQL statements per request so tests and debug responses can assert they stay constant
+def request_query_tally():
+    # The request's tally is handed to the app contexts on_shards opens, so statements on shard threads count too
+    if not has_app_context():
+        return None
+    if 'query_tally' not in g and has_request_context():
+        g.query_tally = QueryTally()
+    return g.get('query_tally')
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    tally = request_query_tally()
+    source = 'request' if tally is not None else 'background'
+    SQL_STATEMENTS.inc(source=source)
+    SQL_SECONDS.observe(elapsed, source=source)
+    if tally is not None:
+        tally.add(elapsed)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+def _attach_main_database(path, dbapi_connection, connection_record):
+    # Shard files hold only the per-region tables, so joins to users resolve `user` in the attached main database
+    dbapi_connection.execute('ATTACH DATABASE ? AS global_db', (path,))
+
+with app.app_context():
+    if shard_map.enabled and (db.engine.dialect.name != 'sqlite' or db.engine.url.database in (None, '', ':memory:')):
+        raise ValueError('SHARD_REGIONS needs SQLALCHEMY_DATABASE_URI to be an SQLite database file')
+    for bind_key, engine in db.engines.items():
+        event.listen(engine, 'before_cursor_execute', _start_query_timer)
+        event.listen(engine, 'after_cursor_execute', _record_query_time)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
+        if bind_key is not None:
+            event.listen(engine, 'connect', functools.partial(_attach_main_database, db.engine.url.database))
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if profiler.enabled:
+        g.profile = profiler.start(request.headers.get('X-Profile'))
+
+@app.after_request
+def record_request_metrics(response):
+    # Recorded when the response is closed, so streamed bodies count towards latency, size and SQL
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    method, status = request.method, str(response.status_code)
+    request_g = g._get_current_object()
+    started = request_g.get('request_started', time.perf_counter())
+    profile = request_g.pop('profile', None)
+    size = [response.calculate_content_length() or 0]
+
+    if response.is_streamed:
+        body = response.response
+
+        def counted():
+            try:
+                for chunk in body:
+                    size[0] += len(chunk)
+                    yield chunk
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        response.response = counted()
+
+    def record():
+        elapsed = time.perf_counter() - started
+        REQUEST_LATENCY.observe(elapsed, method=method, route=route, status=status)
+        RESPONSE_SIZE.observe(size[0], route=route)
+        tally = request_g.get('query_tally') or QueryTally()
+        REQUEST_SQL_STATEMENTS.observe(tally.count, route=route)
+        REQUEST_SQL_SECONDS.observe(tally.seconds, route=route)
+        if profile is not None:
+            path = profiler.stop(profile, f'{method} {route}', elapsed)
+            if path:
+                app.logger.info('Profiled %s %s (%.0f ms): %s', method, route, elapsed * 1000, path)
+    response.call_on_close(record)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Authentication required'}), 401
+    return app.response_class(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.after_request
+def add_query_count_header(response):
+    if app.debug or app.config['EXPOSE_QUERY_COUNT']:
+        tally = g.get('query_tally')
+        response.headers['X-Query-Count'] = str(tally.count if tally else 0)
+    return response
+
+@app.after_request
+def compress(response):
+    if app.config['COMPRESS_RESPONSES']:
+        compress_response(response, app.config['COMPRESS_MIN_BYTES'], app.config['COMPRESS_LEVEL'])
+    return response
+
+# Response Cache
+def make_cache_backend():
+    if app.config['CACHE_BACKEND'] == 'redis':
+        import redis
+        return RedisBackend(redis.Redis.from_url(app.config['CACHE_REDIS_URL']))
+    return MemoryBackend(max_entries=app.config['CACHE_MAX_ENTRIES'])
+
+response_cache = ResponseCache(make_cache_backend(), default_ttl=app.config['CACHE_DEFAULT_TTL'])
+
+def invalidate_on_commit(*tags):
+    # Dropped after the write commits, so a concurrent read can't re-cache the old rows
+    db.session.info.setdefault('cache_tags', set()).update(tags)
+
+def _invalidate_committed(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        response_cache.invalidate(*tags)
+
+def _discard_cache_tags(session):
+    session.info.pop('cache_tags', None)
+
+event.listen(db.session, 'after_commit', _invalidate_committed)
+event.listen(db.session, 'after_rollback', _discard_cache_tags)
+
+def _store_response(key, response, tags, ttl, generation):
+    limit = app.config['CACHE_MAX_BODY_BYTES']
+
+    def store(body):
+        response_cache.set(key, {'status': response.status_code, 'mimetype': response.mimetype, 'body': body},
+                           tags=tags, ttl=ttl, generation=generation)
+
+    # Bodies are kept as bytes: MessagePack ones aren't text
+    if not response.is_streamed:
+        body = response.get_data()
+        if len(body) <= limit:
+            store(body)
+        return response
+
+    # Streamed bodies are cached as they go out, unless they outgrow the limit
+    def tee(chunks):
+        parts, size = [], 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > limit:
+                    parts = None
+                else:
+                    parts.append(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        if parts is not None:
+            store(b''.join(parts))
+
+    response.response = tee(response.response)
+    return response
+
+def cached_response(key, tags, build, ttl=None):
+    """Serve `key` from the response cache, or call `build()` and cache its 200 response under `tags`."""
+    if not response_cache.enabled:
+        return build()
+    key = f'{key}|{response_format()}'  # JSON and MessagePack bodies are cached separately
+    cached = response_cache.get(key)
+    if cached is not None:
+        response = app.response_class(cached['body'], status=cached['status'], mimetype=cached['mimetype'])
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    generation = response_cache.generation
+    response = make_response(build())
+    response.headers['X-Cache'] = 'MISS'
+    if response.status_code == 200:
+        _store_response(key, response, tags, ttl, generation)
+    return response
+
+def cached_view(tags, ttl=None):
+    """Cache a GET view per endpoint, URL arguments and query string; `tags` may be a function of the URL arguments."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            key = '|'.join([
+                request.endpoint,
+                *(f'{name}={value}' for name, value in sorted(kwargs.items())),
+                *(f'{name}={value}' for name, value in sorted(request.args.items(multi=True))),
+                g.get('table_versions', ''),
+            ])
+            view_tags = tags(**kwargs) if callable(tags) else tags
+            return cached_response(key, view_tags, lambda: view(**kwargs), ttl=ttl)
+        return wrapper
+    return decorator
+
+# Conditional GET: validators come from per-table version rows, not from hashing the payload
+def _record_orm_writes(session, flush_context):
+    touched = session.info.setdefault('touched_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        touched.add(obj.__table__.name)
+
+def _record_statement_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None or table.name == TableVersion.__tablename__:
+        return None
+    # Statements that match nothing (e.g. a lost compare-and-set) don't count as writes
+    result = orm_execute_state.invoke_statement()
+    if getattr(result, 'rowcount', -1) != 0:
+        orm_execute_state.session.info.setdefault('touched_tables', set()).add(table.name)
+    return result
+
+def _bump_table_versions(session):
+    session.flush()
+    touched = session.info.pop('touched_tables', None)
+    if not touched:
+        return
+    now = datetime.utcnow()
+    bumped = session.execute(
+        update(TableVersion).where(TableVersion.table_name.in_(touched))
+        .values(version=TableVersion.version + 1, updated_at=now)
+    ).rowcount
+    if bumped == len(touched):
+        return
+    # Some tables have no row yet (init_db seeds them). Another writer may be inserting one too, and
+    # bumping a row twice is harmless, so insert each table's row or bump it again
+    for table_name in sorted(touched):
+        try:
+            with session.begin_nested():
+                session.execute(insert(TableVersion).values(table_name=table_name, version=1, updated_at=now))
+        except IntegrityError:
+            session.execute(
+                update(TableVersion).where(TableVersion.table_name == table_name)
+                .values(version=TableVersion.version + 1, updated_at=now)
+            )
+
+def _discard_touched_tables(session):
+    session.info.pop('touched_tables', None)
+
+event.listen(db.session, 'after_flush', _record_orm_writes)
+event.listen(db.session, 'do_orm_execute', _record_statement_writes)
+event.listen(db.session, 'before_commit', _bump_table_versions)
+event.listen(db.session, 'after_rollback', _discard_touched_tables)
+
+def seed_table_versions():
+    def seed(shard):
+        existing = set(db.session.execute(select(TableVersion.table_name)).scalars())
+        missing = [name for name in db.metadata.tables if name not in existing and name != TableVersion.__tablename__]
+        if missing:
+            db.session.execute(insert(TableVersion), [
+                {'table_name': name, 'version': 0, 'updated_at': datetime.utcnow()} for name in missing
+            ])
+            db.session.commit()
+    on_shards(seed)
+
+def table_versions(tables):
+    """[(table_name, version, updated_at)] for `tables`; a table's version is the sum of its versions in every shard."""
+    rows = read_shards(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables)),
+        shard_map.shards
+    )
+    versions = {}
+    for table_name, version, updated_at in rows:
+        total, latest = versions.get(table_name, (0, updated_at))
+        versions[table_name] = (total + version, max(latest, updated_at))
+    return sorted((table_name, version, updated_at) for table_name, (version, updated_at) in versions.items())
+
+def conditional_view(*tables):
+    """Answer If-None-Match / If-Modified-Since with 304 while none of `tables` has changed.
+
+    The ETag is derived from the URL and the tables' version counters, so a
+    revalidation costs one primary-key lookup per shard and never runs the view. The
+    versions are also folded into response cache keys, so a cached body can
+    never outlive the data it was rendered from.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            rows = table_versions(tables)
+            g.table_versions = ','.join(f'{table_name}:{version}' for table_name, version, _ in rows)
+            etag = hashlib.blake2b(
+                f'{request.full_path}|{g.table_versions}|{response_format()}'.encode(), digest_size=12
+            ).hexdigest()
+            last_modified = max((updated_at for _, _, updated_at in rows), default=None)
+            if last_modified:
+                last_modified = last_modified.replace(microsecond=0)
+                # A change later in this same second would not move the header, so only send settled seconds
+                if last_modified >= datetime.utcnow().replace(microsecond=0):
+                    last_modified = None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(last_modified and since and last_modified <= since.replace(tzinfo=None))
+
+            response = app.response_class(status=304) if not_modified else make_response(view(**kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
 # Helper Functions
 def validate_user(data):
     if not data.get('name') or not data.get('phone') or not data.get('email') or not data.get('password'):
         return False
     return True
 
+# In-process spatial index over available drivers, built on first use from the DB and from
+# positions still held by the location hub that have not been flushed yet
+driver_index = DriverIndex()
+_driver_index_loaded = False
+_driver_index_lock = threading.Lock()
+
+def get_driver_index():
+    global _driver_index_loaded
+    if not _driver_index_loaded:
+        with _driver_index_lock:
+            if not _driver_index_loaded:
+                positions = location_hub.positions()
+                located = Driver.live_location.isnot(None)
+                if positions:
+                    located = or_(located, Driver.id.in_(positions))
+                rows = read_shards(
+                    select(Driver.id, Driver.live_location).where(Driver.is_available == True, located),
+                    shard_map.shards
+                )
+                for driver_id, live_location in rows:
+                    driver_index.update(driver_id, current_location(driver_id, live_location))
+                _driver_index_loaded = True
+    return driver_index
+
+def sync_driver_index(driver_id, is_available, live_location):
+    if not _driver_index_loaded:
+        # A build in progress may have read this driver's position before the change; wait for it
+        with _driver_index_lock:
+            if not _driver_index_loaded:
+                return
+    if is_available and live_location:
+        driver_index.update(driver_id, live_location)
+    else:
+        driver_index.remove(driver_id)
+
+# Live driver positions are served from memory and written back to the DB in batches
+DRIVER_LOCATION_UPDATE = update(Driver.__table__).where(
+    Driver.__table__.c.id == bindparam('b_driver_id')
+).values(live_location=bindparam('b_live_location'))
+
+def persist_driver_locations(updates):
+    # One executemany per shard for every driver that moved since the last flush
+    by_shard = shard_map.group_ids(location['driver_id'] for location in updates)
+    positions = {location['driver_id']: location['live_location'] for location in updates}
+
+    def flush(shard):
+        db.session.execute(DRIVER_LOCATION_UPDATE, [
+            {'b_driver_id': driver_id, 'b_live_location': positions[driver_id]} for driver_id in by_shard[shard]
+        ])
+        db.session.commit()
+    on_shards(flush, by_shard, pool=shard_worker_pool)
+
+location_hub = LocationHub(
+    flush_fn=persist_driver_locations,
+    flush_interval=app.config['LOCATION_FLUSH_INTERVAL'],
+    history=LocationHistory()
+)
+atexit.register(location_hub.stop)
+
+def current_location(driver_id, stored_location=None):
+    latest = location_hub.latest(driver_id)
+    return latest['live_location'] if latest else stored_location
+
+# driver_id -> (is_available, expires_at), so location pings skip the DB; the TTL bounds how long a change
+# made by another process, or a deleted driver, goes unseen
+_driver_availability = {}
+
+def driver_availability(driver_id):
+    cached = _driver_availability.get(driver_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    shard = shard_map.for_id(driver_id)
+    if shard is None:
+        return None
+    with use_shard(shard):
+        row = db.session.execute(select(Driver.is_available).where(Driver.id == driver_id)).first()
+    if row is None:
+        _driver_availability.pop(driver_id, None)
+        return None
+    remember_driver_availability(driver_id, row[0])
+    return bool(row[0])
+
+def remember_driver_availability(driver_id, is_available):
+    _driver_availability[driver_id] = (bool(is_available), time.monotonic() + app.config['DRIVER_AVAILABILITY_TTL'])
+
+# Wallet settlement shared by the IntaSend callback and the background reconciler
+def to_minor_units(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def credit_wallet(transaction_id, user_id, amount_minor):
+    # Both ledger legs and the balance change are written in the caller's DB transaction
+    db.session.execute(insert(LedgerEntry), [
+        {'transaction_id': transaction_id, 'account': 'intasend_clearing', 'user_id': None,
+         'amount_minor': -amount_minor},
+        {'transaction_id': transaction_id, 'account': 'wallet', 'user_id': user_id,
+         'amount_minor': amount_minor},
+    ])
+    db.session.execute(
+        update(User).where(User.id == user_id).values(
+            balance_minor=User.balance_minor + amount_minor,
+            balance=(User.balance_minor + amount_minor) / 100.0
+        )
+    )
+    invalidate_on_commit(f'user:{user_id}')
+
+def settle_transaction(transaction_pk, transaction_id, user_id, amount, status):
+    """Move a pending transaction to its final status, crediting completed deposits exactly once.
+
+    The status change is a compare-and-set on 'pending', so duplicate callbacks and
+    concurrent polls lose the race and change nothing; the ledger's unique
+    (transaction_id, account) key backs that up at the schema level.
+    """
+    result = db.session.execute(
+        update(Transaction).where(Transaction.id == transaction_pk, Transaction.status == 'pending').values(status=status)
+    )
+    if result.rowcount != 1:
+        return False
+    if status == 'completed':
+        credit_wallet(transaction_id, user_id, to_minor_units(amount))
+    return True
+
+def reconcile_pending_transactions():
+    batch_size = app.config['INTASEND_RECONCILE_BATCH']
+    with app.app_context():
+        last_id = 0
+        while True:
+            batch = db.session.execute(
+                select(Transaction.id, Transaction.transaction_id, Transaction.user_id, Transaction.amount,
+                       Transaction.intasend_id)
+                .where(Transaction.status == 'pending', Transaction.intasend_id.isnot(None), Transaction.id > last_id)
+                .order_by(Transaction.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            statuses = intasend_client.payment_statuses(
+                [row.intasend_id for row in batch], concurrency=app.config['INTASEND_CONCURRENCY']
+            )
+            for row in batch:
+                status = statuses[row.intasend_id]
+                if isinstance(status, Exception):
+                    app.logger.warning('Error checking IntaSend status for %s: %s', row.intasend_id, status)
+                elif status:
+                    settle_transaction(row.id, row.transaction_id, row.user_id, row.amount, status)
+            db.session.commit()
+            last_id = batch[-1].id
+
+reconciler = IntervalWorker(
+    reconcile_pending_transactions, interval=app.config['INTASEND_RECONCILE_INTERVAL'], name='intasend-reconciler'
+)
+atexit.register(reconciler.stop)
+
+@app.before_request
+def start_background_workers():
+    reconciler.start()
+    notification_worker.start()
+    dispatcher.start()
+    archiver.start()
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+def insert_missing(model, key_column, keys, defaults):
+    """Create counter rows for any of `keys` that don't exist yet, tolerating concurrent creators."""
+    existing = set(db.session.execute(select(key_column).where(key_column.in_(keys))).scalars())
+    missing = [key for key in keys if key not in existing]
+    if not missing:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), [{key_column.key: key, **defaults} for key in missing])
+    except IntegrityError:
+        pass  # Another transaction created them first; callers only increment from here
+
+# Notifications: enqueued in the caller's transaction, delivered in batches by a background worker
+def notification_recipient(user_id=None, driver_id=None):
+    return f'user:{user_id}' if user_id is not None else f'driver:{driver_id}'
+
+def notify(message, user_id=None, driver_id=None):
+    db.session.add(NotificationOutbox(user_id=user_id, driver_id=driver_id, message=message))
+    db.session.info['notifications_enqueued'] = True
+
+UNREAD_COUNTER_UPDATE = update(NotificationCounter.__table__).where(
+    NotificationCounter.__table__.c.recipient == bindparam('b_recipient')
+).values(unread=case(
+    (NotificationCounter.__table__.c.unread + bindparam('b_delta') < 0, 0),
+    else_=NotificationCounter.__table__.c.unread + bindparam('b_delta')
+))
+
+def adjust_unread(deltas):
+    """Apply {recipient: change} to the unread counters in the current transaction."""
+    deltas = {recipient: delta for recipient, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    insert_missing(NotificationCounter, NotificationCounter.recipient, list(deltas), {'unread': 0})
+    db.session.execute(UNREAD_COUNTER_UPDATE, [
+        {'b_recipient': recipient, 'b_delta': delta} for recipient, delta in deltas.items()
+    ])
+
+def deliver_notifications():
+    """Move queued notifications from each shard's outbox into its `notification`, a batch per transaction."""
+    return sum(on_shards(deliver_shard_notifications, pool=shard_worker_pool))
+
+def deliver_shard_notifications(shard):
+    outbox = NotificationOutbox.__table__
+    batch_size = app.config['NOTIFICATION_BATCH']
+    delivered = 0
+    while True:
+        # Deleting is the claim, so concurrent workers never deliver a row twice
+        claimed = sorted(db.session.execute(
+            delete(outbox)
+            .where(outbox.c.id.in_(select(outbox.c.id).order_by(outbox.c.id).limit(batch_size).scalar_subquery()))
+            .returning(outbox.c.id, outbox.c.user_id, outbox.c.driver_id, outbox.c.message, outbox.c.created_at)
+        ).all())
+        if not claimed:
+            db.session.rollback()
+            break
+        db.session.execute(insert(Notification), [
+            {'user_id': row.user_id, 'driver_id': row.driver_id, 'message': row.message,
+             'is_read': False, 'created_at': row.created_at}
+            for row in claimed
+        ])
+        adjust_unread(Counter(notification_recipient(row.user_id, row.driver_id) for row in claimed))
+        db.session.commit()
+        delivered += len(claimed)
+        if len(claimed) < batch_size:
+            break
+    return delivered
+
+notification_worker = IntervalWorker(
+    deliver_notifications, interval=app.config['NOTIFICATION_DELIVERY_INTERVAL'], name='notification-delivery'
+)
+atexit.register(notification_worker.stop)
+
+def _wake_notification_worker(session):
+    if session.info.pop('notifications_enqueued', False):
+        notification_worker.wake()
+
+def _discard_enqueued_flag(session):
+    session.info.pop('notifications_enqueued', None)
+
+event.listen(db.session, 'after_commit', _wake_notification_worker)
+event.listen(db.session, 'after_rollback', _discard_enqueued_flag)
+
+# Dispatch: queued ride requests are matched to idle drivers one window at a time
+dispatch_engine = DispatchEngine(max_pickup_km=app.config['DISPATCH_MAX_PICKUP_KM'])
+assignment_feed = AssignmentFeed()
+DISPATCH_CLAIM_TIMEOUT = timedelta(seconds=60)
+DISPATCH_ASSIGN = update(DispatchRequest.__table__).where(
+    DispatchRequest.__table__.c.id == bindparam('b_request_id')
+).values(
+    status='assigned', driver_id=bindparam('b_driver_id'), booking_id=bindparam('b_booking_id'),
+    assigned_at=bindparam('b_assigned_at')
+)
+
+def idle_drivers():
+    """Available, located drivers without a pending or accepted booking, keyed by driver id."""
+    busy = set(db.session.execute(
+        select(Booking.driver_id).where(Booking.status.in_(('pending', 'accepted'))).distinct()
+    ).scalars())
+    rows = db.session.execute(
+        select(Driver.id, Driver.vehicle_type, Driver.rating_score, Driver.live_location)
+        .join(User, Driver.user_id == User.id)
+        .where(Driver.is_available == True, Driver.live_location.isnot(None), User.is_banned == False)
+    ).all()
+    drivers = {}
+    for row in rows:
+        point = parse_location(current_location(row.id, row.live_location))
+        if point is not None and row.id not in busy:
+            drivers[row.id] = {'lat': point[0], 'lng': point[1], 'rating': row.rating_score,
+                               'vehicle_type': row.vehicle_type}
+    return drivers
+
+def run_dispatch_window():
+    """One dispatch window on every shard; returns the number of requests assigned."""
+    return sum(on_shards(dispatch_shard_window, pool=shard_worker_pool))
+
+def dispatch_shard_window(shard):
+    """Claim up to DISPATCH_BATCH of a shard's queued requests, match them to its drivers and create their bookings."""
+    table = DispatchRequest.__table__
+    now = datetime.utcnow()
+    # The claim is committed on its own so the solve doesn't hold SQLite's write lock;
+    # rows left in 'matching' by a crashed pass are reclaimed after DISPATCH_CLAIM_TIMEOUT
+    claimable = select(table.c.id).where(or_(
+        table.c.status == 'queued',
+        and_(table.c.status == 'matching', table.c.claimed_at < now - DISPATCH_CLAIM_TIMEOUT)
+    )).order_by(table.c.id).limit(app.config['DISPATCH_BATCH'])
+    claimed = sorted(db.session.execute(
+        update(table).where(table.c.id.in_(claimable.scalar_subquery()))
+        .values(status='matching', claimed_at=now)
+        .returning(table.c.id, table.c.user_id, table.c.pickup_location, table.c.dropoff_location,
+                   table.c.pickup_lat, table.c.pickup_lng, table.c.dropoff_lat, table.c.dropoff_lng,
+                   table.c.vehicle_type, table.c.created_at)
+    ).all())
+    db.session.commit()
+    if not claimed:
+        return 0
+
+    matches = dispatch_engine.match(
+        [{'id': row.id, 'lat': row.pickup_lat, 'lng': row.pickup_lng, 'vehicle_type': row.vehicle_type}
+         for row in claimed],
+        idle_drivers()
+    )
+
+    assigned = []
+    for row in claimed:
+        if row.id not in matches:
+            continue
+        driver_id, _ = matches[row.id]
+        quote = pricing_engine.quote((row.pickup_lat, row.pickup_lng), (row.dropoff_lat, row.dropoff_lng))
+        booking = Booking(user_id=row.user_id, driver_id=driver_id, pickup_location=row.pickup_location,
+                          dropoff_location=row.dropoff_location, distance=quote['distance'], price=quote['price'])
+        db.session.add(booking)
+        notify(f'New booking request from User {row.user_id}.', driver_id=driver_id)
+        notify(f'Driver {driver_id} has been assigned to your request.', user_id=row.user_id)
+        assigned.append((row, driver_id, booking))
+    db.session.flush()
+    # Read before commit expires the bookings, which would reload each one
+    payloads = [(driver_id, {
+        'request_id': row.id, 'booking_id': booking.id, 'user_id': row.user_id,
+        'pickup_location': row.pickup_location, 'dropoff_location': row.dropoff_location,
+        'distance': booking.distance, 'price': booking.price
+    }) for row, driver_id, booking in assigned]
+    if assigned:
+        assigned_at = datetime.utcnow()
+        db.session.execute(DISPATCH_ASSIGN, [
+            {'b_request_id': payload['request_id'], 'b_driver_id': driver_id,
+             'b_booking_id': payload['booking_id'], 'b_assigned_at': assigned_at}
+            for driver_id, payload in payloads
+        ])
+        invalidate_on_commit('orders:available')
+
+    # Unmatched requests go back in the queue until they have waited DISPATCH_MAX_WAIT
+    deadline = now - timedelta(seconds=app.config['DISPATCH_MAX_WAIT'])
+    waiting = [row for row in claimed if row.id not in matches]
+    expired = [row.id for row in waiting if row.created_at < deadline]
+    for row in waiting:
+        if row.created_at < deadline:
+            notify('No driver is available for your request right now.', user_id=row.user_id)
+    if expired:
+        db.session.execute(update(table).where(table.c.id.in_(expired)).values(status='unmatched'))
+    if len(waiting) > len(expired):
+        db.session.execute(
+            update(table).where(table.c.id.in_([row.id for row in waiting]), table.c.status == 'matching')
+            .values(status='queued', claimed_at=None)
+        )
+    db.session.commit()
+
+    for driver_id, payload in payloads:
+        assignment_feed.publish(driver_id, payload)
+    return len(payloads)
+
+dispatcher = IntervalWorker(run_dispatch_window, interval=app.config['DISPATCH_WINDOW'], name='dispatcher')
+atexit.register(dispatcher.stop)
+
+# Archival: old finished rows leave the hot tables a batch per transaction, so writers wait for one batch at most
+FINISHED_BOOKING_STATUSES = ('completed', 'cancelled')
+SETTLED_TRANSACTION_STATUSES = ('completed', 'failed')
+
+def drain_old_rows(model, condition, cutoff, archive_model=None, tags=()):
+    """Delete rows matching `condition` created before `cutoff`, copying them into `archive_model` if given.
+
+    Batches walk the (created_at, id) index oldest first and commit one by one,
+    so an interrupted run loses nothing and the next one carries on. Returns the
+    number of rows removed.
+    """
+    hot = model.__table__
+    batch_size, pause = app.config['ARCHIVE_BATCH'], app.config['ARCHIVE_BATCH_PAUSE']
+    position = None
+    drained = 0
+    while True:
+        # SQLite gives new rows max(id) + 1, so always keep the newest row: otherwise the ids of archived rows,
+        # or of expired ones a client may still hold, could be handed out again
+        batch = select(hot.c.id).where(condition, hot.c.created_at < cutoff,
+                                       hot.c.id < select(func.max(hot.c.id)).scalar_subquery())
+        if position:
+            batch = batch.where(or_(hot.c.created_at > position[0],
+                                    and_(hot.c.created_at == position[0], hot.c.id > position[1])))
+        batch = batch.order_by(hot.c.created_at, hot.c.id).limit(batch_size)
+        # Deleting first takes the write lock up front, like the notification delivery claim
+        rows = db.session.execute(
+            delete(hot).where(hot.c.id.in_(batch.scalar_subquery())).returning(*hot.c)
+        ).mappings().all()
+        if not rows:
+            db.session.rollback()
+            break
+        if archive_model is not None:
+            archived_at = datetime.utcnow()
+            db.session.execute(insert(archive_model), [{**row, 'archived_at': archived_at} for row in rows])
+        invalidate_on_commit(*tags)
+        db.session.commit()
+        drained += len(rows)
+        position = max((row['created_at'], row['id']) for row in rows)
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+    return drained
+
+def archive_old_rows():
+    """One archiver pass over every shard; returns the number of rows archived or expired per table."""
+    now = datetime.utcnow()
+    archive_before = now - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+
+    def drain(shard):
+        moved = {
+            'booking': drain_old_rows(Booking, Booking.status.in_(FINISHED_BOOKING_STATUSES), archive_before,
+                                      BookingArchive, tags=('escrow',)),
+            'transaction': 0,
+            'notification': drain_old_rows(Notification, Notification.is_read == True,
+                                           now - timedelta(days=app.config['NOTIFICATION_READ_TTL_DAYS'])),
+        }
+        # Transactions are global and only the main database has them
+        if shard.index == 0:
+            moved['transaction'] = drain_old_rows(
+                Transaction, Transaction.status.in_(SETTLED_TRANSACTION_STATUSES), archive_before, TransactionArchive
+            )
+        return moved
+
+    totals = Counter()
+    for moved in on_shards(drain, pool=shard_worker_pool):
+        totals.update(moved)
+    return {table_name: totals[table_name] for table_name in ('booking', 'transaction', 'notification')}
+
+archiver = IntervalWorker(archive_old_rows, interval=app.config['ARCHIVE_INTERVAL'], name='archiver')
+atexit.register(archiver.stop)
+
+@app.cli.command('archive')
+def archive_command():
+    """Archive old finished bookings and settled transactions and expire old read notifications."""
+    for table_name, count in archive_old_rows().items():
+        print(f"{table_name}: {count} rows")
+
+# Dashboard statistics: ORM writes to users, bookings and tickets adjust the counters in the same transaction
+STAT_COUNTER_UPDATE = update(StatCounter.__table__).where(
+    StatCounter.__table__.c.key == bindparam('b_key')
+).values(
+    count=StatCounter.__table__.c.count + bindparam('b_count'),
+    total=StatCounter.__table__.c.total + bindparam('b_total')
+)
+DRIVER_STATS_UPDATE = update(Driver.__table__).where(Driver.__table__.c.id == bindparam('b_driver_id')).values(
+    completed_orders=func.coalesce(Driver.__table__.c.completed_orders, 0) + bindparam('b_completed'),
+    earnings=func.coalesce(Driver.__table__.c.earnings, 0) + bindparam('b_earnings')
+)
+
+def _before_change(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+def _changed(obj, *attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+def _add_stat_delta(session, key, count, total=0.0):
+    entry = session.info.setdefault('stat_deltas', {}).setdefault(key, [0, 0.0])
+    entry[0] += count
+    entry[1] += total
+
+def _add_booking_stat_deltas(session, status, price, created_at, driver_id, sign):
+    """Count a booking in (sign=1) or out of (sign=-1) the counters for its status; Core UPDATEs call this directly."""
+    price = price or 0.0
+    _add_stat_delta(session, f'bookings:status:{status}', sign, sign * price)
+    _add_stat_delta(session, f'driver_orders:{driver_id}', sign)
+    if status == 'completed':
+        _add_stat_delta(session, f'revenue:{created_at.date().isoformat()}', sign, sign * price)
+        entry = session.info.setdefault('driver_stat_deltas', {}).setdefault(driver_id, [0, 0.0])
+        entry[0] += sign
+        entry[1] += sign * price
+
+def _collect_stat_deltas(session, flush_context):
+    def add(key, count, total=0.0):
+        _add_stat_delta(session, key, count, total)
+
+    def booking(status, price, created_at, driver_id, sign):
+        _add_booking_stat_deltas(session, status, price, created_at, driver_id, sign)
+
+    def user(role, is_banned, sign):
+        add(f'users:role:{role}', sign)
+        if is_banned:
+            add('users:banned', sign)
+
+    # New rows have their column defaults filled in by the time after_flush runs
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            booking(obj.status, obj.price, obj.created_at, obj.driver_id, 1)
+        elif isinstance(obj, User):
+            user(obj.role, obj.is_banned, 1)
+        elif isinstance(obj, SupportTicket):
+            add(f'tickets:status:{obj.status}', 1)
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and _changed(obj, 'status', 'price', 'driver_id'):
+            booking(_before_change(obj, 'status'), _before_change(obj, 'price'), obj.created_at,
+                    _before_change(obj, 'driver_id'), -1)
+            booking(obj.status, obj.price, obj.created_at, obj.driver_id, 1)
+        elif isinstance(obj, User) and _changed(obj, 'role', 'is_banned'):
+            user(_before_change(obj, 'role'), _before_change(obj, 'is_banned'), -1)
+            user(obj.role, obj.is_banned, 1)
+        elif isinstance(obj, SupportTicket) and _changed(obj, 'status'):
+            add(f'tickets:status:{_before_change(obj, "status")}', -1)
+            add(f'tickets:status:{obj.status}', 1)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            booking(obj.status, obj.price, obj.created_at, obj.driver_id, -1)
+        elif isinstance(obj, User):
+            user(obj.role, obj.is_banned, -1)
+        elif isinstance(obj, SupportTicket):
+            add(f'tickets:status:{obj.status}', -1)
+
+def _apply_stat_deltas(session):
+    session.flush()
+    stats = {key: delta for key, delta in session.info.pop('stat_deltas', {}).items() if delta[0] or delta[1]}
+    drivers = {driver_id: delta for driver_id, delta in session.info.pop('driver_stat_deltas', {}).items()
+               if delta[0] or delta[1]}
+    if stats:
+        insert_missing(StatCounter, StatCounter.key, sorted(stats), {'count': 0, 'total': 0.0})
+        session.execute(STAT_COUNTER_UPDATE, [
+            {'b_key': key, 'b_count': count, 'b_total': total} for key, (count, total) in stats.items()
+        ])
+    if drivers:
+        session.execute(DRIVER_STATS_UPDATE, [
+            {'b_driver_id': driver_id, 'b_completed': count, 'b_earnings': total}
+            for driver_id, (count, total) in drivers.items()
+        ])
+
+def _discard_stat_deltas(session):
+    session.info.pop('stat_deltas', None)
+    session.info.pop('driver_stat_deltas', None)
+
+event.listen(db.session, 'after_flush', _collect_stat_deltas)
+# Runs ahead of the table version bump so the counter writes are versioned in the same commit
+event.listen(db.session, 'before_commit', _apply_stat_deltas, insert=True)
+event.listen(db.session, 'after_rollback', _discard_stat_deltas)
+
+def rebuild_stats():
+    """Recompute every dashboard counter from the base tables, e.g. after bulk loads that bypass the ORM."""
+    on_shards(rebuild_shard_stats, pool=shard_worker_pool)
+
+def rebuild_shard_stats(shard):
+    # Each shard counts its own bookings; users and tickets are global and counted in the main database
+    rows = []
+    if shard.index == 0:
+        for role, count in db.session.execute(select(User.role, func.count()).group_by(User.role)):
+            rows.append({'key': f'users:role:{role}', 'count': count, 'total': 0.0})
+        banned = db.session.execute(select(func.count()).where(User.is_banned == True)).scalar()
+        rows.append({'key': 'users:banned', 'count': banned, 'total': 0.0})
+        for status, count in db.session.execute(
+                select(SupportTicket.status, func.count()).group_by(SupportTicket.status)):
+            rows.append({'key': f'tickets:status:{status}', 'count': count, 'total': 0.0})
+    # Archived bookings still count towards the totals
+    bookings = union_all(*(
+        select(model.status, model.price, model.created_at, model.driver_id) for model in (Booking, BookingArchive)
+    )).subquery()
+    for status, count, total in db.session.execute(
+            select(bookings.c.status, func.count(), func.coalesce(func.sum(bookings.c.price), 0.0))
+            .group_by(bookings.c.status)):
+        rows.append({'key': f'bookings:status:{status}', 'count': count, 'total': total})
+    day = func.date(bookings.c.created_at)
+    for created_on, count, total in db.session.execute(
+            select(day, func.count(), func.sum(bookings.c.price)).where(bookings.c.status == 'completed')
+            .group_by(day)):
+        rows.append({'key': f'revenue:{created_on}', 'count': count, 'total': total})
+    for driver_id, count in db.session.execute(
+            select(bookings.c.driver_id, func.count()).group_by(bookings.c.driver_id)):
+        rows.append({'key': f'driver_orders:{driver_id}', 'count': count, 'total': 0.0})
+
+    completed = select(bookings.c.driver_id, func.count().label('orders'), func.sum(bookings.c.price).label('earnings')) \
+        .where(bookings.c.status == 'completed').group_by(bookings.c.driver_id).subquery()
+    db.session.execute(update(Driver).values(completed_orders=0, earnings=0.0))
+    db.session.execute(
+        update(Driver).where(Driver.id == completed.c.driver_id)
+        .values(completed_orders=completed.c.orders, earnings=completed.c.earnings)
+    )
+    db.session.execute(delete(StatCounter))
+    if rows:
+        db.session.execute(insert(StatCounter), rows)
+    db.session.commit()
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the admin dashboard counters from the base tables."""
+    rebuild_stats()
+
+# Booking lifecycle: every status change is a compare-and-set on the status it starts from,
+# so of two concurrent requests for the same booking exactly one wins
+BOOKING_TRANSITIONS = {
+    'accept': ('pending', 'accepted'),
+    'user_cancel': ('pending', 'cancelled'),
+    'driver_cancel': ('accepted', 'cancelled'),
+}
+
+def transition_booking(booking_id, action, driver_id=None):
+    """Apply `action` to a booking in the caller's transaction; returns the booking's row, or None if it lost.
+
+    The UPDATE is the transaction's first statement, so on SQLite it takes the
+    write lock straight away instead of upgrading a read snapshot another writer
+    may already have made stale. Passing `driver_id` also requires the booking
+    to be assigned to that driver.
+    """
+    from_status, to_status = BOOKING_TRANSITIONS[action]
+    stmt = update(Booking).where(Booking.id == booking_id, Booking.status == from_status)
+    if driver_id is not None:
+        stmt = stmt.where(Booking.driver_id == driver_id)
+    row = db.session.execute(
+        stmt.values(status=to_status)
+        .returning(Booking.id, Booking.user_id, Booking.driver_id, Booking.price, Booking.created_at)
+    ).first()
+    if row is None:
+        return None
+    _add_booking_stat_deltas(db.session, from_status, row.price, row.created_at, row.driver_id, -1)
+    _add_booking_stat_deltas(db.session, to_status, row.price, row.created_at, row.driver_id, 1)
+    invalidate_on_commit('orders:available')
+    return row
+
+def body_driver_id():
+    """The request body's optional driver_id as an int, so it compares equal to the column; ValueError if not whole."""
+    driver_id = (request.get_json(silent=True) or {}).get('driver_id')
+    if driver_id is None:
+        return None
+    if isinstance(driver_id, bool) or not isinstance(driver_id, (int, str)):
+        raise ValueError(driver_id)
+    return int(driver_id)
+
+def booking_conflict(booking_id, action, driver_id=None):
+    """The error response for a transition that changed nothing: 404, 403 or 409 with the current status."""
+    db.session.rollback()
+    current = db.session.execute(
+        select(Booking.status, Booking.driver_id).where(Booking.id == booking_id)
+    ).first()
+    if current is None:
+        return jsonify({'error': 'Booking not found'}), 404
+    if driver_id is not None and current.driver_id != driver_id:
+        return jsonify({'error': 'Booking is assigned to another driver'}), 403
+    from_status, to_status = BOOKING_TRANSITIONS[action]
+    return jsonify({'error': f'Booking is {current.status}; only {from_status} bookings can be {to_status}',
+                    'status': current.status}), 409
+
+def stat_rows(prefix, since=None):
+    """(key, count, total) for every counter under `prefix`, in key order, added up over the shards."""
+    # Key-range scan on the primary key; ';' sorts right after ':'
+    rows = read_shards(
+        select(StatCounter.key, StatCounter.count, StatCounter.total)
+        .where(StatCounter.key >= prefix + (since or ''), StatCounter.key < prefix[:-1] + ';')
+        .order_by(StatCounter.key)
+    )
+    totals = {}
+    for key, count, total in rows:
+        entry = totals.setdefault(key, [0, 0.0])
+        entry[0] += count
+        entry[1] += total
+    return [(key, count, total) for key, (count, total) in sorted(totals.items())]
+
+# Driver ratings: each review updates the aggregates in a single UPDATE, computed from the row's old values
+def rating_alpha():
+    return 2.0 / (app.config['RATING_RECENT_WINDOW'] + 1)
+
+def record_review(driver_id, rating):
+    prior_mean, prior_weight = app.config['RATING_PRIOR_MEAN'], app.config['RATING_PRIOR_WEIGHT']
+    return db.session.execute(
+        update(Driver).where(Driver.id == driver_id).values(
+            review_count=Driver.review_count + 1,
+            rating_sum=Driver.rating_sum + rating,
+            ratings=(Driver.rating_sum + rating) * 1.0 / (Driver.review_count + 1),
+            recent_rating=case(
+                (Driver.review_count == 0, float(rating)),
+                else_=Driver.recent_rating + rating_alpha() * (rating - Driver.recent_rating)
+            ),
+            rating_score=(prior_weight * prior_mean + Driver.rating_sum + rating) / (prior_weight + Driver.review_count + 1)
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+DRIVER_RATING_UPDATE = update(Driver.__table__).where(Driver.__table__.c.id == bindparam('b_driver_id')).values(
+    review_count=bindparam('b_count'), rating_sum=bindparam('b_sum'), ratings=bindparam('b_mean'),
+    recent_rating=bindparam('b_recent'), rating_score=bindparam('b_score')
+)
+
+def rebuild_driver_ratings(batch_size=1000):
+    """Recompute every driver's rating aggregates from `review`, streaming reviews in index order."""
+    prior_mean, prior_weight, alpha = app.config['RATING_PRIOR_MEAN'], app.config['RATING_PRIOR_WEIGHT'], rating_alpha()
+    aggregates = {}  # driver_id -> [count, sum, recent]
+    reviews = db.session.execute(
+        select(Review.driver_id, Review.rating)
+        .order_by(Review.driver_id, Review.created_at, Review.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for driver_id, rating in reviews:
+        entry = aggregates.get(driver_id)
+        if entry is None:
+            aggregates[driver_id] = [1, rating, float(rating)]
+        else:
+            entry[0] += 1
+            entry[1] += rating
+            entry[2] += alpha * (rating - entry[2])
+
+    by_shard = shard_map.group_ids(aggregates)
+
+    def apply(shard):
+        db.session.execute(update(Driver.__table__).values(
+            review_count=0, rating_sum=0, ratings=0.0, recent_rating=0.0, rating_score=prior_mean
+        ))
+        rows = []
+        for driver_id in by_shard.get(shard, ()):
+            count, total, recent = aggregates[driver_id]
+            rows.append({'b_driver_id': driver_id, 'b_count': count, 'b_sum': total, 'b_mean': total / count,
+                         'b_recent': recent, 'b_score': (prior_weight * prior_mean + total) / (prior_weight + count)})
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(DRIVER_RATING_UPDATE, rows[start:start + batch_size])
+        invalidate_on_commit('drivers')
+        db.session.commit()
+        return len(rows)
+    return sum(on_shards(apply, pool=shard_worker_pool))
+
+@app.cli.command('rebuild-ratings')
+def rebuild_ratings_command():
+    """Recompute driver rating aggregates from the reviews table."""
+    print(f"Rebuilt ratings for {rebuild_driver_ratings()} drivers")
+
+# Authentication: the password hash runs once per login; requests carry a signed token
+token_signer = TokenSigner(app.config['SECRET_KEY'], max_age=app.config['AUTH_TOKEN_MAX_AGE'])
+principal_cache = PrincipalCache(
+    max_size=app.config['AUTH_PRINCIPAL_CACHE_SIZE'], ttl=app.config['AUTH_PRINCIPAL_CACHE_TTL']
+)
+login_limiter = LoginRateLimiter(window=app.config['LOGIN_WINDOW'], max_concurrent=app.config['LOGIN_MAX_CONCURRENT'])
+
+def current_principal():
+    """Return {'user_id', 'role'} for the request's bearer token, or None if missing, invalid or banned."""
+    if 'principal' in g:
+        return g.principal
+    principal = None
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        token = header[7:].strip()
+        principal = principal_cache.get(token)
+        if principal is None:
+            user_id = token_signer.verify(token)
+            row = user_id is not None and db.session.execute(
+                select(User.role, User.is_banned).where(User.id == user_id)
+            ).first()
+            if row and not row.is_banned:
+                principal = {'user_id': user_id, 'role': row.role}
+                principal_cache.put(token, principal)
+    g.principal = principal
+    return principal
+
+@app.before_request
+def require_admin():
+    if request.method == 'OPTIONS' or not request.path.startswith('/api/admin/'):
+        return None
+    principal = current_principal()
+    if principal is None:
+        return jsonify({'error': 'Authentication required'}), 401
+    if principal['role'] != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    return None
+
 # Create Admin User
 def create_admin_user():
     admin_username = 'admin'
@@ -139,6 +1845,36 @@ def create_admin_user():
         db.session.add(admin)
         db.session.commit()
         print("Admin user created successfully.")
+
+def init_db():
+    # Shard databases get only their own tables, from init_shard()
+    db.create_all(bind_key=None)
+    applied = migrations.upgrade(db.engine)
+    for migration_id in applied:
+        print(f"Applied migration {migration_id}")
+    for shard in shard_map.shards[1:]:
+        for migration_id in init_shard(shard):
+            print(f"Applied migration {migration_id} to shard {shard.name}")
+    seed_table_versions()
+    if db.session.execute(select(StatCounter.key).limit(1)).first() is None:
+        rebuild_stats()
+    if '0006_driver_rating_aggregates' in applied:
+        rebuild_driver_ratings()
+    create_admin_user()
+
+def create_app():
+    """Return the configured app with its database initialised; used by serve.py and WSGI servers."""
+    with app.app_context():
+        init_db()
+        # Don't hand pooled connections opened here to forked worker processes
+        for engine in db.engines.values():
+            engine.dispose()
+    return app
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables, apply pending migrations and ensure the admin user exists."""
+    init_db()
 # Routes
 @app.route('/')
 def landing_page():
@@ -154,23 +1890,30 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'error': 'Email already exists'}), 400
 
-    user = User(
-        name=data['name'],
-        phone=data['phone'],
-        email=data['email'],
-        password=generate_password_hash(data['password'], method='pbkdf2:sha256'),
-        role=data.get('role', 'user')
-    )
-    db.session.add(user)
-    db.session.commit()
-
-    if data.get('role') == 'driver':
-        driver = Driver(
-            user_id=user.id,
-            vehicle_type=data.get('vehicle_type', ''),
-            license_plate=data.get('license_plate', '')
+    # Admins are never self-registered
+    role = data.get('role', 'user')
+    if role not in ('user', 'driver'):
+        return jsonify({'error': 'Role must be user or driver'}), 400
+
+    # A driver's user row and driver row are written in one transaction, even when the driver is in a region shard
+    with joined_transaction():
+        user = User(
+            name=data['name'],
+            phone=data['phone'],
+            email=data['email'],
+            password=generate_password_hash(data['password'], method='pbkdf2:sha256'),
+            role=role
         )
-        db.session.add(driver)
+        db.session.add(user)
+        if role == 'driver':
+            db.session.flush()
+            driver = Driver(
+                user_id=user.id,
+                vehicle_type=data.get('vehicle_type', ''),
+                license_plate=data.get('license_plate', '')
+            )
+            db.session.add(driver)
+        invalidate_on_commit('users')
         db.session.commit()
 
     return jsonify({'message': 'Registration successful!', 'user_id': user.id})
@@ -178,15 +1921,42 @@ def register():
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
-    user = User.query.filter_by(email=data['email']).first()
-
-    if user and check_password_hash(user.password, data['password']):
-        return jsonify({
-            'message': 'Login successful!',
-            'user_id': user.id,
-            'role': user.role
-        })
-    return jsonify({'error': 'Invalid credentials'}), 401
+    email = data.get('email')
+    password = data.get('password')
+    if not isinstance(email, str) or not isinstance(password, str) or not email or not password:
+        return jsonify({'error': 'Email and password are required'}), 400
+
+    # The account's limit is per client address, so failed guesses from elsewhere can't lock its owner out
+    retry_after = login_limiter.acquire({
+        f'ip:{request.remote_addr}': app.config['LOGIN_MAX_ATTEMPTS_PER_IP'],
+        f'email:{email.strip().lower()}|ip:{request.remote_addr}': app.config['LOGIN_MAX_ATTEMPTS'],
+    })
+    if retry_after:
+        response = jsonify({'error': 'Too many login attempts, try again later'})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    try:
+        user = db.session.execute(
+            select(User.id, User.password, User.role, User.is_banned).where(User.email == email)
+        ).first()
+        valid = bool(user) and check_password_hash(user.password, password)
+    finally:
+        login_limiter.release()
+
+    if not valid:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    if user.is_banned:
+        return jsonify({'error': 'This account has been banned'}), 403
+
+    token = token_signer.issue(user.id)
+    principal_cache.put(token, {'user_id': user.id, 'role': user.role})
+    return jsonify({
+        'message': 'Login successful!',
+        'user_id': user.id,
+        'role': user.role,
+        'token': token,
+        'expires_in': token_signer.max_age
+    })
 
 # User Dashboard
 @app.route('/api/user/search-drivers', methods=['POST'])
@@ -198,20 +1968,45 @@ def search_drivers():
     if not pickup_location or not dropoff_location:
         return jsonify({'error': 'Pickup and dropoff locations are required'}), 400
 
-    # Simulate distance calculation (in km)
-    distance = 10.5  # Replace with actual distance calculation logic
-    price_per_km = 5.0  # Price per km
-    price = distance * price_per_km
-
-    drivers = Driver.query.filter_by(is_available=True).all()
-    drivers_data = [{
-        'driver_id': driver.id,
-        'name': driver.user.name,
-        'vehicle_type': driver.vehicle_type,
-        'ratings': driver.ratings,
-        'completed_orders': driver.completed_orders,
-        'price': price
-    } for driver in drivers]
+    pickup_point = parse_location(data.get('pickup_coords')) or parse_location(pickup_location)
+    dropoff_point = parse_location(data.get('dropoff_coords')) or parse_location(dropoff_location)
+    if not pickup_point or not dropoff_point:
+        return jsonify({'error': 'Pickup and dropoff coordinates are required'}), 400
+
+    # Only the k nearest available drivers within the radius are returned
+    try:
+        limit = min(max(int(data.get('limit', 10)), 1), 100)
+        radius_km = float(data.get('radius_km', 20.0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid limit or radius_km'}), 400
+    if not 0 < radius_km < float('inf'):  # also rejects NaN
+        return jsonify({'error': 'Invalid limit or radius_km'}), 400
+    radius_km = min(radius_km, 200.0)
+    key = 'search_drivers|%.5f,%.5f|%.5f,%.5f|%d|%g' % (*pickup_point, *dropoff_point, limit, radius_km)
+    return cached_response(
+        key, ('drivers',),
+        lambda: driver_search_results(pickup_point, dropoff_point, limit, radius_km),
+        ttl=app.config['SEARCH_CACHE_TTL']
+    )
+
+def driver_search_results(pickup_point, dropoff_point, limit, radius_km):
+    quote = pricing_engine.quote(pickup_point, dropoff_point)
+    distance = quote['distance']
+    price = quote['price']
+
+    nearest = get_driver_index().nearest(pickup_point[0], pickup_point[1], k=limit, radius_km=radius_km)
+    distances = {driver_id: km for km, driver_id in nearest}
+    drivers_data = fetch_rows(
+        select(Driver.id.label('driver_id'), User.name, Driver.vehicle_type, Driver.ratings, Driver.completed_orders)
+        .join(User, Driver.user_id == User.id)
+        .where(Driver.id.in_(distances), Driver.is_available == True),
+        # Drivers near a region's edge may belong to the next one
+        shards=shard_map.group_ids(distances)
+    )
+    for driver_data in drivers_data:
+        driver_data['distance_to_pickup'] = round(distances[driver_data['driver_id']], 2)
+        driver_data['price'] = price
+    drivers_data.sort(key=lambda driver_data: driver_data['distance_to_pickup'])
 
     return jsonify({
         'distance': distance,
@@ -226,13 +2021,21 @@ def book_driver():
     driver_id = data.get('driver_id')
     pickup_location = data.get('pickup_location')
     dropoff_location = data.get('dropoff_location')
-    distance = data.get('distance')
-    price = data.get('price')
     promo_code = data.get('promo_code', None)
 
-    if not user_id or not driver_id or not pickup_location or not dropoff_location or not distance or not price:
+    if not user_id or not driver_id or not pickup_location or not dropoff_location:
         return jsonify({'error': 'Missing required fields'}), 400
 
+    # Distance and price are always computed server-side, never taken from the client
+    pickup_point = parse_location(data.get('pickup_coords')) or parse_location(pickup_location)
+    dropoff_point = parse_location(data.get('dropoff_coords')) or parse_location(dropoff_location)
+    if not pickup_point or not dropoff_point:
+        return jsonify({'error': 'Pickup and dropoff coordinates are required'}), 400
+
+    quote = pricing_engine.quote(pickup_point, dropoff_point)
+    distance = quote['distance']
+    price = quote['price']
+
     # Apply promo code discount if valid
     if promo_code:
         promo = PromoCode.query.filter_by(code=promo_code, is_active=True).first()
@@ -249,68 +2052,169 @@ def book_driver():
         promo_code=promo_code
     )
     db.session.add(booking)
+    notify(f'New booking request from User {user_id}.', driver_id=driver_id)
+    invalidate_on_commit('orders:available')
     db.session.commit()
 
-    # Notify driver
-    notification = Notification(
-        driver_id=driver_id,
-        message=f'New booking request from User {user_id}.'
+    return jsonify({'message': 'Driver booked successfully!', 'booking_id': booking.id})
+
+@app.route('/api/user/request-driver', methods=['POST'])
+def request_driver():
+    data = request.get_json()
+    user_id = data.get('user_id')
+    pickup_location = data.get('pickup_location')
+    dropoff_location = data.get('dropoff_location')
+
+    if not user_id or not pickup_location or not dropoff_location:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    pickup_point = parse_location(data.get('pickup_coords')) or parse_location(pickup_location)
+    dropoff_point = parse_location(data.get('dropoff_coords')) or parse_location(dropoff_location)
+    if not pickup_point or not dropoff_point:
+        return jsonify({'error': 'Pickup and dropoff coordinates are required'}), 400
+
+    # The dispatcher picks the driver in its next window and creates the booking
+    dispatch_request = DispatchRequest(
+        user_id=user_id,
+        pickup_location=pickup_location,
+        dropoff_location=dropoff_location,
+        pickup_lat=pickup_point[0],
+        pickup_lng=pickup_point[1],
+        dropoff_lat=dropoff_point[0],
+        dropoff_lng=dropoff_point[1],
+        vehicle_type=data.get('vehicle_type') or None
     )
-    db.session.add(notification)
+    db.session.add(dispatch_request)
     db.session.commit()
 
-    return jsonify({'message': 'Driver booked successfully!', 'booking_id': booking.id})
+    return jsonify({'message': 'Looking for a driver', 'request_id': dispatch_request.id, 'status': 'queued'}), 202
+
+@app.route('/api/user/dispatch/<int:request_id>', methods=['GET'])
+def dispatch_status(request_id):
+    dispatch_request = DispatchRequest.query.get_or_404(request_id)
+    return jsonify({
+        'request_id': dispatch_request.id,
+        'status': 'queued' if dispatch_request.status == 'matching' else dispatch_request.status,
+        'driver_id': dispatch_request.driver_id,
+        'booking_id': dispatch_request.booking_id,
+        'created_at': dispatch_request.created_at,
+        'assigned_at': dispatch_request.assigned_at
+    })
+
+@app.route('/api/user/batch-quote', methods=['POST'])
+def batch_quote():
+    data = request.get_json()
+    destination = parse_location(data.get('destination'))
+    origins = [parse_location(origin) for origin in data.get('origins', [])]
+
+    if not destination or not origins or None in origins:
+        return jsonify({'error': 'Destination and a list of valid origins are required'}), 400
+    if len(origins) > 10000:
+        return jsonify({'error': 'At most 10000 origins per request'}), 400
+
+    return jsonify({'quotes': pricing_engine.batch_quote(origins, destination)})
 
 # Driver Dashboard
 @app.route('/api/driver/available-orders', methods=['GET'])
+@conditional_view('booking')
+@cached_view(('orders:available',))
 def available_orders():
-    orders = Booking.query.filter_by(status='pending').all()
-    orders_data = [{
-        'booking_id': order.id,
-        'user_id': order.user_id,
-        'pickup_location': order.pickup_location,
-        'dropoff_location': order.dropoff_location,
-        'distance': order.distance,
-        'price': order.price
-    } for order in orders]
+    stmt = select(*AVAILABLE_ORDER_COLUMNS).where(Booking.status == 'pending')
+    # Dispatched bookings already name their driver, so drivers can ask for just their own
+    driver_id = request.args.get('driver_id', type=int)
+    if driver_id is not None:
+        stmt = stmt.where(Booking.driver_id == driver_id)
+    orders_data = fetch_rows(stmt)
     return jsonify({'orders': orders_data})
 
 @app.route('/api/driver/accept-order/<int:booking_id>', methods=['POST'])
 def accept_order(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
-    booking.status = 'accepted'
-    db.session.commit()
-
-    # Notify user
-    notification = Notification(
-        user_id=booking.user_id,
-        message=f'Driver {booking.driver_id} has accepted your booking.'
-    )
-    db.session.add(notification)
+    try:
+        driver_id = body_driver_id()
+    except ValueError:
+        return jsonify({'error': 'Driver ID must be an integer'}), 400
+    booking = transition_booking(booking_id, 'accept', driver_id)
+    if booking is None:
+        return booking_conflict(booking_id, 'accept', driver_id)
+    notify(f'Driver {booking.driver_id} has accepted your booking.', user_id=booking.user_id)
     db.session.commit()
 
     return jsonify({'message': 'Order accepted!', 'booking_id': booking.id})
 
 # Admin Dashboard
 @app.route('/api/admin/manage-users', methods=['GET'])
+@conditional_view('user')
+@cached_view(('users',))
 def manage_users():
-    users = User.query.all()
-    users_data = [{
-        'user_id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role,
-        'is_banned': user.is_banned
-    } for user in users]
-    return jsonify({'users': users_data})
+    return paginated_response('users', select(*USER_LIST_COLUMNS), User.created_at, User.id)
 
 @app.route('/api/admin/ban-user/<int:user_id>', methods=['POST'])
 def ban_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_banned = True
+    invalidate_on_commit('users')
     db.session.commit()
+    principal_cache.invalidate_user(user.id)
     return jsonify({'message': f'User {user.name} has been banned.'})
 
+@app.route('/api/admin/stats', methods=['GET'])
+@conditional_view('stat_counter', 'driver')
+def admin_stats():
+    try:
+        days = min(max(int(request.args.get('days', 30)), 1), 366)
+        top = min(max(int(request.args.get('top_drivers', 10)), 0), 100)
+    except ValueError:
+        return jsonify({'error': 'days and top_drivers must be integers'}), 400
+
+    by_role = {key.rsplit(':', 1)[1]: count for key, count, _ in stat_rows('users:role:')}
+    banned = sum(row.count for row in read_shards(select(StatCounter.count).where(StatCounter.key == 'users:banned')))
+    bookings = {key.rsplit(':', 1)[1]: {'count': count, 'value': round(total, 2)}
+                for key, count, total in stat_rows('bookings:status:')}
+    tickets = {key.rsplit(':', 1)[1]: count for key, count, _ in stat_rows('tickets:status:')}
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    revenue = [{'day': key.split(':', 1)[1], 'bookings': count, 'revenue': round(total, 2)}
+               for key, count, total in stat_rows('revenue:', since)]
+    top_drivers = sorted(fetch_rows(
+        select(Driver.id.label('driver_id'), User.name, Driver.completed_orders, Driver.earnings)
+        .join(User, Driver.user_id == User.id)
+        .order_by(Driver.earnings.desc(), Driver.id.desc()).limit(top)
+    ), key=lambda row: (row['earnings'] or 0.0, row['driver_id']), reverse=True)[:top] if top else []
+    completed = bookings.get('completed', {'count': 0, 'value': 0.0})
+
+    return jsonify({
+        'users': {
+            'total': sum(by_role.values()), 'by_role': by_role, 'banned': banned,
+            'drivers': by_role.get('driver', 0),
+        },
+        'bookings': {'total': sum(entry['count'] for entry in bookings.values()), 'by_status': bookings},
+        'escrow': {'count': completed['count'], 'total': completed['value']},
+        'revenue_by_day': revenue,
+        'support_tickets': {'open': tickets.get('open', 0), 'by_status': tickets},
+        'top_drivers': top_drivers,
+    })
+
+@app.route('/api/admin/stats/drivers', methods=['GET'])
+@conditional_view('stat_counter', 'driver', 'user')
+def admin_driver_stats():
+    orders = StatCounter.__table__.alias('driver_orders')
+    return paginated_response(
+        'drivers',
+        select(Driver.id, Driver.user_id, User.name, User.email, User.is_banned, Driver.is_available,
+               Driver.ratings, Driver.completed_orders, Driver.earnings,
+               func.coalesce(orders.c.count, 0).label('orders'))
+        .join(User, Driver.user_id == User.id)
+        .outerjoin(orders, orders.c.key == literal('driver_orders:') + cast(Driver.id, String)),
+        User.created_at, Driver.id
+    )
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'response_cache': response_cache.stats(),
+        'principal_cache': {'hits': principal_cache.hits, 'misses': principal_cache.misses,
+                            'entries': len(principal_cache)},
+    })
+
 # Wallet Management
 @app.route('/api/user/deposit', methods=['POST'])
 def create_deposit():
@@ -364,6 +2268,8 @@ def update_transaction():
     })
 
 @app.route('/api/user/<int:user_id>', methods=['GET'])
+@conditional_view('user')
+@cached_view(lambda user_id: (f'user:{user_id}',))
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
     return jsonify({
@@ -371,56 +2277,43 @@ def get_user(user_id):
         'name': user.name,
         'email': user.email,
         'phone': user.phone,
-        'balance': user.balance,
+        'balance': user.balance_minor / 100,
         'role': user.role
     })
 @app.route('/api/user/payment-history/<int:user_id>', methods=['GET'])
+@conditional_view('user', 'transaction', 'transaction_archive')
 def payment_history(user_id):
     # First check if user exists
     user = User.query.get_or_404(user_id)
     
-    # Get all transactions for this user
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.created_at.desc()).all()
-    
-    payments = [{
-        'id': transaction.id,
-        'transaction_id': transaction.transaction_id,
-        'type': transaction.type,
-        'amount': transaction.amount,
-        'status': transaction.status,
-        'created_at': transaction.created_at
-    } for transaction in transactions]
-    
-    return jsonify({
-        'payments': payments
-    })
+    # Get this user's transactions, a page at a time
+    return paginated_response(
+        'payments', select(*TRANSACTION_COLUMNS).where(Transaction.user_id == user_id),
+        Transaction.created_at, Transaction.id,
+        archive=(select(*TRANSACTION_ARCHIVE_COLUMNS).where(TransactionArchive.user_id == user_id),
+                 TransactionArchive.created_at, TransactionArchive.id)
+    )
 
 # Order History
 @app.route('/api/user/order-history/<int:user_id>', methods=['GET'])
+@conditional_view('booking', 'booking_archive')
 def user_order_history(user_id):
-    orders = Booking.query.filter_by(user_id=user_id).all()
-    orders_data = [{
-        'booking_id': order.id,
-        'driver_id': order.driver_id,
-        'pickup_location': order.pickup_location,
-        'dropoff_location': order.dropoff_location,
-        'status': order.status,
-        'created_at': order.created_at
-    } for order in orders]
-    return jsonify({'orders': orders_data})
+    return paginated_response(
+        'orders', select(*BOOKING_FOR_USER_COLUMNS).where(Booking.user_id == user_id),
+        Booking.created_at, Booking.id,
+        archive=(select(*BOOKING_ARCHIVE_FOR_USER_COLUMNS).where(BookingArchive.user_id == user_id),
+                 BookingArchive.created_at, BookingArchive.id)
+    )
 
 @app.route('/api/driver/order-history/<int:driver_id>', methods=['GET'])
+@conditional_view('booking', 'booking_archive')
 def driver_order_history(driver_id):
-    orders = Booking.query.filter_by(driver_id=driver_id).all()
-    orders_data = [{
-        'booking_id': order.id,
-        'user_id': order.user_id,
-        'pickup_location': order.pickup_location,
-        'dropoff_location': order.dropoff_location,
-        'status': order.status,
-        'created_at': order.created_at
-    } for order in orders]
-    return jsonify({'orders': orders_data})
+    return paginated_response(
+        'orders', select(*BOOKING_FOR_DRIVER_COLUMNS).where(Booking.driver_id == driver_id),
+        Booking.created_at, Booking.id,
+        archive=(select(*BOOKING_ARCHIVE_FOR_DRIVER_COLUMNS).where(BookingArchive.driver_id == driver_id),
+                 BookingArchive.created_at, BookingArchive.id)
+    )
 
 # Ratings and Reviews
 @app.route('/api/user/submit-review', methods=['POST'])
@@ -434,23 +2327,51 @@ def submit_review():
     if not user_id or not driver_id or not rating:
         return jsonify({'error': 'User ID, driver ID, and rating are required'}), 400
 
-    review = Review(
-        user_id=user_id,
-        driver_id=driver_id,
-        rating=rating,
-        comment=comment
-    )
-    db.session.add(review)
-    db.session.commit()
+    if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+        return jsonify({'error': 'Rating must be a whole number from 1 to 5'}), 400
 
-    # Update driver's average rating
-    driver = Driver.query.get_or_404(driver_id)
-    driver.ratings = (driver.ratings * driver.completed_orders + rating) / (driver.completed_orders + 1)
-    driver.completed_orders += 1
-    db.session.commit()
+    # The review and the driver's aggregates are written in one transaction, even when the driver is in a region shard
+    with joined_transaction():
+        review = Review(
+            user_id=user_id,
+            driver_id=driver_id,
+            rating=rating,
+            comment=comment
+        )
+        db.session.add(review)
+        db.session.flush()
+        if not record_review(driver_id, rating):
+            db.session.rollback()
+            return jsonify({'error': 'Driver not found'}), 404
+        invalidate_on_commit('drivers')
+        db.session.commit()
 
     return jsonify({'message': 'Review submitted successfully!'})
 
+@app.route('/api/driver/<int:driver_id>/reviews', methods=['GET'])
+@conditional_view('review')
+def driver_reviews(driver_id):
+    return paginated_response(
+        'reviews', select(*REVIEW_COLUMNS).where(Review.driver_id == driver_id),
+        Review.created_at, Review.id
+    )
+
+@app.route('/api/driver/<int:driver_id>/rating', methods=['GET'])
+@conditional_view('driver')
+def driver_rating(driver_id):
+    row = db.session.execute(
+        select(Driver.review_count, Driver.ratings, Driver.recent_rating, Driver.rating_score).where(Driver.id == driver_id)
+    ).first()
+    if row is None:
+        return jsonify({'error': 'Driver not found'}), 404
+    return jsonify({
+        'driver_id': driver_id,
+        'review_count': row.review_count,
+        'average': round(row.ratings or 0.0, 3),
+        'recent_average': round(row.recent_rating, 3),
+        'bayesian_average': round(row.rating_score, 3)
+    })
+
 # Support Tickets
 @app.route('/api/user/submit-support-ticket', methods=['POST'])
 def submit_support_ticket():
@@ -468,17 +2389,12 @@ def submit_support_ticket():
         message=message
     )
     db.session.add(ticket)
-    db.session.commit()
 
     # Notify admin
     admin = User.query.filter_by(role='admin').first()
     if admin:
-        notification = Notification(
-            user_id=admin.id,
-            message=f'New support ticket from User {user_id}.'
-        )
-        db.session.add(notification)
-        db.session.commit()
+        notify(f'New support ticket from User {user_id}.', user_id=admin.id)
+    db.session.commit()
 
     return jsonify({'message': 'Support ticket submitted successfully!'})
 
@@ -493,61 +2409,29 @@ def reply_support_ticket(ticket_id):
     ticket = SupportTicket.query.get_or_404(ticket_id)
     ticket.admin_reply = admin_reply
     ticket.status = 'resolved'
-    db.session.commit()
-
-    # Notify user
-    notification = Notification(
-        user_id=ticket.user_id,
-        message=f'Admin has replied to your support ticket: {admin_reply}.'
-    )
-    db.session.add(notification)
+    notify(f'Admin has replied to your support ticket: {admin_reply}.', user_id=ticket.user_id)
     db.session.commit()
 
     return jsonify({'message': 'Support ticket resolved successfully!'})
 
 @app.route('/api/user/transaction-status/<transaction_id>', methods=['GET'])
 def check_transaction_status(transaction_id):
-    transaction = Transaction.query.filter_by(transaction_id=transaction_id).first()
+    transaction = db.session.execute(
+        select(Transaction.status, Transaction.intasend_id).where(Transaction.transaction_id == transaction_id)
+    ).first()
+    if not transaction:
+        # Settled transactions may have been archived; their status is final
+        transaction = db.session.execute(
+            select(TransactionArchive.status, TransactionArchive.intasend_id)
+            .where(TransactionArchive.transaction_id == transaction_id)
+        ).first()
     if not transaction:
         return jsonify({'error': 'Transaction not found'}), 404
-    
-    # If the transaction already has a final status, return it
-    if transaction.status in ['completed', 'failed']:
-        return jsonify({'status': transaction.status})
-    
-    # If we have an IntaSend ID, check with IntaSend
-    if transaction.intasend_id:
-        try:
-            # Make a request to IntaSend to check the status
-            headers = {
-                'Authorization': f'Bearer {INTASEND_SECRET_KEY}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'{INTASEND_API_BASE}/payment/status/{transaction.intasend_id}/',
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                intasend_status = response.json().get('status')
-                
-                # Map IntaSend status to our status
-                if intasend_status == 'COMPLETE':
-                    transaction.status = 'completed'
-                    
-                    # Update user balance
-                    user = User.query.get(transaction.user_id)
-                    user.balance += transaction.amount
-                    
-                elif intasend_status == 'FAILED':
-                    transaction.status = 'failed'
-                
-                db.session.commit()
-        
-        except Exception as e:
-            print(f"Error checking IntaSend status: {e}")
-    
+
+    # Status comes from the DB; a still-pending payment just nudges the reconciler
+    if transaction.status == 'pending' and transaction.intasend_id:
+        reconciler.wake()
+
     return jsonify({'status': transaction.status})
 
 # Callback URL for IntaSend
@@ -556,99 +2440,193 @@ def intasend_callback(transaction_id):
     data = request.get_json()
     
     # Verify the request is coming from IntaSend (you should implement proper verification)
-    # For now, just log the callback data
-    print(f"IntaSend Callback for {transaction_id}: {data}")
+    # For now, just log the callback; the payload itself may carry customer details
+    app.logger.info('IntaSend callback for %s: status %s', transaction_id, data.get('status'))
     
     # Find the transaction
-    transaction = Transaction.query.filter_by(transaction_id=transaction_id).first()
+    transaction = db.session.execute(
+        select(Transaction.id, Transaction.user_id, Transaction.amount).where(Transaction.transaction_id == transaction_id)
+    ).first()
     if not transaction:
         return jsonify({'error': 'Transaction not found'}), 404
     
-    if data.get('status') == 'COMPLETE':
-        transaction.status = 'completed'
-        
-        # Update user balance
-        user = User.query.get(transaction.user_id)
-        user.balance += transaction.amount
-        
-    elif data.get('status') == 'FAILED':
-        transaction.status = 'failed'
-    
+    status = STATUS_MAP.get(data.get('status'))
+    if status:
+        settle_transaction(transaction.id, transaction_id, transaction.user_id, transaction.amount, status)
     db.session.commit()
     
     return jsonify({'message': 'Callback processed successfully'})
 # GET all support tickets for a specific user
 @app.route('/api/user/support-tickets', methods=['GET'])
+@conditional_view('support_ticket')
 def get_user_support_tickets():
     user_id = request.args.get('user_id')
     
     if not user_id:
         return jsonify({'error': 'User ID is required'}), 400
     
-    tickets = SupportTicket.query.filter_by(user_id=user_id).order_by(SupportTicket.created_at.desc()).all()
-    tickets_data = [{
-        'id': ticket.id,
-        'user_id': ticket.user_id,
-        'subject': ticket.subject,
-        'message': ticket.message,
-        'status': ticket.status,
-        'created_at': ticket.created_at,
-        'admin_reply': ticket.admin_reply
-    } for ticket in tickets]
+    tickets_data = fetch_rows(
+        select(*TICKET_COLUMNS).where(SupportTicket.user_id == user_id).order_by(SupportTicket.created_at.desc())
+    )
     
     return jsonify({'tickets': tickets_data})
 
 # GET all support tickets (admin only)
+def fill_missing_user(ticket_data):
+    if ticket_data['user_name'] is None:
+        ticket_data['user_name'] = f"User {ticket_data['user_id']}"
+        ticket_data['user_email'] = "Unknown"
+
 @app.route('/api/admin/support-tickets', methods=['GET'])
+@conditional_view('support_ticket', 'user')
 def get_all_support_tickets():
-    tickets = SupportTicket.query.order_by(SupportTicket.created_at.desc()).all()
-    
-    tickets_data = []
-    for ticket in tickets:
-        user = User.query.get(ticket.user_id)
-        ticket_data = {
-            'id': ticket.id,
-            'user_id': ticket.user_id,
-            'user_name': user.name if user else f"User {ticket.user_id}",
-            'user_email': user.email if user else "Unknown",
-            'subject': ticket.subject,
-            'message': ticket.message,
-            'status': ticket.status,
-            'created_at': ticket.created_at,
-            'admin_reply': ticket.admin_reply
-        }
-        tickets_data.append(ticket_data)
-    
-    return jsonify({'tickets': tickets_data})
+    # One query with the ticket owner joined in, instead of a user lookup per ticket
+    return paginated_response(
+        'tickets',
+        select(*TICKET_COLUMNS, User.name.label('user_name'), User.email.label('user_email'))
+        .outerjoin(User, SupportTicket.user_id == User.id),
+        SupportTicket.created_at, SupportTicket.id, row_hook=fill_missing_user
+    )
 
 # Alternative endpoint to get all tickets directly from the database (fallback)
 @app.route('/api/admin/all-support-tickets', methods=['GET'])
+@conditional_view('support_ticket')
 def get_all_tickets_direct():
-    tickets = SupportTicket.query.order_by(SupportTicket.created_at.desc()).all()
-    tickets_data = [{
-        'id': ticket.id,
-        'user_id': ticket.user_id,
-        'subject': ticket.subject,
-        'message': ticket.message,
-        'status': ticket.status,
-        'created_at': ticket.created_at,
-        'admin_reply': ticket.admin_reply
-    } for ticket in tickets]
-    
-    return jsonify({'tickets': tickets_data})
+    return paginated_response('tickets', select(*TICKET_COLUMNS), SupportTicket.created_at, SupportTicket.id)
+# Admin Search
+# FTS5 indexes from migration 0008, kept current by triggers on the base tables
+SUPPORT_TICKET_FTS = table('support_ticket_fts', column('rowid'), column('rank'))
+USER_FTS = table('user_fts', column('rowid'), column('rank'))
+MAX_SEARCH_OFFSET = 10000
+
+def search_page(fts, model, match, relevance, limit, offset, filters=()):
+    """One page of matching ids (plus rank when sorting by relevance) as a subquery."""
+    matches = literal_column(fts.name).op('MATCH')(match)
+    ids = select(fts.c.rowid.label('id')).where(matches)
+    if filters:
+        ids = ids.join(model, model.id == fts.c.rowid).where(*filters)
+    if relevance:
+        # bm25 has to score every match, so a term found in most rows only ranks the newest candidates
+        floor = db.session.execute(
+            select(fts.c.rowid).where(matches).order_by(fts.c.rowid.desc())
+            .limit(1).offset(app.config['SEARCH_RANK_CANDIDATES'] - 1)
+        ).scalar()
+        if floor is not None:
+            ids = ids.where(fts.c.rowid >= floor)
+        ids = ids.add_columns(fts.c.rank.label('rank')).order_by(fts.c.rank, fts.c.rowid)
+    else:
+        # FTS5 walks its index in rowid order, so newest-first stops after one page
+        ids = ids.order_by(fts.c.rowid.desc())
+    return ids.limit(limit + 1).offset(offset).subquery()
+
+@app.route('/api/admin/search', methods=['GET'])
+@conditional_view('support_ticket', 'user')
+def admin_search():
+    match = fts_query(request.args.get('q'))
+    kind = request.args.get('type', 'all')
+    sort = request.args.get('sort', 'relevance')
+    if not match:
+        return jsonify({'error': 'A search query is required'}), 400
+    if kind not in ('tickets', 'users', 'all') or sort not in ('relevance', 'recent'):
+        return jsonify({'error': 'type must be tickets, users or all and sort relevance or recent'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        offset = min(max(int(request.args.get('offset', 0)), 0), MAX_SEARCH_OFFSET)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or offset'}), 400
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Search needs the SQLite FTS5 index'}), 501
+
+    relevance = sort == 'relevance'
+    results = {}
+    if kind in ('tickets', 'all'):
+        filters = [SupportTicket.status == request.args['status']] if request.args.get('status') else []
+        page = search_page(SUPPORT_TICKET_FTS, SupportTicket, match, relevance, limit, offset, filters)
+        results['tickets'] = fetch_rows(
+            select(*TICKET_COLUMNS, User.name.label('user_name'), User.email.label('user_email'))
+            .join(page, SupportTicket.id == page.c.id)
+            .outerjoin(User, SupportTicket.user_id == User.id)
+            .order_by(*((page.c.rank, page.c.id) if relevance else (page.c.id.desc(),)))
+        )
+        for ticket_data in results['tickets'][:limit]:
+            fill_missing_user(ticket_data)
+    if kind in ('users', 'all'):
+        filters = [User.role == request.args['role']] if request.args.get('role') else []
+        if request.args.get('banned') in ('0', '1', 'true', 'false'):
+            filters.append(User.is_banned == (request.args['banned'] in ('1', 'true')))
+        page = search_page(USER_FTS, User, match, relevance, limit, offset, filters)
+        results['users'] = fetch_rows(
+            select(*USER_LIST_COLUMNS).join(page, User.id == page.c.id)
+            .order_by(*((page.c.rank, page.c.id) if relevance else (page.c.id.desc(),)))
+        )
+
+    more = any(len(rows) > limit for rows in results.values())
+    for key in results:
+        results[key] = results[key][:limit]
+    next_offset = offset + limit if more and offset + limit <= MAX_SEARCH_OFFSET else None
+    return jsonify({**results, 'next_offset': next_offset})
+
 # Escrow Management
 @app.route('/api/admin/escrow', methods=['GET'])
+@conditional_view('booking')
+@cached_view(('escrow',))
 def escrow_management():
     # Fetch all completed orders with pending payments
-    orders = Booking.query.filter_by(status='completed').all()
-    escrow_data = [{
-        'booking_id': order.id,
-        'user_id': order.user_id,
-        'driver_id': order.driver_id,
-        'price': order.price,
-        'created_at': order.created_at
-    } for order in orders]
-    return jsonify({'escrow': escrow_data})
+    return paginated_response(
+        'escrow', select(*ESCROW_COLUMNS).where(Booking.status == 'completed'),
+        Booking.created_at, Booking.id
+    )
+
+# Data Exports
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+def export_rows(dataset):
+    if dataset not in EXPORTS:
+        return jsonify({'error': f"Unknown export '{dataset}'", 'datasets': sorted(EXPORTS)}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be one of: ' + ', '.join(sorted(EXPORT_FORMATS))}), 400
+    try:
+        start = parse_export_time(request.args.get('from'))
+        end = parse_export_time(request.args.get('to'), end=True)
+    except ValueError:
+        return jsonify({'error': "'from' and 'to' must be ISO dates or datetimes"}), 400
+
+    def filtered(model, columns):
+        stmt = select(*columns)
+        if request.args.get('status'):
+            stmt = stmt.where(model.status == request.args['status'])
+        if start:
+            stmt = stmt.where(model.created_at >= start)
+        if end:
+            stmt = stmt.where(model.created_at < end)
+        return stmt, model.created_at, model.id
+
+    model, columns = EXPORTS[dataset]
+    stmt, created_col, id_col = filtered(model, columns)
+    if dataset in EXPORT_ARCHIVES and include_archived():
+        archive_model = EXPORT_ARCHIVES[dataset]
+        stmt, created_col, id_col = merge_tiers(
+            (stmt, created_col, id_col), filtered(archive_model, archive_columns(columns, archive_model))
+        )
+    # yield_per streams from a server-side cursor, so memory stays flat however many rows match
+    stmt = stmt.order_by(created_col, id_col).execution_options(yield_per=EXPORT_BATCH)
+    keys = list(stmt.selected_columns.keys())
+    mimetype, chunks = EXPORT_FORMATS[export_format]
+
+    def generate():
+        # Plain Core rows on the session's connections; ORM result processing would dominate the export
+        if spans_shards(stmt):
+            created_index, id_index = keys.index('created_at'), keys.index('id')
+            rows = merged_shard_rows(stmt, key=lambda row: (row[created_index], row[id_index]))
+        else:
+            rows = db.session.connection(bind_arguments={'clause': stmt}).execute(stmt)
+        yield from chunks(keys, rows)
+
+    return app.response_class(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={dataset}-{datetime.utcnow():%Y%m%d}.{export_format}',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
 
 # Live Tracking
 @app.route('/api/driver/update-location', methods=['POST'])
@@ -660,56 +2638,229 @@ def update_driver_location():
     if not driver_id or not live_location:
         return jsonify({'error': 'Driver ID and live location are required'}), 400
 
-    driver = Driver.query.get_or_404(driver_id)
-    driver.live_location = live_location
-    db.session.commit()
+    try:
+        driver_id = int(driver_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Driver ID must be an integer'}), 400
+
+    point = parse_location(live_location)
+    if point is None:
+        return jsonify({'error': 'Live location must be a valid "lat,lng" pair'}), 400
+    live_location = f'{point[0]},{point[1]}'
+
+    is_available = driver_availability(driver_id)
+    if is_available is None:
+        return jsonify({'error': 'Driver not found'}), 404
+
+    # Fan out to live trackers now; the DB write is coalesced by the location hub
+    location_hub.publish(driver_id, live_location)
+    sync_driver_index(driver_id, is_available, live_location)
 
     return jsonify({'message': 'Driver location updated successfully!'})
 
+# Bulk ingestion for buffered tracks or gateways relaying many drivers at once
+MAX_LOCATION_POINTS = 5000
+
+@app.route('/api/driver/update-locations', methods=['POST'])
+def update_driver_locations():
+    data = request.get_json()
+    points = data.get('points') if data else None
+
+    if not isinstance(points, list) or not points:
+        return jsonify({'error': 'A non-empty list of points is required'}), 400
+    if len(points) > MAX_LOCATION_POINTS:
+        return jsonify({'error': f'At most {MAX_LOCATION_POINTS} points per request'}), 400
+
+    now = time.time()
+    max_timestamp = now + app.config['LOCATION_MAX_CLOCK_SKEW']
+    accepted = []
+    newest = {}
+    rejected = 0
+    for point in points:
+        try:
+            driver_id = int(point['driver_id'])
+            lat, lng = float(point['lat']), float(point['lng'])
+            timestamp = float(point['timestamp']) if point.get('timestamp') is not None else now
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+            continue
+        # A timestamp in the future (or in milliseconds) would outrank every later point from the driver
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0 and 0 < timestamp <= max_timestamp):
+            rejected += 1
+            continue
+        # Points older than the driver's current position are dropped by the hub and its history
+        last = newest.get(driver_id)
+        if last is None:
+            current = location_hub.latest(driver_id)
+            last = current['timestamp'] if current else 0.0
+        if timestamp < last or driver_availability(driver_id) is None:
+            rejected += 1
+            continue
+        newest[driver_id] = timestamp
+        accepted.append((driver_id, f'{lat},{lng}', timestamp))
+
+    for location_update in location_hub.publish_many(accepted):
+        driver_id = location_update['driver_id']
+        sync_driver_index(driver_id, driver_availability(driver_id), location_update['live_location'])
+
+    return jsonify({'accepted': len(accepted), 'rejected': rejected})
+
+@app.route('/api/driver/location-history/<int:driver_id>', methods=['GET'])
+def driver_location_history(driver_id):
+    try:
+        since = float(request.args['since']) if 'since' in request.args else None
+        limit = min(int(request.args.get('limit', 1000)), 10000)
+    except ValueError:
+        return jsonify({'error': 'Invalid since or limit'}), 400
+
+    points = location_hub.history.points(driver_id, since=since, limit=limit)
+    return jsonify({
+        'driver_id': driver_id,
+        'points': [{'timestamp': ts, 'lat': lat, 'lng': lng} for ts, lat, lng in points]
+    })
+
 @app.route('/api/user/track-driver/<int:booking_id>', methods=['GET'])
 def track_driver(booking_id):
     booking = Booking.query.get_or_404(booking_id)
-    driver = Driver.query.get_or_404(booking.driver_id)
+    live_location = current_location(booking.driver_id)
+    if live_location is None:
+        driver = Driver.query.get_or_404(booking.driver_id)
+        live_location = driver.live_location
 
-    if not driver.live_location:
+    if not live_location:
         return jsonify({'error': 'Driver location not available'}), 404
 
     return jsonify({
         'booking_id': booking.id,
-        'driver_id': driver.id,
-        'live_location': driver.live_location
+        'driver_id': booking.driver_id,
+        'live_location': live_location
+    })
+
+@app.route('/api/user/track-driver/<int:booking_id>/stream', methods=['GET'])
+def track_driver_stream(booking_id):
+    booking = Booking.query.get_or_404(booking_id)
+    driver_id = booking.driver_id
+    subscriber = location_hub.subscribe(driver_id)
+    initial = location_hub.latest(driver_id)
+    if initial is None:
+        stored = db.session.execute(select(Driver.live_location).where(Driver.id == driver_id)).scalar()
+        if stored:
+            initial = {'driver_id': driver_id, 'live_location': stored, 'timestamp': None}
+    # The stream can stay open for the whole trip, so don't hold on to a DB connection
+    db.session.remove()
+
+    def generate():
+        try:
+            if initial:
+                yield sse_event(dict(initial, booking_id=booking_id))
+            while True:
+                try:
+                    location = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield sse_event(dict(location, booking_id=booking_id))
+        finally:
+            location_hub.unsubscribe(driver_id, subscriber)
+
+    return app.response_class(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/driver/<int:driver_id>/assignments/stream', methods=['GET'])
+def driver_assignments_stream(driver_id):
+    Driver.query.get_or_404(driver_id)
+    subscriber = assignment_feed.subscribe(driver_id)
+    db.session.remove()
+
+    def generate():
+        try:
+            while True:
+                try:
+                    assignment = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield sse_event(assignment)
+        finally:
+            assignment_feed.unsubscribe(driver_id, subscriber)
+
+    return app.response_class(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 # Notifications
 @app.route('/api/user/notifications/<int:user_id>', methods=['GET'])
+@conditional_view('notification')
 def user_notifications(user_id):
-    notifications = Notification.query.filter_by(user_id=user_id).all()
-    notifications_data = [{
-        'id': notification.id,
-        'message': notification.message,
-        'is_read': notification.is_read,
-        'created_at': notification.created_at
-    } for notification in notifications]
-    return jsonify({'notifications': notifications_data})
+    return paginated_response(
+        'notifications', select(*NOTIFICATION_COLUMNS).where(Notification.user_id == user_id),
+        Notification.created_at, Notification.id
+    )
 
 @app.route('/api/driver/notifications/<int:driver_id>', methods=['GET'])
+@conditional_view('notification')
 def driver_notifications(driver_id):
-    notifications = Notification.query.filter_by(driver_id=driver_id).all()
-    notifications_data = [{
-        'id': notification.id,
-        'message': notification.message,
-        'is_read': notification.is_read,
-        'created_at': notification.created_at
-    } for notification in notifications]
-    return jsonify({'notifications': notifications_data})
+    return paginated_response(
+        'notifications', select(*NOTIFICATION_COLUMNS).where(Notification.driver_id == driver_id),
+        Notification.created_at, Notification.id
+    )
+
+@app.route('/api/user/notifications/<int:user_id>/unread-count', methods=['GET'])
+@conditional_view('notification_counter')
+def user_unread_count(user_id):
+    return unread_count_response(notification_recipient(user_id=user_id))
+
+@app.route('/api/driver/notifications/<int:driver_id>/unread-count', methods=['GET'])
+@conditional_view('notification_counter')
+def driver_unread_count(driver_id):
+    return unread_count_response(notification_recipient(driver_id=driver_id))
+
+def unread_count_response(recipient):
+    # A user's notifications come from every region they have booked in
+    rows = read_shards(select(NotificationCounter.unread).where(NotificationCounter.recipient == recipient))
+    return jsonify({'unread': sum(row.unread for row in rows)})
 
 @app.route('/api/notifications/mark-read/<int:notification_id>', methods=['POST'])
 def mark_notification_read(notification_id):
-    notification = Notification.query.get_or_404(notification_id)
-    notification.is_read = True
+    notification = db.session.execute(
+        select(Notification.user_id, Notification.driver_id).where(Notification.id == notification_id)
+    ).first()
+    if not notification:
+        return jsonify({'error': 'Notification not found'}), 404
+
+    # Only the request that flips is_read decrements the counter
+    result = db.session.execute(
+        update(Notification).where(Notification.id == notification_id, Notification.is_read == False)
+        .values(is_read=True)
+    )
+    if result.rowcount:
+        adjust_unread({notification_recipient(notification.user_id, notification.driver_id): -1})
     db.session.commit()
     return jsonify({'message': 'Notification marked as read!'})
 
+@app.route('/api/notifications/mark-all-read', methods=['POST'])
+def mark_all_notifications_read():
+    data = request.get_json() or {}
+    user_id = data.get('user_id')
+    driver_id = data.get('driver_id')
+    if (user_id is None) == (driver_id is None):
+        return jsonify({'error': 'Exactly one of user_id or driver_id is required'}), 400
+
+    column, recipient_id = (Notification.user_id, user_id) if user_id is not None else (Notification.driver_id, driver_id)
+
+    def mark(shard):
+        marked = db.session.execute(
+            update(Notification).where(column == recipient_id, Notification.is_read == False).values(is_read=True)
+        ).rowcount
+        adjust_unread({notification_recipient(user_id, driver_id): -marked})
+        db.session.commit()
+        return marked
+    marked = sum(on_shards(mark, request_shards()))
+    return jsonify({'message': 'All notifications marked as read!', 'marked': marked})
+
 # Promo Codes and Discounts
 @app.route('/api/admin/create-promo-code', methods=['POST'])
 def create_promo_code():
@@ -752,6 +2903,7 @@ def apply_promo_code():
     booking = Booking.query.get_or_404(booking_id)
     booking.price = booking.price * (1 - promo.discount / 100)
     booking.promo_code = promo_code
+    invalidate_on_commit('orders:available', 'escrow')
     db.session.commit()
 
     return jsonify({'message': 'Promo code applied successfully!', 'new_price': booking.price})
@@ -759,38 +2911,26 @@ def apply_promo_code():
 # Order Cancellation
 @app.route('/api/user/cancel-order/<int:booking_id>', methods=['POST'])
 def user_cancel_order(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
-    if booking.status != 'pending':
-        return jsonify({'error': 'Only pending orders can be cancelled'}), 400
+    booking = transition_booking(booking_id, 'user_cancel')
+    if booking is None:
+        return booking_conflict(booking_id, 'user_cancel')
 
-    booking.status = 'cancelled'
-    db.session.commit()
-
-    # Notify driver
-    notification = Notification(
-        driver_id=booking.driver_id,
-        message=f'User {booking.user_id} has cancelled booking {booking.id}.'
-    )
-    db.session.add(notification)
+    notify(f'User {booking.user_id} has cancelled booking {booking.id}.', driver_id=booking.driver_id)
     db.session.commit()
 
     return jsonify({'message': 'Order cancelled successfully!'})
 
 @app.route('/api/driver/cancel-order/<int:booking_id>', methods=['POST'])
 def driver_cancel_order(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
-    if booking.status != 'accepted':
-        return jsonify({'error': 'Only accepted orders can be cancelled by drivers'}), 400
-
-    booking.status = 'cancelled'
-    db.session.commit()
-
-    # Notify user
-    notification = Notification(
-        user_id=booking.user_id,
-        message=f'Driver {booking.driver_id} has cancelled booking {booking.id}.'
-    )
-    db.session.add(notification)
+    try:
+        driver_id = body_driver_id()
+    except ValueError:
+        return jsonify({'error': 'Driver ID must be an integer'}), 400
+    booking = transition_booking(booking_id, 'driver_cancel', driver_id)
+    if booking is None:
+        return booking_conflict(booking_id, 'driver_cancel', driver_id)
+
+    notify(f'Driver {booking.driver_id} has cancelled booking {booking.id}.', user_id=booking.user_id)
     db.session.commit()
 
     return jsonify({'message': 'Order cancelled successfully!'})
@@ -807,13 +2947,15 @@ def toggle_availability():
 
     driver = Driver.query.get_or_404(driver_id)
     driver.is_available = is_available
+    invalidate_on_commit('drivers')
     db.session.commit()
+    remember_driver_availability(driver.id, driver.is_available)
+    sync_driver_index(driver.id, driver.is_available, current_location(driver.id, driver.live_location))
 
     return jsonify({'message': 'Availability updated successfully!', 'is_available': driver.is_available})
 
 # Run the App
+# Development server; use serve.py for production
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-        create_admin_user() 
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    create_app()
+    app.run(port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
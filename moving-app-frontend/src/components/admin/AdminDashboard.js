@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { toast } from 'react-toastify';
-import { useAuth } from '../../context/AuthContext';
+import { useAuth, authHeaders } from '../../context/AuthContext';
 
 const AdminDashboard = () => {
   const { user } = useAuth();
@@ -24,23 +24,25 @@ const AdminDashboard = () => {
   const fetchDashboardData = async () => {
     setIsLoading(true);
     try {
-      const usersResponse = await fetch('http://localhost:5000/api/admin/manage-users');
-      const usersData = await usersResponse.json();
-      
-      const totalUsers = usersData.users.filter(user => user.role === 'user').length;
-      const totalDrivers = usersData.users.filter(user => user.role === 'driver').length;
+      // Counts and totals are precomputed server-side; only the five newest escrow rows are fetched
+      const statsResponse = await fetch('http://localhost:5000/api/admin/stats', {
+        headers: authHeaders()
+      });
+      const statsData = await statsResponse.json();
 
-      const ordersResponse = await fetch(`http://localhost:5000/api/admin/escrow`);
+      const ordersResponse = await fetch(`http://localhost:5000/api/admin/escrow?limit=5`, {
+        headers: authHeaders()
+      });
       const ordersData = await ordersResponse.json();
       
       setStats({
-        totalUsers,
-        totalDrivers,
-        totalBookings: 120, // Mocked for demo
-        pendingBookings: 15,
-        completedBookings: 95,
-        totalRevenue: 5825.75,
-        openSupportTickets: 8
+        totalUsers: statsData.users.by_role.user || 0,
+        totalDrivers: statsData.users.by_role.driver || 0,
+        totalBookings: statsData.bookings.total,
+        pendingBookings: statsData.bookings.by_status.pending?.count || 0,
+        completedBookings: statsData.bookings.by_status.completed?.count || 0,
+        totalRevenue: statsData.escrow.total,
+        openSupportTickets: statsData.support_tickets.open
       });
       
       setRecentBookings(ordersData.escrow.slice(0, 5));
@@ -11,7 +11,7 @@ const EscrowManagement = () => {
   useEffect(() => {
     const fetchEscrowData = async () => {
       try {
-        const res = await axios.get('http://localhost:5000/api/admin/escrow');
+        const res = await axios.get('http://localhost:5000/api/admin/escrow?all=1');
         setEscrowOrders(res.data.escrow);
         setLoading(false);
       } catch (error) {
@@ -11,28 +11,12 @@ const ManageDrivers = () => {
   useEffect(() => {
     const fetchDrivers = async () => {
       try {
-        // First get all users
-        const res = await axios.get('http://localhost:5000/api/admin/manage-users');
-        // Filter only driver role users
-        const driverUsers = res.data.users.filter(user => user.role === 'driver');
-        
-        // For each driver user, get additional driver info
-        const driversWithDetails = await Promise.all(
-          driverUsers.map(async (driverUser) => {
-            try {
-              // Assuming there's a driver record for each user with driver role
-              const driverRes = await axios.get(`http://localhost:5000/api/driver/order-history/${driverUser.user_id}`);
-              return {
-                ...driverUser,
-                orders: driverRes.data.orders || [],
-                orderCount: driverRes.data.orders ? driverRes.data.orders.length : 0
-              };
-            } catch (error) {
-              console.error(`Error fetching driver details for ${driverUser.user_id}:`, error);
-              return driverUser;
-            }
-          })
-        );
+        // One request: driver rows with their order counts, aggregated server-side
+        const res = await axios.get('http://localhost:5000/api/admin/stats/drivers?all=1');
+        const driversWithDetails = res.data.drivers.map(driver => ({
+          ...driver,
+          orderCount: driver.orders
+        }));
         
         setDrivers(driversWithDetails);
         setLoading(false);
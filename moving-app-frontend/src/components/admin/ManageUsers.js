@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { toast } from 'react-toastify';
+import { authHeaders } from '../../context/AuthContext';
 
 const ManageUsers = () => {
   const [users, setUsers] = useState([]);
@@ -16,7 +17,9 @@ const ManageUsers = () => {
   const fetchUsers = async () => {
     setIsLoading(true);
     try {
-      const response = await fetch('http://localhost:5000/api/admin/manage-users');
+      const response = await fetch('http://localhost:5000/api/admin/manage-users?all=1', {
+        headers: authHeaders()
+      });
       const data = await response.json();
       
       if (data.users) {
@@ -38,6 +41,7 @@ const ManageUsers = () => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...authHeaders()
         }
       });
       
@@ -8,64 +8,43 @@ const SupportTicketManagement = () => {
   const [loading, setLoading] = useState(true);
   const [selectedTicket, setSelectedTicket] = useState(null);
   const [adminReply, setAdminReply] = useState('');
+  const [query, setQuery] = useState('');
+  const [statusFilter, setStatusFilter] = useState('');
+  const [nextPage, setNextPage] = useState(null);
   const { currentUser } = useAuth();
 
+  // Searching and filtering happen on the server; only one page of tickets is loaded at a time
   useEffect(() => {
-    fetchSupportTickets();
-  }, []);
+    const timer = setTimeout(() => fetchSupportTickets(null), query ? 250 : 0);
+    return () => clearTimeout(timer);
+  }, [query, statusFilter]);
 
-  const fetchSupportTickets = async () => {
+  const fetchSupportTickets = async (page) => {
     try {
-      // Direct call to get all support tickets
-      const response = await axios.get('http://localhost:5000/api/admin/support-tickets');
-      
-      if (response.data && response.data.tickets) {
-        setTickets(response.data.tickets);
+      const params = new URLSearchParams();
+      if (statusFilter) params.set('status', statusFilter);
+      let response;
+      if (query.trim()) {
+        params.set('q', query.trim());
+        params.set('type', 'tickets');
+        if (page) params.set('offset', page);
+        response = await axios.get(`http://localhost:5000/api/admin/search?${params}`);
       } else {
-        // Fallback approach: get all tickets through users
-        await fetchTicketsFromUsers();
+        if (page) params.set('cursor', page);
+        response = await axios.get(`http://localhost:5000/api/admin/support-tickets?${params}`);
       }
+      const pageTickets = response.data.tickets || [];
+      setTickets(page ? [...tickets, ...pageTickets] : pageTickets);
+      setNextPage(response.data.next_offset ?? response.data.next_cursor ?? null);
     } catch (error) {
-      console.error('Failed to load support tickets directly. Trying fallback method.', error);
-      await fetchTicketsFromUsers();
+      console.error('Failed to load support tickets:', error);
+      toast.error('Failed to load support tickets');
+      if (!page) setTickets([]);
     } finally {
       setLoading(false);
     }
   };
 
-  // Fallback method to fetch tickets through users
-  const fetchTicketsFromUsers = async () => {
-    try {
-      // Get all users first
-      const response = await axios.get('http://localhost:5000/api/admin/manage-users');
-      const usersData = response.data.users;
-      
-      // Fetch all support tickets using direct database access
-      const allTicketsResponse = await axios.get('http://localhost:5000/api/admin/all-support-tickets');
-      
-      if (allTicketsResponse.data && allTicketsResponse.data.tickets) {
-        // Map user data to tickets
-        const ticketsWithUserInfo = allTicketsResponse.data.tickets.map(ticket => {
-          const user = usersData.find(u => u.user_id === ticket.user_id) || {};
-          return {
-            ...ticket,
-            user_name: user.name || `User ${ticket.user_id}`,
-            user_email: user.email || 'Unknown Email'
-          };
-        });
-        
-        setTickets(ticketsWithUserInfo);
-      } else {
-        console.error('No tickets found in the response');
-        setTickets([]);
-      }
-    } catch (error) {
-      console.error('Failed to load support tickets through users:', error);
-      toast.error('Failed to load support tickets');
-      setTickets([]);
-    }
-  };
-
   const handleSubmitReply = async (e) => {
     e.preventDefault();
     
@@ -97,7 +76,26 @@ const SupportTicketManagement = () => {
   return (
     <div className="max-w-6xl mx-auto">
       <h2 className="text-2xl font-bold mb-6">Support Ticket Management</h2>
-      
+
+      <div className="flex flex-col md:flex-row gap-4 mb-6">
+        <input
+          type="search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search subject, message, reply, user name or email..."
+          className="flex-1 px-4 py-2 border rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500"
+        />
+        <select
+          value={statusFilter}
+          onChange={(e) => setStatusFilter(e.target.value)}
+          className="px-4 py-2 border rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500"
+        >
+          <option value="">All statuses</option>
+          <option value="open">Open</option>
+          <option value="resolved">Resolved</option>
+        </select>
+      </div>
+
       {loading ? (
         <div className="flex justify-center items-center h-64">
           <p className="text-gray-500">Loading support tickets...</p>
@@ -147,6 +145,16 @@ const SupportTicketManagement = () => {
               ))}
             </tbody>
           </table>
+          {nextPage !== null && (
+            <div className="p-4 text-center">
+              <button
+                onClick={() => fetchSupportTickets(nextPage)}
+                className="px-4 py-2 text-gray-700 bg-gray-200 rounded-lg hover:bg-gray-300"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -36,7 +36,7 @@ const TrackDriver = () => {
     // Simulate initial data loading
     const loadDummyData = () => {
       setTimeout(() => {
-        setTrackingData(dummyTrackingData);
+        setTrackingData((prevData) => prevData || dummyTrackingData);
         setBookingDetails(dummyBookingDetails);
         setLoading(false);
       }, 1500); // Simulate a short loading time
@@ -45,38 +45,67 @@ const TrackDriver = () => {
     loadDummyData();
 
     // Simulate real-time updates by slightly changing the location every few seconds
-    let movingNorth = true;
-    let movingEast = true;
-
-    simulationIntervalRef.current = setInterval(() => {
-      setTrackingData((prevData) => {
-        if (!prevData) return dummyTrackingData;
-
-        const [lat, lng] = prevData.location.split(",").map(Number);
-
-        // Randomly change direction occasionally
-        if (Math.random() < 0.2) movingNorth = !movingNorth;
-        if (Math.random() < 0.2) movingEast = !movingEast;
-
-        // Update location by a small random amount
-        const latDelta = Math.random() * 0.001 * (movingNorth ? 1 : -1);
-        const lngDelta = Math.random() * 0.001 * (movingEast ? 1 : -1);
-
-        return {
-          ...prevData,
-          location: `${(lat + latDelta).toFixed(6)},${(lng + lngDelta).toFixed(
-            6
-          )}`,
-          speed: Math.floor(25 + Math.random() * 20), // Random speed between 25-45 kph
-          last_updated: new Date().toISOString(),
-        };
-      });
-    }, 5000); // Update every 5 seconds
-
-    // Cleanup interval on component unmount
+    const startSimulation = () => {
+      let movingNorth = true;
+      let movingEast = true;
+
+      simulationIntervalRef.current = setInterval(() => {
+        setTrackingData((prevData) => {
+          if (!prevData) return dummyTrackingData;
+
+          const [lat, lng] = prevData.location.split(",").map(Number);
+
+          // Randomly change direction occasionally
+          if (Math.random() < 0.2) movingNorth = !movingNorth;
+          if (Math.random() < 0.2) movingEast = !movingEast;
+
+          // Update location by a small random amount
+          const latDelta = Math.random() * 0.001 * (movingNorth ? 1 : -1);
+          const lngDelta = Math.random() * 0.001 * (movingEast ? 1 : -1);
+
+          return {
+            ...prevData,
+            location: `${(lat + latDelta).toFixed(6)},${(lng + lngDelta).toFixed(
+              6
+            )}`,
+            speed: Math.floor(25 + Math.random() * 20), // Random speed between 25-45 kph
+            last_updated: new Date().toISOString(),
+          };
+        });
+      }, 5000); // Update every 5 seconds
+    };
+
+    // Live positions are pushed by the server; fall back to the simulation if the stream is unavailable
+    let receivedUpdate = false;
+    const eventSource = new EventSource(
+      `http://localhost:5000/api/user/track-driver/${bookingId}/stream`
+    );
+
+    eventSource.onmessage = (event) => {
+      const update = JSON.parse(event.data);
+      receivedUpdate = true;
+      setTrackingData((prevData) => ({
+        ...(prevData || dummyTrackingData),
+        location: update.live_location,
+        last_updated: update.timestamp
+          ? new Date(update.timestamp * 1000).toISOString()
+          : new Date().toISOString(),
+      }));
+    };
+
+    eventSource.onerror = () => {
+      if (!receivedUpdate) {
+        eventSource.close();
+        if (!simulationIntervalRef.current) startSimulation();
+      }
+    };
+
+    // Close the stream and clear the interval on component unmount
     return () => {
+      eventSource.close();
       if (simulationIntervalRef.current) {
         clearInterval(simulationIntervalRef.current);
+        simulationIntervalRef.current = null;
       }
     };
   }, [bookingId]);
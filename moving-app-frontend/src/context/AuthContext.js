@@ -3,6 +3,23 @@ import axios from 'axios';
 
 const AuthContext = createContext();
 
+// Bearer header for the signed token returned by /api/login (needed by /api/admin/* routes)
+export const authHeaders = () => {
+  const userData = localStorage.getItem('user');
+  const token = userData ? JSON.parse(userData).token : null;
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+// Attach the token to every request to our API, including ones fired before the provider mounts
+axios.interceptors.request.use((config) => {
+  const headers = authHeaders();
+  const ownApi = (config.url || '').startsWith('http://localhost:5000/');
+  if (ownApi && headers.Authorization && !config.headers.Authorization) {
+    config.headers.Authorization = headers.Authorization;
+  }
+  return config;
+});
+
 export const AuthProvider = ({ children }) => {
   const [currentUser, setCurrentUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -35,6 +52,7 @@ export const AuthProvider = ({ children }) => {
       const user = {
         id: response.data.user_id,
         role: response.data.role,
+        token: response.data.token,
         email
       };
       
@@ -0,0 +1,198 @@
+import heapq
+import math
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from geo import DriverIndex, EARTH_RADIUS_KM, haversine_km
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch quotes fall back to plain Python
+    np = None
+
+# Highway types a moving truck can use when building the graph from an OSM extract
+DRIVABLE_HIGHWAYS = {
+    'motorway', 'trunk', 'primary', 'secondary', 'tertiary', 'unclassified', 'residential',
+    'motorway_link', 'trunk_link', 'primary_link', 'secondary_link', 'tertiary_link',
+    'living_street', 'service', 'road',
+}
+
+
+class RoadGraph:
+    """Undirected road graph loaded from disk, for offline shortest-path distances.
+
+    Accepts an OSM XML extract (.osm) or a plain edge list where each line is
+    "lat1,lng1,lat2,lng2" (optionally followed by a length in km).
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self._index = DriverIndex(cell_size_deg=0.005)
+
+    @classmethod
+    def load(cls, path):
+        graph = cls()
+        if path.endswith('.osm') or path.endswith('.xml'):
+            graph._load_osm(path)
+        else:
+            graph._load_edge_list(path)
+        for point, node_id in graph.nodes.items():
+            graph._index.update(node_id, point)
+        return graph
+
+    def _load_osm(self, path):
+        coords = {}
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag == 'node':
+                coords[elem.get('id')] = (float(elem.get('lat')), float(elem.get('lon')))
+                elem.clear()
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.findall('tag')}
+                if tags.get('highway') in DRIVABLE_HIGHWAYS:
+                    refs = [nd.get('ref') for nd in elem.findall('nd')]
+                    for a, b in zip(refs, refs[1:]):
+                        if a in coords and b in coords:
+                            self.add_edge(coords[a], coords[b])
+                elem.clear()
+
+    def _load_edge_list(self, path):
+        with open(path) as handle:
+            for line in handle:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = [float(part) for part in line.split(',')]
+                length = parts[4] if len(parts) > 4 else None
+                self.add_edge((parts[0], parts[1]), (parts[2], parts[3]), length)
+
+    def _node(self, point):
+        key = (round(point[0], 6), round(point[1], 6))
+        node_id = self.nodes.get(key)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.nodes[key] = node_id
+        return node_id
+
+    def add_edge(self, a, b, length_km=None):
+        if length_km is None:
+            length_km = haversine_km(a[0], a[1], b[0], b[1])
+        u, v = self._node(a), self._node(b)
+        self.edges.setdefault(u, []).append((v, length_km))
+        self.edges.setdefault(v, []).append((u, length_km))
+
+    def nearest_node(self, lat, lng, max_snap_km=2.0):
+        found = self._index.nearest(lat, lng, k=1, radius_km=max_snap_km)
+        return found[0] if found else None
+
+    def shortest_path_km(self, origin, destination):
+        """Road distance between two points, or None if either end is off the graph."""
+        start = self.nearest_node(*origin)
+        end = self.nearest_node(*destination)
+        if start is None or end is None:
+            return None
+        (snap_start, u), (snap_end, target) = start, end
+        if u == target:
+            return snap_start + snap_end
+
+        best = {u: 0.0}
+        heap = [(0.0, u)]
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if node == target:
+                return dist + snap_start + snap_end
+            if dist > best.get(node, math.inf):
+                continue
+            for neighbour, length in self.edges.get(node, ()):
+                candidate = dist + length
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        return None
+
+
+class PricingEngine:
+    """Server-side distance and fare calculation.
+
+    Single quotes go through an LRU cache keyed on origin/destination rounded to
+    `cell_precision` decimal places (3 places is roughly a 110 m cell), so repeat
+    quotes for the same corridor skip the routing work entirely.
+    """
+
+    def __init__(self, price_per_km=5.0, base_fare=0.0, graph=None, cache_size=10000, cell_precision=3):
+        self.price_per_km = price_per_km
+        self.base_fare = base_fare
+        self.graph = graph
+        self.cache_size = cache_size
+        self.cell_precision = cell_precision
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        graph_path = os.getenv('ROAD_GRAPH_PATH')
+        graph = RoadGraph.load(graph_path) if graph_path and os.path.exists(graph_path) else None
+        return cls(
+            price_per_km=float(os.getenv('PRICE_PER_KM', 5.0)),
+            base_fare=float(os.getenv('BASE_FARE', 0.0)),
+            graph=graph,
+        )
+
+    def _cell(self, point):
+        return (round(point[0], self.cell_precision), round(point[1], self.cell_precision))
+
+    def distance_km(self, origin, destination):
+        key = (self._cell(origin), self._cell(destination))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        distance = None
+        if self.graph is not None:
+            distance = self.graph.shortest_path_km(origin, destination)
+        if distance is None:
+            distance = haversine_km(origin[0], origin[1], destination[0], destination[1])
+
+        with self._lock:
+            self._cache[key] = distance
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return distance
+
+    def price_for(self, distance_km):
+        return round(self.base_fare + distance_km * self.price_per_km, 2)
+
+    def quote(self, origin, destination):
+        distance = round(self.distance_km(origin, destination), 2)
+        return {'distance': distance, 'price': self.price_for(distance)}
+
+    def batch_quote(self, origins, destination):
+        """Price many origins (e.g. driver positions) to one destination in a single pass.
+
+        Uses great-circle distance so the whole batch vectorizes; road routing is
+        reserved for the quotes a user actually books.
+        """
+        if not origins:
+            return []
+        if np is not None:
+            points = np.radians(np.asarray(origins, dtype=float))
+            lat2, lng2 = math.radians(destination[0]), math.radians(destination[1])
+            dlat = lat2 - points[:, 0]
+            dlng = lng2 - points[:, 1]
+            a = np.sin(dlat / 2) ** 2 + np.cos(points[:, 0]) * math.cos(lat2) * np.sin(dlng / 2) ** 2
+            distances = (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))).round(2)
+            prices = (self.base_fare + distances * self.price_per_km).round(2)
+            return [{'distance': float(d), 'price': float(p)} for d, p in zip(distances, prices)]
+
+        quotes = []
+        for lat, lng in origins:
+            distance = round(haversine_km(lat, lng, destination[0], destination[1]), 2)
+            quotes.append({'distance': distance, 'price': self.price_for(distance)})
+        return quotes
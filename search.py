@@ -0,0 +1,24 @@
+import re
+
+# Letters and digits in any script; everything else separates tokens, as in FTS5's unicode61 tokenizer
+TOKEN = re.compile(r'[^\W_]+')
+MAX_TERMS = 16
+
+
+def fts_query(value):
+    """Turn free text typed by an admin into a safe FTS5 MATCH expression, or None if it has no terms.
+
+    Each whitespace-separated word becomes a quoted phrase, so punctuation in
+    emails or FTS5 operators in the input can't break the query, and all of
+    them must match. The last word is matched as a prefix for search-as-you-type.
+    """
+    phrases = []
+    for word in (value or '').split():
+        tokens = TOKEN.findall(word)
+        if tokens:
+            phrases.append('"%s"' % ' '.join(tokens))
+    if not phrases:
+        return None
+    phrases = phrases[:MAX_TERMS]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
@@ -0,0 +1,212 @@
+"""Response encoding: JSON on orjson when it is installed, row serializers and content negotiation.
+
+Wire formats match Flask's default provider: keys are sorted and dates are
+HTTP dates. The only difference is that orjson writes non-ASCII text as UTF-8
+rather than \\u escapes.
+"""
+import functools
+import json
+import uuid
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date as werkzeug_http_date
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; clients asking for it get JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is offered instead
+    brotli = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+RESPONSE_MIMETYPES = (JSON_MIMETYPE, MSGPACK_MIMETYPE, 'application/x-msgpack') if msgpack else (JSON_MIMETYPE,)
+# Already compressed, or must reach the client chunk by chunk
+UNCOMPRESSED_MIMETYPES = {'text/event-stream', 'image/png', 'image/jpeg', 'application/zip', 'application/gzip'}
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    """werkzeug's http_date for the naive UTC datetimes and dates the models store, without going through email.utils."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return werkzeug_http_date(value)
+        return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+            _DAYS[value.weekday()], value.day, _MONTHS[value.month - 1], value.year,
+            value.hour, value.minute, value.second,
+        )
+    return '%s, %02d %s %04d 00:00:00 GMT' % (_DAYS[value.weekday()], value.day, _MONTHS[value.month - 1], value.year)
+
+
+def encode_default(value):
+    # The same fallbacks as Flask's provider, plus result rows as lists
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, tuple):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """Encode `obj` as compact JSON bytes with sorted keys."""
+        return orjson.dumps(obj, default=encode_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj):
+        """Encode `obj` as compact JSON bytes with sorted keys."""
+        return json.dumps(obj, default=encode_default, sort_keys=True, separators=(',', ':')).encode()
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, default=encode_default, use_bin_type=True)
+
+
+class RowSerializer:
+    """Turns result rows into response dicts for one column projection.
+
+    Keys and the columns that need converting are worked out once, from the
+    projection's SQL types. After that, encoding a row is a zip over the tuple
+    from the driver, with no ORM objects or RowMapping in between.
+    """
+
+    def __init__(self, fields):
+        self.keys = tuple(key for key, _ in fields)
+        self.converters = tuple((index, convert) for index, (_, convert) in enumerate(fields) if convert)
+
+    def dicts(self, rows):
+        keys, converters = self.keys, self.converters
+        if not converters:
+            return [dict(zip(keys, row)) for row in rows]
+        out = []
+        for row in rows:
+            values = list(row)
+            for index, convert in converters:
+                value = values[index]
+                if value is not None:
+                    values[index] = convert(value)
+            out.append(dict(zip(keys, values)))
+        return out
+
+
+def _converter(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if python_type in (datetime, date):
+        return http_date
+    if python_type is Decimal:
+        return float
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _serializer(fields):
+    return RowSerializer(fields)
+
+
+def serializer_for(stmt):
+    """The RowSerializer for a select's projection, built once per distinct projection."""
+    return _serializer(tuple((column.key, _converter(column)) for column in stmt.selected_columns))
+
+
+def response_format():
+    """The negotiated response mimetype for the current request: JSON unless the client prefers MessagePack."""
+    if msgpack is None or not has_request_context():
+        return JSON_MIMETYPE
+    best = request.accept_mimetypes.best_match(RESPONSE_MIMETYPES, default=JSON_MIMETYPE)
+    return MSGPACK_MIMETYPE if best != JSON_MIMETYPE else JSON_MIMETYPE
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider on the fast backend; jsonify() answers in MessagePack when the client asks for it."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if response_format() == MSGPACK_MIMETYPE:
+            response = self._app.response_class(msgpack_dumps(obj), mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+
+def accepted_encoding():
+    """'br' or 'gzip' if the client accepts it (brotli only when installed), else None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return compressor.compress, compressor.flush
+
+
+def compress_response(response, min_bytes, level=6):
+    """Compress `response` in place with the client's preferred encoding; streamed bodies are compressed as they go."""
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype in UNCOMPRESSED_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        body = response.response
+        compress, finish = _compressor(encoding, level)
+
+        def compressed():
+            try:
+                for chunk in body:
+                    data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+                    if data:
+                        yield data
+                yield finish()
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        response.response = compressed()
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+        compress, finish = _compressor(encoding, level)
+        response.set_data(compress(data) + finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,87 @@
+"""Production entry point for the Moving App API.
+
+    python serve.py
+
+Configured through the environment (or .env):
+
+    SERVER        gunicorn (default) or werkzeug
+    BIND          host:port to listen on (default 0.0.0.0:5000)
+    WORKERS       worker processes for gunicorn (default 1, see below)
+    THREADS       threads per worker (default 4); >1 uses gunicorn's gthread worker
+    WORKER_CLASS  override the gunicorn worker class (e.g. sync, gthread, gevent)
+    TIMEOUT       gunicorn worker timeout in seconds (default 60)
+
+Driver positions, tracking streams, the driver index and the dispatch queue live
+in process memory, so live tracking and dispatch need WORKERS=1, or sticky
+routing by booking and driver in front of the workers. There is no shared
+backend for them yet, so the default is one worker; scale with THREADS instead.
+With more workers a warning is printed at startup. The response cache needs
+CACHE_BACKEND=redis with more than one worker.
+
+The werkzeug server is a threaded single-process fallback for platforms without
+gunicorn (e.g. Windows); it never enables the debugger.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def gunicorn_options():
+    threads = int(os.getenv('THREADS', 4))
+    return {
+        'bind': os.getenv('BIND', '0.0.0.0:5000'),
+        'workers': int(os.getenv('WORKERS', 1)),
+        'threads': threads,
+        'worker_class': os.getenv('WORKER_CLASS', 'gthread' if threads > 1 else 'sync'),
+        'timeout': int(os.getenv('TIMEOUT', 60)),
+        'accesslog': os.getenv('ACCESS_LOG', '-'),
+    }
+
+
+def run_gunicorn(app, options):
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    StandaloneApplication().run()
+
+
+def run_werkzeug(app):
+    from werkzeug.serving import run_simple
+
+    host, _, port = os.getenv('BIND', '0.0.0.0:5000').rpartition(':')
+    run_simple(host or '0.0.0.0', int(port), app, threaded=True, use_debugger=False, use_reloader=False)
+
+
+def main():
+    from movers import create_app
+
+    app = create_app()
+    server = os.getenv('SERVER', 'gunicorn')
+    if server == 'gunicorn':
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print('gunicorn is not installed; falling back to the threaded werkzeug server.')
+        else:
+            options = gunicorn_options()
+            if options['workers'] > 1:
+                print(f"WORKERS={options['workers']}: live tracking and dispatch keep their state per process, "
+                      'so they need sticky routing in front of the workers.')
+            run_gunicorn(app, options)
+            return
+    elif server != 'werkzeug':
+        raise SystemExit(f'Unknown SERVER {server!r}; expected gunicorn or werkzeug')
+    run_werkzeug(app)
+
+
+if __name__ == '__main__':
+    main()
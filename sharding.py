@@ -0,0 +1,132 @@
+"""Region shards: which database a driver, booking, notification or dispatch request lives in.
+
+Every configured region is a bounding box with its own SQLite file. Rows from
+outside all of them, and every row written before sharding was turned on, stay
+in the default shard (the main database). Each shard hands out ids from its own
+range, so `id >> SHARD_ID_BITS` is the index of the shard holding the row and
+any id can be routed without a lookup.
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 2**40 ids per shard; ids stay below JavaScript's 2**53 for up to 8192 shards
+SHARD_ID_BITS = 40
+REGION_NAME = re.compile(r'^[a-z0-9_]+$')
+
+
+class Region:
+    def __init__(self, name, south, west, north, east):
+        self.name = name
+        self.south, self.west, self.north, self.east = south, west, north, east
+
+    def contains(self, lat, lng):
+        return self.south <= lat <= self.north and self.west <= lng <= self.east
+
+
+def parse_regions(spec):
+    """Parse "name:south,west,north,east;..." into Regions, in the order given.
+
+    Raises ValueError for a malformed entry, a bad or repeated name or a box
+    whose corners are the wrong way round.
+    """
+    regions = []
+    for entry in filter(None, (part.strip() for part in (spec or '').split(';'))):
+        try:
+            name, box = entry.split(':')
+            south, west, north, east = (float(value) for value in box.split(','))
+        except ValueError:
+            raise ValueError(f"Invalid region {entry!r}; expected name:south,west,north,east") from None
+        name = name.strip()
+        if not REGION_NAME.match(name) or name == 'default' or name in {region.name for region in regions}:
+            raise ValueError(f"Invalid or repeated region name {name!r}")
+        if south > north or west > east:
+            raise ValueError(f"Region {name!r} must list its south-west corner before its north-east one")
+        regions.append(Region(name, south, west, north, east))
+    return regions
+
+
+class Shard:
+    def __init__(self, index, name, bind_key=None):
+        self.index = index
+        self.name = name
+        self.bind_key = bind_key  # Flask-SQLAlchemy bind; None for the main database
+
+    @property
+    def id_floor(self):
+        """Ids in this shard start above this value."""
+        return self.index << SHARD_ID_BITS
+
+    def __repr__(self):
+        return f'Shard({self.index}, {self.name!r})'
+
+
+class ShardMap:
+    """The default shard plus one per region, indexed in configuration order.
+
+    A shard's index is part of every id it hands out, so regions may only ever
+    be appended to the configuration, never reordered or removed.
+    """
+
+    def __init__(self, regions=()):
+        self.regions = list(regions)
+        self.default = Shard(0, 'default')
+        self.shards = [self.default] + [
+            Shard(index, region.name, f'shard_{region.name}') for index, region in enumerate(self.regions, start=1)
+        ]
+        self.by_name = {shard.name: shard for shard in self.shards}
+
+    @property
+    def enabled(self):
+        return len(self.shards) > 1
+
+    def for_point(self, lat, lng):
+        for region, shard in zip(self.regions, self.shards[1:]):
+            if region.contains(lat, lng):
+                return shard
+        return self.default
+
+    def for_id(self, row_id):
+        """The shard whose id range holds `row_id`, or None if no shard could have issued it."""
+        index = row_id >> SHARD_ID_BITS
+        return self.shards[index] if 0 <= index < len(self.shards) else None
+
+    def group_ids(self, ids):
+        """{shard: [id, ...]} for the ids some shard could have issued, shards in index order."""
+        groups = {}
+        for row_id in ids:
+            shard = self.for_id(row_id)
+            if shard is not None:
+                groups.setdefault(shard.index, []).append(row_id)
+        return {self.shards[index]: groups[index] for index in sorted(groups)}
+
+
+class ScatterPool:
+    """Runs one call per shard on a shared thread pool and gathers the results in shard order.
+
+    A single call runs inline, so an unsharded deployment never hands work to
+    another thread.
+    """
+
+    def __init__(self, max_workers=8, name='shard-scatter'):
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def map(self, fn, shards):
+        shards = list(shards)
+        if len(shards) <= 1:
+            return [fn(shard) for shard in shards]
+        return list(self._get_executor().map(fn, shards))
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,195 @@
+import logging
+import queue
+import threading
+import time
+from array import array
+
+from geo import parse_location
+
+logger = logging.getLogger(__name__)
+
+
+class LocationHistory:
+    """Append-only per-driver track, stored as flat float arrays of (timestamp, lat, lng).
+
+    24 bytes per point instead of a dict or ORM row each; points older than the
+    last one recorded for a driver are ignored so every track stays time-ordered.
+    """
+
+    def __init__(self, max_points_per_driver=20000):
+        self.max_points_per_driver = max_points_per_driver
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(track) for track in self._tracks.values()) // 3
+
+    def append(self, driver_id, lat, lng, timestamp):
+        with self._lock:
+            track = self._tracks.get(driver_id)
+            if track is None:
+                track = self._tracks[driver_id] = array('d')
+            elif timestamp < track[-3]:
+                return False
+            track.extend((timestamp, lat, lng))
+            if len(track) > self.max_points_per_driver * 3:
+                # Drop the oldest half in one slice rather than one point per append
+                del track[:(self.max_points_per_driver // 2) * 3]
+        return True
+
+    def points(self, driver_id, since=None, limit=None):
+        """Return [(timestamp, lat, lng), ...] for a driver, oldest first."""
+        with self._lock:
+            track = self._tracks.get(driver_id)
+            if not track:
+                return []
+            count = len(track) // 3
+            start = 0
+            if since is not None:
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if track[mid * 3] < since:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                start = lo
+            end = count if limit is None else min(count, start + limit)
+            flat = track[start * 3:end * 3]
+        return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+
+class LocationHub:
+    """In-memory latest-position store with per-driver fan-out to live subscribers.
+
+    Publishing never touches the database: positions are kept here, pushed to any
+    subscriber queues for that driver and marked dirty. A background flusher hands
+    the dirty set to `flush_fn` every `flush_interval` seconds, so each driver costs
+    at most one DB write per interval however often it pings.
+    """
+
+    def __init__(self, flush_fn=None, flush_interval=5.0, subscriber_queue_size=16, history=None):
+        self.flush_fn = flush_fn
+        self.history = history
+        self.flush_interval = flush_interval
+        self.subscriber_queue_size = subscriber_queue_size
+        self._latest = {}
+        self._dirty = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+
+    def publish(self, driver_id, location, timestamp=None):
+        published = self.publish_many([(driver_id, location, timestamp)])
+        return published[0] if published else self.latest(driver_id)
+
+    def publish_many(self, points):
+        """Record many (driver_id, location, timestamp) points at once.
+
+        Every point goes to the history; only the newest point per driver replaces
+        its latest position and is pushed to subscribers. Points older than the
+        driver's current position are ignored. Returns the updates that were published.
+        """
+        now = time.time()
+        newest = {}
+        for driver_id, location, timestamp in points:
+            timestamp = timestamp or now
+            if self.history is not None:
+                point = parse_location(location)
+                if point is not None:
+                    self.history.append(driver_id, point[0], point[1], timestamp)
+            current = newest.get(driver_id) or self._latest.get(driver_id)
+            if current is None or timestamp >= current['timestamp']:
+                newest[driver_id] = {'driver_id': driver_id, 'live_location': location, 'timestamp': timestamp}
+
+        with self._lock:
+            fan_out = []
+            for driver_id, update in newest.items():
+                current = self._latest.get(driver_id)
+                if current is not None and update['timestamp'] < current['timestamp']:
+                    continue
+                self._latest[driver_id] = update
+                self._dirty[driver_id] = update
+                fan_out.append((update, list(self._subscribers.get(driver_id, ()))))
+
+        for update, subscribers in fan_out:
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(update)
+                except queue.Full:
+                    # Slow consumer: drop its oldest position, only the newest matters
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+                    subscriber.put_nowait(update)
+        if fan_out:
+            self._ensure_flusher()
+        return [update for update, _ in fan_out]
+
+    def latest(self, driver_id):
+        return self._latest.get(driver_id)
+
+    def positions(self):
+        """Snapshot of the latest position of every driver, as {driver_id: location}."""
+        with self._lock:
+            return {driver_id: update['live_location'] for driver_id, update in self._latest.items()}
+
+    def subscribe(self, driver_id):
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(driver_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, driver_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(driver_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[driver_id]
+
+    def subscriber_count(self, driver_id=None):
+        with self._lock:
+            if driver_id is not None:
+                return len(self._subscribers.get(driver_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def drain_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def flush(self):
+        """Persist pending positions now; returns how many drivers were written."""
+        dirty = self.drain_dirty()
+        if dirty and self.flush_fn is not None:
+            try:
+                self.flush_fn(list(dirty.values()))
+            except Exception:
+                # Put them back unless a newer position arrived meanwhile
+                with self._lock:
+                    for driver_id, update in dirty.items():
+                        self._dirty.setdefault(driver_id, update)
+                raise
+        return len(dirty)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self.flush_fn is None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name='location-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Error flushing driver locations')
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
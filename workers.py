@@ -0,0 +1,45 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalWorker:
+    """Background thread that calls `fn()` every `interval` seconds.
+
+    `wake()` runs the next pass immediately, e.g. when new work has been queued.
+    An interval of 0 or less never starts the thread.
+    """
+
+    def __init__(self, fn, interval=30.0, name='interval-worker'):
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.fn()
+            except Exception:
+                logger.exception('Error in background worker %s', self.name)
+            self._wake.wait(self.interval)
+            self._wake.clear()